@@ -0,0 +1,67 @@
+"""
+Measures memory taken by jobs of a task with many inputs.
+
+Creates sanitization jobs for a number of inputs of fixture sum_cms
+and prints memory allocated per job. Run from the repository root:
+
+    python benchmarks/job_memory.py [--inputs 20000]
+"""
+
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pisek.env.env import Env
+from pisek.utils.paths import InputPath
+from pisek.task_jobs.tools import IsClean, Sanitize
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../fixtures")
+
+
+def create_jobs(env: Env, inputs: int) -> list:
+    jobs = []
+    for i in range(inputs):
+        inp = InputPath(env, f"{i:05}.in")
+        raw = inp.to_raw(env.config.in_format)
+        jobs.append(Sanitize(env, raw, inp))
+        jobs.append(IsClean(env, inp, inp))
+    return jobs
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--inputs", type=int, default=20_000)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="pisek-bench_")
+    try:
+        for dir_ in ("sum_cms", "pisek"):
+            shutil.copytree(os.path.join(FIXTURES, dir_), os.path.join(tmp_dir, dir_))
+        os.chdir(os.path.join(tmp_dir, "sum_cms"))
+        env = Env.load(pisek_dir="../pisek")
+        assert env is not None
+
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        jobs = create_jobs(env, args.inputs)
+        elapsed = time.perf_counter() - start
+        memory, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        print(f"jobs: {len(jobs)}")
+        print(f"memory per job: {memory / len(jobs):.0f} B")
+        print(f"time per job: {elapsed / len(jobs) * 1e6:.1f} us (with tracemalloc)")
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Benchmarks the whole pipeline on synthetic tasks of various sizes.
+
+Each scenario generates a task, tests it with pisek in a fresh process
+and then tests it again with everything cached. Results are stored as JSON,
+so they can be compared between commits. Run from the repository root:
+
+    python benchmarks/pipeline.py --output before.json
+    python benchmarks/pipeline.py --output after.json --compare before.json
+"""
+
+import argparse
+from dataclasses import asdict, dataclass
+from datetime import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from contextlib import redirect_stderr, redirect_stdout
+from typing import Any, Optional
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, REPOSITORY)  # Also in spawned processes
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    inputs: int
+    solutions: int = 1
+    check: str = "tokens"  # diff, tokens or judge
+    interactive: bool = False
+    large: bool = False  # Run only when asked for explicitly or with --large
+
+
+SCENARIOS = [
+    Scenario("tiny", inputs=10),
+    Scenario("tokens-1k", inputs=1000),
+    Scenario("diff-1k", inputs=1000, check="diff"),
+    Scenario("judge-1k", inputs=1000, check="judge"),
+    Scenario("solutions-30", inputs=100, solutions=30),
+    Scenario("interactive-1k", inputs=1000, interactive=True),
+    Scenario("tokens-20k", inputs=20_000, large=True),
+    Scenario("judge-20k", inputs=20_000, solutions=3, check="judge", large=True),
+]
+
+GEN = """\
+#!/usr/bin/env python3
+import os
+import random
+import sys
+
+random.seed(42)
+os.makedirs(sys.argv[1], exist_ok=True)
+for i in range({inputs}):
+    with open(os.path.join(sys.argv[1], f"01_{{i:05}}.in"), "w") as f:
+        f.write(f"{{random.randint(1, 10**9)}} {{random.randint(1, 10**9)}}\\n")
+"""
+
+SOLVE = """\
+#!/usr/bin/env python3
+# Solution number {number}
+a, b = map(int, input().split())
+print(a + b)
+"""
+
+SOLVE_INTERACTIVE = """\
+#!/usr/bin/env python3
+# Solution number {number}
+a, b = map(int, input().split())
+print(a + b, flush=True)
+"""
+
+JUDGE = """\
+#!/usr/bin/env python3
+import sys
+
+with open(sys.argv[2]) as correct, open(sys.argv[3]) as contestant:
+    ok = correct.read().split() == contestant.read().split()
+print(1 if ok else 0)
+print("OK" if ok else "Wrong answer", file=sys.stderr)
+"""
+
+JUDGE_INTERACTIVE = """\
+#!/usr/bin/env python3
+import sys
+
+a, b = map(int, sys.stdin.read().split())
+with open(sys.argv[2], "w") as send:
+    send.write(f"{a} {b}\\n")
+with open(sys.argv[1]) as recv:
+    ok = recv.read().split() == [str(a + b)]
+print(1 if ok else 0)
+print("OK" if ok else "Wrong answer", file=sys.stderr)
+"""
+
+
+def write(path: str, content: str, executable: bool = False) -> None:
+    with open(path, "w") as f:
+        f.write(content)
+    if executable:
+        os.chmod(path, 0o755)
+
+
+def create_task(directory: str, scenario: Scenario) -> None:
+    """Creates task of given scenario in directory."""
+    os.makedirs(directory)
+    judged = scenario.interactive or scenario.check == "judge"
+    judge_type = "cms-communication" if scenario.interactive else "cms-batch"
+
+    solutions = "\n".join(
+        f"[solution_solve{i}]\nprimary={'yes' if i == 0 else 'no'}\npoints=10\n"
+        for i in range(scenario.solutions)
+    )
+    config = textwrap.dedent(f"""\
+        [task]
+        version=v3
+        task_type={"interactive" if scenario.interactive else "batch"}
+
+        [tests]
+        in_gen=gen
+        gen_type=cms-old
+        out_check={"judge" if judged else scenario.check}
+        """)
+    if judged:
+        config += f"out_judge=judge\njudge_type={judge_type}\n"
+    config += textwrap.dedent("""\
+
+        [test01]
+        points=10
+        in_globs=01_*.in
+
+        [run_solution]
+        time_limit=5
+
+        [checks]
+        judge_handles_fuzzed_outputs=off
+
+        """)
+    write(os.path.join(directory, "config"), config + solutions)
+
+    write(os.path.join(directory, "gen.py"), GEN.format(inputs=scenario.inputs), True)
+    write(os.path.join(directory, "sample.in"), "1 2\n")
+    if not scenario.interactive:
+        write(os.path.join(directory, "sample.out"), "3\n")
+    solve = SOLVE_INTERACTIVE if scenario.interactive else SOLVE
+    for i in range(scenario.solutions):
+        # Solutions differ so that they are not run just once
+        write(os.path.join(directory, f"solve{i}.py"), solve.format(number=i), True)
+    if judged:
+        judge = JUDGE_INTERACTIVE if scenario.interactive else JUDGE
+        write(os.path.join(directory, "judge.py"), judge, True)
+
+
+def count_jobs(events_file: str) -> int:
+    with open(events_file) as f:
+        return sum(json.loads(line)["event"] == "job_finished" for line in f)
+
+
+def run_scenario(scenario: Scenario, jobs: int, results: Any) -> None:
+    """Tests task of scenario twice in this process and puts metrics to results."""
+    from pisek.__main__ import test_task_path
+
+    tmp_dir = tempfile.mkdtemp(prefix="pisek-bench_")
+    try:
+        task_dir = os.path.join(tmp_dir, scenario.name)
+        create_task(task_dir, scenario)
+        events = os.path.join(tmp_dir, "events.jsonl")
+
+        times = []
+        for i in range(2):  # Second time everything should be cached
+            start = time.perf_counter()
+            with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+                failed = test_task_path(
+                    task_dir,
+                    plain=True,
+                    full=True,
+                    jobs=jobs,
+                    # Recording events would make pisek run all jobs again
+                    events=events if i == 0 else None,
+                )
+            times.append(time.perf_counter() - start)
+            if failed:
+                raise RuntimeError(f"Testing scenario {scenario.name} failed.")
+            if len(times) == 1:
+                jobs_count = count_jobs(events)
+
+        results.put(
+            {
+                **asdict(scenario),
+                "jobs": jobs_count,
+                "wall_time": round(times[0], 3),
+                "jobs_per_second": round(jobs_count / times[0], 1),
+                "rerun_time": round(times[1], 3),
+                "peak_rss_mb": round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                ),
+            }
+        )
+    finally:
+        shutil.rmtree(tmp_dir)
+
+
+def measure(scenario: Scenario, jobs: int) -> dict[str, Any]:
+    """Runs scenario in a fresh process so that peak memory is its own."""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=run_scenario, args=(scenario, jobs, results))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Scenario {scenario.name} failed.")
+    return results.get()
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPOSITORY,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: list[dict[str, Any]], baseline_file: str) -> None:
+    with open(baseline_file) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    print(f"\nCompared to {baseline_file}:")
+    for result in results:
+        if result["name"] not in baseline:
+            continue
+        old = baseline[result["name"]]
+        changes = ", ".join(
+            f"{key} {result[key] / old[key]:.2f}x"
+            for key in ("wall_time", "rerun_time", "peak_rss_mb")
+            if old[key]
+        )
+        print(f"  {result['name']}: {changes}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--scenario",
+        "-s",
+        action="append",
+        choices=[s.name for s in SCENARIOS],
+        help="run only given scenarios (can be repeated)",
+    )
+    parser.add_argument("--large", action="store_true", help="run large scenarios too")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="pisek --jobs")
+    parser.add_argument("--output", "-o", help="write results as JSON to OUTPUT")
+    parser.add_argument("--compare", "-c", help="compare with results in COMPARE")
+    args = parser.parse_args()
+
+    scenarios = [
+        s
+        for s in SCENARIOS
+        if (s.name in args.scenario if args.scenario else args.large or not s.large)
+    ]
+
+    results = []
+    for scenario in scenarios:
+        result = measure(scenario, args.jobs)
+        results.append(result)
+        print(
+            f"{scenario.name:>16}: {result['jobs']:>7} jobs  {result['wall_time']:>8.2f}s  "
+            f"{result['jobs_per_second']:>7.1f} jobs/s  rerun {result['rerun_time']:>7.2f}s  "
+            f"{result['peak_rss_mb']:>7.1f} MB",
+            flush=True,
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "date": datetime.now().isoformat(timespec="seconds"),
+                    "python": platform.python_version(),
+                    "cpus": os.cpu_count(),
+                    "jobs": args.jobs,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+from random import Random
+import sys
+
+if len(sys.argv) == 1:
+    print("random-uniform repeat=10")
+    exit()
+
+assert sys.argv[1:] == ["-"]
+
+for line in sys.stdin:
+    name, seed, path = line.split()
+    assert name == "random-uniform"
+    assert len(seed) == 16
+    random = Random(int(seed, base=16))
+
+    nums = set()
+
+    n = random.randint(300000, 400000)
+    for _ in range(n):
+        nums.add(random.randint(1, 1_000_000))
+
+    nums = list(nums)
+    random.shuffle(nums)
+
+    with open(path, "w") as f:
+        for num in nums:
+            print(num, file=f)
+
+    print("ok", flush=True)
@@ -0,0 +1,35 @@
+#include <assert.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <iostream>
+
+using namespace std;
+
+void verdict(float pts, string msg){
+	cout << pts << endl;
+	cerr << msg << endl;
+	exit(0);
+}
+
+// Doesn't use the correct output (judge_needs_out=0)
+int main(int argc, char** argv) {
+	assert(argc == 4);
+
+	long long a, b, contestant;
+
+	FILE* fin = fopen(argv[1], "r");
+	FILE* fcontestant = fopen(argv[3], "r");
+
+	assert(fin && fcontestant);
+
+	fscanf(fin, "%lld%lld", &a, &b);
+	fscanf(fcontestant, "%lld", &contestant);
+
+	if (a + b == contestant)
+		verdict(1, "OK");
+
+	if (contestant == abs(a) + abs(b))
+		verdict(0.5, "|OK|");
+
+	verdict(0.0, "WA");
+}
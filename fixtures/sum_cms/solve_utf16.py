@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+import sys
+
+a, b = [int(x) for x in input().split()]
+sys.stdout.buffer.write(f"{a + b}\r\n".encode("utf-16"))
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# Validator checking the input for all given tests at once.
+import sys
+
+
+def validate(test, data):
+    BOUNDS = [(0, 1e9), (-1e9, 1e9), (-1e18, 1e18)]
+    minimum, maximum = BOUNDS[test - 1]
+
+    if len(data) != 1:
+        return "Vstup ma mit prave jeden radek."
+    try:
+        numbers = list(map(int, data[0].split(" ")))
+    except ValueError:
+        return "Hodnota neni cislo."
+    if len(numbers) != 2:
+        return "Pocet hodnot na radku byl {} a mel byt 2.".format(len(numbers))
+    if any(x < minimum or x > maximum for x in numbers):
+        return "Nejaka hodnota je mimo meze."
+    return "ok"
+
+
+if __name__ == "__main__":
+    data = sys.stdin.read().splitlines()
+    for test in map(int, sys.argv[1:]):
+        print(validate(test, data))
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+import sys
+
+
+def judge(test, seed, input_file, correct_file, output_file):
+    assert test in ["0", "1", "2"]
+    if seed == "-":
+        assert test == "0"
+    else:
+        int(seed, 16)
+
+    with open(input_file) as fin, open(correct_file) as fcorrect:
+        with open(output_file) as fout:
+            t = int(fin.readline())
+            for _ in range(t):
+                a, b = [int(x) for x in fin.readline().split()]
+                c = int(fcorrect.readline())
+                assert a + b == c
+
+                try:
+                    contestant = int(fout.readline())
+                except ValueError:
+                    return "0 Not a number"
+                if c != contestant:
+                    return "0 Wrong answer"
+
+    return "1 OK"
+
+
+for line in sys.stdin:
+    print(judge(*line.split()), flush=True)
@@ -31,7 +31,14 @@ from pisek.config.config_tools import update_and_replace_config
 from pisek.version import print_version
 
 from pisek.jobs.task_pipeline import TaskPipeline
-from pisek.utils.pipeline_tools import run_pipeline, PATH, locked_folder
+from pisek.utils.pipeline_tools import (
+    run_pipeline,
+    run_pipelines,
+    watch_pipeline,
+    PATH,
+    Lock,
+    locked_folder,
+)
 from pisek.utils.paths import INTERNALS_DIR
 
 LOG_FILE = os.path.join(INTERNALS_DIR, "log")
@@ -66,6 +73,33 @@ def test_generator(args):
     return test_task(args, solutions=[])
 
 
+def test_all(args) -> bool:
+    for path in args.tasks:
+        if not is_task_dir(path, args.pisek_dir):
+            return True
+
+    if args.clean:
+        for path in args.tasks:
+            with Lock(path):
+                clean_task_dir(path, args.pisek_dir)
+
+    return run_pipelines(args.tasks, TaskPipeline, **vars(args))
+
+
+@locked_folder
+def watch_task(args):
+    if args.target == "solution" and args.solution is None:
+        eprint("Specify a solution name to watch.")
+        return 1
+
+    solutions = {
+        "all": None,
+        "generator": [],
+        "solution": [args.solution],
+    }[args.target]
+    return watch_pipeline(PATH, TaskPipeline, **(vars(args) | {"solutions": solutions}))
+
+
 @locked_folder
 def clean_directory(args) -> bool:
     task_dir = PATH
@@ -105,6 +139,59 @@ def main(argv):
             help="use active dataset",
         )
 
+    def add_arguments_testing(parser):
+        parser.add_argument(
+            "--verbosity",
+            "-v",
+            action="count",
+            default=0,
+            help="be more verbose (enter multiple times for even more verbosity)",
+        )
+        parser.add_argument(
+            "--file-contents",
+            "-C",
+            action="store_true",
+            help="show file contents on error",
+        )
+        parser.add_argument(
+            "--timeout",
+            "-t",
+            type=float,
+            help="override time limit for solutions to TIMEOUT seconds",
+        )
+        parser.add_argument(
+            "--full", "-f", action="store_true", help="don't stop on first failure"
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="interpret warnings as failures (for final check)",
+        )
+        parser.add_argument(
+            "--all-inputs",
+            "-a",
+            action="store_true",
+            help="test each solution on all inputs",
+        )
+        parser.add_argument(
+            "--testing-log",
+            "-T",
+            action="store_true",
+            help="write test results to testing_log.json",
+        )
+        parser.add_argument(
+            "--jobs",
+            "-j",
+            type=int,
+            default=1,
+            help="run up to JOBS jobs in parallel (measured times may be less precise)",
+        )
+        parser.add_argument(
+            "--adaptive-order",
+            action="store_true",
+            help="test inputs that failed or were slowest last time first",
+        )
+
     # ------------------------------- pisek -------------------------------
 
     parser.add_argument(
@@ -156,33 +243,7 @@ def main(argv):
     parser_test.add_argument(
         "solution", type=str, help="name of the solution to test", nargs="?"
     )
-    parser_test.add_argument(
-        "--verbosity",
-        "-v",
-        action="count",
-        default=0,
-        help="be more verbose (enter multiple times for even more verbosity)",
-    )
-    parser_test.add_argument(
-        "--file-contents",
-        "-C",
-        action="store_true",
-        help="show file contents on error",
-    )
-    parser_test.add_argument(
-        "--timeout",
-        "-t",
-        type=float,
-        help="override time limit for solutions to TIMEOUT seconds",
-    )
-    parser_test.add_argument(
-        "--full", "-f", action="store_true", help="don't stop on first failure"
-    )
-    parser_test.add_argument(
-        "--strict",
-        action="store_true",
-        help="interpret warnings as failures (for final check)",
-    )
+    add_arguments_testing(parser_test)
     parser_test.add_argument(
         "--repeat",
         "-n",
@@ -191,17 +252,45 @@ def main(argv):
         help="test task REPEAT times giving generator different seeds. (Changes seeded inputs only.)",
     )
     parser_test.add_argument(
-        "--all-inputs",
-        "-a",
-        action="store_true",
-        help="test each solution on all inputs",
+        "--events",
+        type=str,
+        metavar="FILE",
+        help="write progress events as JSON lines to FILE",
     )
     parser_test.add_argument(
-        "--testing-log",
-        "-T",
-        action="store_true",
-        help="write test results to testing_log.json",
+        "--trace",
+        type=str,
+        metavar="FILE",
+        help="write Chrome trace of the run to FILE (for chrome://tracing or Perfetto)",
+    )
+
+    # ------------------------------- pisek test-all -------------------------------
+
+    parser_test_all = subparsers.add_parser(
+        "test-all", help="test multiple tasks at once"
+    )
+    parser_test_all.add_argument(
+        "tasks", type=str, nargs="+", help="directories of the tasks"
     )
+    add_arguments_testing(parser_test_all)
+    parser_test_all.set_defaults(jobs=os.cpu_count())
+
+    # ------------------------------- pisek watch -------------------------------
+
+    parser_watch = subparsers.add_parser(
+        "watch", help="test task again whenever its files change"
+    )
+    parser_watch.add_argument(
+        "target",
+        choices=["generator", "solution", "all"],
+        nargs="?",
+        default="all",
+        help="what to test?",
+    )
+    parser_watch.add_argument(
+        "solution", type=str, help="name of the solution to test", nargs="?"
+    )
+    add_arguments_testing(parser_watch)
 
     # ------------------------------- pisek clean -------------------------------
 
@@ -328,6 +417,8 @@ def main(argv):
     elif args.subcommand == "license":
         print(license_gnu if args.print else license)
         return 0
+    elif args.subcommand == "test-all":
+        return test_all(args)
 
     if not is_task_dir(PATH, args.pisek_dir):
         # !!! Ensure this is always run before clean_directory !!!
@@ -356,6 +447,9 @@ def main(argv):
             eprint(f"Unknown testing target: {args.target}")
             exit(1)
 
+    elif args.subcommand == "watch":
+        result = watch_task(args)
+
     elif args.subcommand == "config":
         if args.config_subcommand == "update":
             result = not update_and_replace_config(PATH, args.pisek_dir)
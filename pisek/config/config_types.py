@@ -29,12 +29,19 @@ class GenType(StrEnum):
     opendata_v1 = "opendata-v1"
     cms_old = "cms-old"
     pisek_v1 = "pisek-v1"
+    pisek_multi_v1 = "pisek-multi-v1"
+
+
+class ValidatorType(StrEnum):
+    simple = "simple"
+    multi_test = "multi-test"
 
 
 class JudgeType(StrEnum):
     cms_batch = "cms-batch"
     cms_communication = "cms-communication"
     opendata_v1 = "opendata-v1"
+    pisek_multi_v1 = "pisek-multi-v1"
 
 
 class ShuffleMode(StrEnum):
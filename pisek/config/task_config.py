@@ -39,6 +39,7 @@ from pisek.config.config_hierarchy import ConfigValue, TaskConfigError, ConfigHi
 from pisek.config.config_types import (
     TaskType,
     GenType,
+    ValidatorType,
     OutCheck,
     JudgeType,
     ShuffleMode,
@@ -99,6 +100,7 @@ class TaskConfig(BaseEnv):
     in_gen: OptionalStr
     gen_type: GenType
     validator: OptionalStr
+    validator_type: ValidatorType
     out_check: OutCheck
     out_judge: OptionalStr
     judge_type: OptionalJudgeType
@@ -202,6 +204,7 @@ class TaskConfig(BaseEnv):
             ("tests", "in_gen"),
             ("tests", "gen_type"),
             ("tests", "validator"),
+            ("tests", "validator_type"),
             ("tests", "out_check"),
             ("tests", "in_format"),
             ("tests", "out_format"),
@@ -307,7 +310,12 @@ class TaskConfig(BaseEnv):
             )
 
         JUDGE_TYPES = {
-            TaskType.batch: [None, JudgeType.opendata_v1, JudgeType.cms_batch],
+            TaskType.batch: [
+                None,
+                JudgeType.opendata_v1,
+                JudgeType.cms_batch,
+                JudgeType.pisek_multi_v1,
+            ],
             TaskType.interactive: [JudgeType.cms_communication],
         }
 
@@ -14,78 +14,92 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from typing import Any, TYPE_CHECKING, Callable
+from functools import cache
+from threading import local
+from typing import Any, TYPE_CHECKING
+import weakref
 
 from pisek.env.context import ContextModel
 
+# Accessed field names of each env (by id) logged by the current thread
+_accesses = local()
+
+
+def _thread_accesses() -> dict[int, set[str]]:
+    try:
+        return _accesses.envs
+    except AttributeError:
+        _accesses.envs = {}
+        return _accesses.envs
+
+
+# Ids of each env and its subenvs (by id), removed when the env dies
+_env_trees: dict[int, list[int]] = {}
+
+
+@cache
+def _field_names(model: type[ContextModel]) -> frozenset[str]:
+    return frozenset(model.model_fields) | frozenset(model.model_computed_fields)
+
 
 class BaseEnv(ContextModel):
     """
     Collection of environment variables which logs whether each variable was accessed.
+    Accesses are logged separately for each thread.
     """
 
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
-        self._accessed: set[str] = set()
-        self._logging: bool = True
-
-        self._direct_subenvs: list[str] = []
-        self._dict_subenvs: list[str] = []
-        self._precompute_subenvs()
-
     if not TYPE_CHECKING:
         # XXX: This is a bit black-magicky because of efficiency
         # Be careful when touching this
         def __getattribute__(self, item: str) -> Any:
-            if not item.startswith("_") and hasattr(self, "_accessed"):
-                super().__getattribute__("_accessed").add(item)
+            if not item.startswith("_"):
+                try:
+                    accessed = _accesses.envs
+                except AttributeError:
+                    accessed = _thread_accesses()
+                env_id = id(self)
+                if env_id in accessed:
+                    accessed[env_id].add(item)
+                else:
+                    accessed[env_id] = {item}
             return ContextModel.__getattribute__(self, item)
 
     def fork(self):
         """Make copy of this env with no accesses logged."""
         model = self.model_copy(deep=True)
+        # Accesses of a dead env with the same id might still be logged
         model.clear_accesses()
         return model
 
-    def _precompute_subenvs(self):
-        def is_env(item: Any) -> bool:
-            return isinstance(item, BaseEnv)
-
-        for key in self.model_fields:
-            item = getattr(self, key)
-            if is_env(item):
-                self._direct_subenvs.append(key)
-            elif isinstance(item, dict) and any(map(is_env, item.values())):
-                assert all(map(is_env, item.values()))
-                self._dict_subenvs.append(key)
-
-    @staticmethod
-    def _recursive_call(
-        function: Callable[["BaseEnv"], None],
-    ) -> Callable[["BaseEnv"], None]:
-        def recursive(self: "BaseEnv") -> None:
-            for direct_subenv in self._direct_subenvs:
-                recursive(super().__getattribute__(direct_subenv))
-
-            for dict_subenv in self._dict_subenvs:
-                subenv = super().__getattribute__(dict_subenv)
-                for subitem in subenv.values():
-                    recursive(subitem)
-
-            function(self)
-
-        return recursive
-
-    @_recursive_call
     def clear_accesses(self) -> None:
-        """Remove all logged accesses."""
-        self._accessed.clear()
+        """
+        Remove logged accesses of current thread to this env and its subenvs.
+        Accesses are logged by id, so this should be called before logging
+        accesses that are then read by get_accessed.
+        """
+        accessed = _thread_accesses()
+        for env_id in self._env_ids():
+            accessed.pop(env_id, None)
+
+    def _env_ids(self) -> list[int]:
+        """Ids of this env and all its subenvs. (Subenvs must not be replaced.)"""
+        env_id = id(self)
+        if env_id not in _env_trees:
+            ids = [env_id]
+            for value in self.__dict__.values():
+                values = value.values() if isinstance(value, dict) else [value]
+                for item in values:
+                    if isinstance(item, BaseEnv):
+                        ids += item._env_ids()
+            _env_trees[env_id] = ids
+            weakref.finalize(self, _env_trees.pop, env_id, None)
+        return _env_trees[env_id]
 
     def get_accessed(self) -> set[tuple[str, ...]]:
-        """Get all accessed field names in this env (and all subenvs)."""
+        """Get all accessed field names in this env (and all subenvs) by current thread."""
         accessed = set()
-        self._accessed &= set(self.model_fields) | set(self.model_computed_fields)
-        for key in self._accessed:
+        keys = _thread_accesses().get(id(self), set()) & _field_names(type(self))
+        for key in keys:
             item = getattr(self, key)
             if isinstance(item, BaseEnv):
                 accessed |= {(key, *subkey) for subkey in item.get_accessed()}
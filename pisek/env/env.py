@@ -50,6 +50,8 @@ class Env(BaseEnv):
         all_inputs: Finish testing all inputs of a solution
         repeat: Test task REPEAT times giving generator different seeds. (Changes seeded inputs only.)
         iteration: Current iteration of task testing. (0 <= iteration < repeat)
+        jobs: Number of jobs to run in parallel
+        adaptive_order: Run inputs likely to fail first, based on previous runs
     """
 
     target: TestingTarget
@@ -66,6 +68,8 @@ class Env(BaseEnv):
     all_inputs: bool
     repeat: int = Field(ge=1)
     iteration: int = Field(ge=0)
+    jobs: int = Field(ge=1)
+    adaptive_order: bool
 
     @staticmethod
     def load(
@@ -83,6 +87,8 @@ class Env(BaseEnv):
         timeout: Optional[float] = None,
         repeat: int = 1,
         iteration: int = 0,
+        jobs: int = 1,
+        adaptive_order: bool = False,
         pisek_dir: Optional[str] = None,
         **_,
     ) -> Optional["Env"]:
@@ -114,6 +120,8 @@ class Env(BaseEnv):
             all_inputs=all_inputs,
             repeat=repeat,
             iteration=iteration,
+            jobs=jobs,
+            adaptive_order=adaptive_order,
         )
 
     def colored(self, msg: str, color: str) -> str:
@@ -14,21 +14,30 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+import hashlib
+import logging
+from threading import RLock
 import time
 from typing import Any, Iterable
 import os
 import pickle
+import sqlite3
 
 from pisek.version import __version__
 from pisek.utils.text import eprint
 from pisek.utils.colors import ColorSettings
 from pisek.utils.paths import INTERNALS_DIR
 
+logger = logging.getLogger(__name__)
 
 CACHE_VERSION_FILE = os.path.join(INTERNALS_DIR, "cache_version")
-CACHE_CONTENT_FILE = os.path.join(INTERNALS_DIR, "cache")
+CACHE_CONTENT_FILE = os.path.join(INTERNALS_DIR, "cache.db")
+# Single pickle file used by older versions
+LEGACY_CACHE_FILE = os.path.join(INTERNALS_DIR, "cache")
 SAVED_LAST_SIGNATURES = 5
 CACHE_SAVE_INTERVAL = 1  # seconds
+# Files modified this recently could change again without changing their mtime
+RACY_FILE_INTERVAL = 100_000_000  # nanoseconds
 
 
 class CacheEntry:
@@ -61,14 +70,54 @@ class CacheEntry:
 
 
 class Cache:
-    """Object representing all cached jobs."""
+    """
+    Object representing all cached jobs. Can be used from multiple threads.
 
-    def __init__(self) -> None:
+    Entries are stored in an SQLite database, grouped by job name.
+    They are loaded lazily and only changed names are written on export.
+
+    Digests of files are stored too, so they needn't be computed again
+    while inode, size and mtime of the file stay the same.
+    """
+
+    def __init__(self, clear: bool = True) -> None:
         os.makedirs(INTERNALS_DIR, exist_ok=True)
         with open(CACHE_VERSION_FILE, "w") as f:
             f.write(f"{__version__}\n")
         self.cache: dict[str, list[CacheEntry]] = {}
+        self._dirty: set[str] = set()
         self.last_save = time.time()
+        self._lock = RLock()
+
+        if os.path.isfile(LEGACY_CACHE_FILE):
+            os.remove(LEGACY_CACHE_FILE)
+
+        self._db = sqlite3.connect(CACHE_CONTENT_FILE, check_same_thread=False)
+        try:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (name TEXT PRIMARY KEY, entries BLOB)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS file_digests "
+                "(path TEXT PRIMARY KEY, inode INTEGER, size INTEGER, mtime INTEGER, digest TEXT)"
+            )
+            if clear:
+                self._db.execute("DELETE FROM jobs")
+            self._db.commit()
+
+            self._file_digests: dict[str, tuple[tuple[int, int, int], str]] = {
+                path: ((inode, size, mtime), digest)
+                for path, inode, size, mtime, digest in self._db.execute(
+                    "SELECT path, inode, size, mtime, digest FROM file_digests"
+                )
+            }
+        except sqlite3.DatabaseError:
+            self._db.close()
+            raise
+        self._dirty_digests: set[str] = set()
+        self._used_digests: set[str] = set()
 
     @classmethod
     def load(cls) -> "Cache":
@@ -84,56 +133,144 @@ class Cache:
         if version != __version__:
             eprint(
                 ColorSettings.colored(
-                    "Different version of .pisek_cache file found. Starting from scratch...",
+                    f"Different version of {CACHE_CONTENT_FILE} file found. Starting from scratch...",
+                    "yellow",
+                )
+            )
+            return Cache()
+
+        try:
+            return Cache(clear=False)
+        except sqlite3.DatabaseError:
+            eprint(
+                ColorSettings.colored(
+                    f"Corrupted {CACHE_CONTENT_FILE} file found. Starting from scratch...",
                     "yellow",
                 )
             )
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(CACHE_CONTENT_FILE + suffix):
+                    os.remove(CACHE_CONTENT_FILE + suffix)
             return Cache()
 
-        cache = Cache()
-        with open(CACHE_CONTENT_FILE, "rb") as f:
-            cache.cache = pickle.load(f)
-        return cache
+    def _load_entries(self, name: str) -> None:
+        """Load entries of given name from cache file if not loaded yet."""
+        if name in self.cache:
+            return
+
+        row = self._db.execute(
+            "SELECT entries FROM jobs WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            return
+        try:
+            self.cache[name] = pickle.loads(row[0])
+        except Exception:
+            # Corrupted or written by incompatible code, treat as cache miss
+            logger.warning(f"Dropping unloadable cache entries of '{name}'")
+            self._db.execute("DELETE FROM jobs WHERE name = ?", (name,))
 
     def add(self, cache_entry: CacheEntry):
         """Add entry to cache."""
-        if cache_entry.name not in self.cache:
-            self.cache[cache_entry.name] = []
-        self.cache[cache_entry.name].append(cache_entry)
+        with self._lock:
+            self._load_entries(cache_entry.name)
+            if cache_entry.name not in self.cache:
+                self.cache[cache_entry.name] = []
+            self.cache[cache_entry.name].append(cache_entry)
 
-        # trim number of entries per cache name in order to limit cache size
-        self.cache[cache_entry.name] = self.cache[cache_entry.name][
-            -SAVED_LAST_SIGNATURES:
-        ]
+            # trim number of entries per cache name in order to limit cache size
+            self.cache[cache_entry.name] = self.cache[cache_entry.name][
+                -SAVED_LAST_SIGNATURES:
+            ]
+            self._dirty.add(cache_entry.name)
 
-        # Throttling saving saves time massively
-        if time.time() - self.last_save > CACHE_SAVE_INTERVAL:
-            self.export()
+            # Throttling saving saves time massively
+            if time.time() - self.last_save > CACHE_SAVE_INTERVAL:
+                self.export()
 
     def __contains__(self, name: str) -> bool:
-        return name in self.cache
+        with self._lock:
+            self._load_entries(name)
+            return name in self.cache
 
     def __getitem__(self, name: str) -> list[CacheEntry]:
-        return self.cache[name]
+        with self._lock:
+            self._load_entries(name)
+            return list(self.cache[name])
 
     def entry_names(self) -> list[str]:
-        return list(self.cache.keys())
+        with self._lock:
+            stored = [name for (name,) in self._db.execute("SELECT name FROM jobs")]
+            return list(set(stored) | self.cache.keys())
 
     def last_entry(self, name: str) -> CacheEntry:
         return self[name][-1]
 
     def move_to_top(self, entry: CacheEntry):
         """Move given entry to most recent position."""
-        if entry in self.cache[entry.name]:
-            self.cache[entry.name].remove(entry)
-            self.cache[entry.name].append(entry)
-        else:
-            raise ValueError(
-                f"Cannot move to top entry which is not in Cache:\n{entry}"
+        with self._lock:
+            self._load_entries(entry.name)
+            if entry in self.cache.get(entry.name, []):
+                if self.cache[entry.name][-1] is not entry:
+                    self.cache[entry.name].remove(entry)
+                    self.cache[entry.name].append(entry)
+                    self._dirty.add(entry.name)
+            else:
+                raise ValueError(
+                    f"Cannot move to top entry which is not in Cache:\n{entry}"
+                )
+
+    def file_digest(self, path: str) -> str:
+        """Returns sha256 digest of given file. Reuses it if the file hasn't changed."""
+        stat = os.stat(path)
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            self._used_digests.add(path)
+            saved = self._file_digests.get(path)
+        if saved is not None and saved[0] == key:
+            return saved[1]
+
+        hashed_at = time.time_ns()
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, "sha256").hexdigest()
+
+        if stat.st_mtime_ns < hashed_at - RACY_FILE_INTERVAL:
+            with self._lock:
+                self._file_digests[path] = (key, digest)
+                self._dirty_digests.add(path)
+        return digest
+
+    def prune_file_digests(self) -> None:
+        """Forgets digests of files not needed since loading or not existing anymore."""
+        with self._lock:
+            pruned = [
+                path
+                for path in self._file_digests
+                if path not in self._used_digests or not os.path.exists(path)
+            ]
+            for path in pruned:
+                del self._file_digests[path]
+                self._dirty_digests.discard(path)
+            self._db.executemany(
+                "DELETE FROM file_digests WHERE path = ?", [(path,) for path in pruned]
             )
 
     def export(self) -> None:
-        """Export cache into a file."""
-        with open(CACHE_CONTENT_FILE, "wb") as f:
-            pickle.dump(self.cache, f)
-        self.last_save = time.time()
+        """Write changed entries into the cache file."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO jobs (name, entries) VALUES (?, ?)",
+                [(name, pickle.dumps(self.cache[name])) for name in self._dirty],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO file_digests "
+                "(path, inode, size, mtime, digest) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (path, *self._file_digests[path][0], self._file_digests[path][1])
+                    for path in self._dirty_digests
+                ],
+            )
+            self._db.commit()
+            self._dirty.clear()
+            self._dirty_digests.clear()
+            self.last_save = time.time()
@@ -0,0 +1,52 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import time
+from typing import Any, Optional, TextIO
+
+EVENTS_BUFFER_SIZE = 1 << 16  # bytes
+
+
+class EventLog:
+    """
+    Writes progress events of pipeline runs as JSON lines.
+    Without a file all events are dropped. Should be used from a single thread.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self._start = time.perf_counter()
+        self._file: Optional[TextIO] = None
+        if path is not None:
+            self._file = open(path, "w", buffering=EVENTS_BUFFER_SIZE)
+
+    def __enter__(self) -> "EventLog":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def time(self) -> float:
+        """Seconds since this log was opened."""
+        return time.perf_counter() - self._start
+
+    def emit(self, event: str, **fields: Any) -> None:
+        """Writes event with given fields."""
+        if self._file is None:
+            return
+        record = {"event": event, "time": round(self.time(), 6), **fields}
+        self._file.write(json.dumps(record, default=str) + "\n")
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
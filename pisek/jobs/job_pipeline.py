@@ -17,15 +17,42 @@
 from abc import ABC, abstractmethod
 from collections import deque
 from colorama import Cursor, ansi
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+import heapq
 from math import ceil
 import sys
 import re
 import time
+from typing import ContextManager, Optional
 
 from pisek.env.env import Env
-from pisek.utils.terminal import terminal_width
+from pisek.utils.terminal import terminal_width, unrecorded
 from pisek.jobs.jobs import State, PipelineItem, Job, JobManager
 from pisek.jobs.cache import Cache
+from pisek.jobs.events import EventLog
+
+# JobManagers create at most this many unfinished jobs per worker
+JOBS_WINDOW_PER_WORKER = 4
+
+# Limits jobs running at once across processes (when testing multiple tasks)
+_job_slots: Optional[ContextManager] = None
+
+
+def share_job_slots(slots: ContextManager) -> None:
+    """Run each job of pipelines in this process only while holding one of slots."""
+    global _job_slots
+    _job_slots = slots
+
+
+def jobs_window(env: Env) -> int:
+    """Number of jobs a JobManager creates at once."""
+    return JOBS_WINDOW_PER_WORKER * env.jobs
+
+
+def run_job_in_slot(job: Job, cache: Cache, buffer_output: bool) -> None:
+    with _job_slots or nullcontext():
+        job.run_job(cache, buffer_output)
 
 
 class JobPipeline(ABC):
@@ -37,16 +64,74 @@ class JobPipeline(ABC):
         self._tmp_lines: int = 0
         self.all_accessed_files: set[str] = set()
 
-    def run_jobs(self, cache: Cache, env: Env) -> bool:
+    def run_jobs(
+        self, cache: Cache, env: Env, events: Optional[EventLog] = None
+    ) -> bool:
         self.job_managers: deque[JobManager] = deque()
         self.pipeline: deque[PipelineItem] = deque(self.pipeline)
+        self._running: dict[Future, Job] = {}
+        self._events = EventLog() if events is None else events
+        self._started: dict[Job, float] = {}
+
+        self._events.emit("run_started", iteration=env.iteration)
+        if env.jobs > 1:
+            self._run_jobs_parallel(cache, env)
+        else:
+            self._run_jobs_sequential(cache, env)
+        self._events.emit("run_finished", iteration=env.iteration, failed=self.failed)
+
+        cache.prune_file_digests()
+        cache.export()  # Save last version of cache
+        return self.failed
+
+    def _jobs_queued(self, jobs: list[Job], manager: Optional[JobManager]) -> None:
+        for job in jobs:
+            self._events.emit(
+                "job_queued",
+                job=job.name,
+                manager=None if manager is None else manager.name,
+            )
+
+    def _job_started(self, job: Job) -> None:
+        self._started[job] = self._events.time()
+        self._events.emit("job_started", job=job.name)
+
+    def _job_finished(self, job: Job) -> None:
+        started = self._started.pop(job, None)
+        self._events.emit(
+            "job_finished",
+            job=job.name,
+            state=job.state.name,
+            duration=(
+                None if started is None else round(self._events.time() - started, 6)
+            ),
+            cached=job.cached,
+        )
+
+    def _run_jobs_sequential(self, cache: Cache, env: Env) -> None:
         while len(self.pipeline) or len(self.job_managers):
             p_item = self.pipeline.popleft()
             if isinstance(p_item, JobManager):
-                self.job_managers.append(p_item)
-                self.pipeline.extendleft(reversed(p_item.create_jobs(env)))
+                if p_item.independent_jobs:
+                    self.job_managers.append(p_item)
+                    jobs = p_item.create_jobs(env, cache)
+                    self._jobs_queued(jobs, p_item)
+                    self._run_independent_jobs(jobs, cache, env)
+                else:
+                    if p_item.has_pending_jobs():
+                        jobs = p_item.next_jobs(jobs_window(env))
+                    else:
+                        self.job_managers.append(p_item)
+                        jobs = p_item.create_jobs(env, cache, jobs_window(env))
+                    self._jobs_queued(jobs, p_item)
+                    self.pipeline.extendleft(reversed(jobs))
+                    if p_item.has_pending_jobs():
+                        # Create next jobs after these have run
+                        self.pipeline.insert(len(jobs), p_item)
             elif isinstance(p_item, Job):
-                p_item.run_job(cache)
+                self._job_started(p_item)
+                run_job_in_slot(p_item, cache, False)
+                self._job_finished(p_item)
                 p_item.finish()
                 self.all_accessed_files |= p_item.accessed_files
             else:
@@ -63,8 +148,152 @@ class JobPipeline(ABC):
             if self.failed and not env.full:
                 break
 
-        cache.export()  # Save last version of cache
-        return self.failed
+    def _run_independent_jobs(self, jobs: list[Job], cache: Cache, env: Env) -> None:
+        """Runs jobs without prerequisites in env.jobs threads."""
+        with ThreadPoolExecutor(max_workers=env.jobs) as executor:
+            futures = []
+            for job in jobs:
+                self._job_started(job)
+                job.state = State.running
+                futures.append(executor.submit(run_job_in_slot, job, cache, True))
+
+            for job, future in zip(jobs, futures):
+                future.result()  # Reraise exceptions from the worker
+                self._job_finished(job)
+                if job.dirty:
+                    self._clear_print_tmp()
+                    job.flush_output()
+                job.finish()
+                self.all_accessed_files |= job.accessed_files
+
+                self.failed |= not self._status_update(env)
+                if self.failed and not env.full:
+                    executor.shutdown(cancel_futures=True)
+                    break
+
+    def _run_jobs_parallel(self, cache: Cache, env: Env) -> None:
+        """
+        Runs jobs in env.jobs threads. A job is started as soon as its prerequisites
+        have finished. JobManagers are still started and finalized in pipeline order.
+        """
+        self._job_order: dict[Job, int] = {}
+        self._ready: list[tuple[int, Job]] = []
+        self._jobs_created = 0
+        postponed: dict[str, list[Job]] = {}
+
+        with ThreadPoolExecutor(max_workers=env.jobs) as executor:
+            while True:
+                self._start_items(cache, env)
+
+                while len(self._ready) and len(self._running) < env.jobs:
+                    _, job = heapq.heappop(self._ready)
+                    if job.state != State.in_queue:
+                        continue  # Cancelled in the meantime
+                    if job.name in postponed:
+                        # Job with same name (and probably same result) is running.
+                        # Wait for it to be able to use cache.
+                        postponed[job.name].append(job)
+                        continue
+
+                    postponed[job.name] = []
+                    self._job_started(job)
+                    job.state = State.running
+                    self._running[
+                        executor.submit(run_job_in_slot, job, cache, True)
+                    ] = job
+
+                if len(self._running):
+                    done, _ = wait(self._running, return_when=FIRST_COMPLETED)
+                    for future in sorted(
+                        done, key=lambda f: self._job_order[self._running[f]]
+                    ):
+                        job = self._running.pop(future)
+                        future.result()  # Reraise exceptions from the worker
+                        for same_name in postponed.pop(job.name):
+                            self._enqueue(same_name)
+                        self._finish_job(job)
+
+                self.failed |= not self._status_update(env)
+                if self.failed and not env.full:
+                    break
+                if not (len(self._running) or len(self._ready) or len(self.pipeline)):
+                    break
+
+        if not self.failed and len(self.job_managers):
+            raise RuntimeError(
+                f"{self.job_managers[0].name} has jobs with prerequisites that will never finish."
+            )
+
+    def _start_items(self, cache: Cache, env: Env) -> None:
+        """Starts items at the top of the pipeline that have their prerequisites finished."""
+        window = jobs_window(env)
+        # If there is nothing else to do, start next item anyway (as sequential run would)
+        force = not len(self._running) and not len(self._ready)
+        i = 0
+        while i < len(self.pipeline):
+            p_item = self.pipeline[i]
+            if not (
+                force or p_item.prerequisites == 0 or p_item.state == State.cancelled
+            ):
+                break
+            force = False
+
+            new_jobs: list[Job]
+            if isinstance(p_item, JobManager) and p_item.has_pending_jobs():
+                # Create more jobs only when the previous ones are mostly done,
+                # items after this manager can start meanwhile
+                if p_item.unfinished_jobs() >= window and (
+                    len(self._running) or len(self._ready)
+                ):
+                    i += 1
+                    continue
+                new_jobs = p_item.next_jobs(window)
+                if not p_item.has_pending_jobs():
+                    del self.pipeline[i]
+            elif isinstance(p_item, JobManager):
+                self.job_managers.append(p_item)
+                new_jobs = p_item.create_jobs(env, cache, window)
+                if not p_item.has_pending_jobs():
+                    del self.pipeline[i]
+            elif isinstance(p_item, Job):
+                del self.pipeline[i]
+                new_jobs = [p_item]
+            else:
+                raise TypeError(
+                    f"Objects in {self.__class__.__name__} should be either Job or JobManager."
+                )
+
+            if p_item.dirty:
+                self._tmp_lines = 0
+
+            self._jobs_queued(
+                new_jobs, p_item if isinstance(p_item, JobManager) else None
+            )
+            for job in new_jobs:
+                self._job_order[job] = self._jobs_created
+                self._jobs_created += 1
+                self._enqueue(job)
+
+    def _enqueue(self, job: Job) -> None:
+        """Marks job as ready to run if it is."""
+        if job not in self._job_order:
+            return  # Not created yet, will be enqueued on creation
+        if job.state == State.in_queue and job.prerequisites == 0:
+            heapq.heappush(self._ready, (self._job_order[job], job))
+
+    def _finish_job(self, job: Job) -> None:
+        """Handles job that finished in background."""
+        self._job_finished(job)
+        if job.dirty:
+            self._clear_print_tmp()
+            job.flush_output()
+        job.finish()
+        self.all_accessed_files |= job.accessed_files
+        del self._job_order[job]
+
+        for item, _, _ in job.required_by:
+            if isinstance(item, Job):
+                self._enqueue(item)
 
     def _status_update(self, env: Env) -> bool:
         """Display current progress. Return true if there were no failures."""
@@ -85,6 +314,11 @@ class JobPipeline(ABC):
                 msg = job_man.finalize()
                 if job_man.dirty:
                     self._tmp_lines = 0
+                self._events.emit(
+                    "manager_finalized", manager=job_man.name, state=job_man.state.name
+                )
+                for event, fields in job_man.events():
+                    self._events.emit(event, manager=job_man.name, **fields)
 
                 if msg:
                     self._print(msg, env)
@@ -98,18 +332,24 @@ class JobPipeline(ABC):
                 self.job_managers.appendleft(job_man)
                 break
 
-        if len(self.pipeline):
+        if len(self._running):
+            active = sorted(self._running.values(), key=lambda j: self._job_order[j])
+            self._print_active_item(active[0], env, len(active) - 1)
+        elif len(self.pipeline):
             self._print_active_item(self.pipeline[0], env)
         return True
 
     def _clear_print_tmp(self):
         for _ in range(self._tmp_lines):
-            print(f"{Cursor.UP()}{ansi.clear_line()}", end="")
+            print(
+                f"{Cursor.UP()}{ansi.clear_line()}", end="", file=unrecorded(sys.stdout)
+            )
         self._tmp_lines = 0
 
-    def _print_active_item(self, p_item: PipelineItem, env: Env):
+    def _print_active_item(self, p_item: PipelineItem, env: Env, others: int = 0):
         t = time.strftime("%H:%M:%S", time.localtime())
-        self._print_tmp(f"Active job: {p_item.name} ({t})", env)
+        more = f" and {others} more" if others else ""
+        self._print_tmp(f"Active job: {p_item.name}{more} ({t})", env)
 
     def _print_tmp(self, msg, env: Env, *args, **kwargs):
         """Prints a text to be rewriten latter."""
@@ -119,7 +359,7 @@ class JobPipeline(ABC):
                 max(ceil(len(re.sub(ansi_escape, "", line)) / terminal_width), 1)
                 for line in msg.split("\n")
             )
-            print(str(msg), *args, **kwargs)
+            print(str(msg), *args, file=unrecorded(sys.stdout), **kwargs)
 
     def _print(self, msg, env: Env, *args, **kwargs):
         """Prints a text."""
@@ -15,7 +15,7 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from abc import ABC, abstractmethod
-from copy import deepcopy
+from collections import Counter
 from enum import Enum, auto
 import dataclasses
 from functools import wraps
@@ -23,11 +23,21 @@ import hashlib
 import logging
 import os.path
 import sys
-from typing import Optional, AbstractSet, MutableSet, Any, Callable, NamedTuple
+from types import MappingProxyType
+from typing import (
+    Optional,
+    AbstractSet,
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+)
 
 from pisek.jobs.cache import Cache, CacheEntry
 from pisek.env.env import Env
 from pisek.utils.paths import TaskPath
+from pisek.utils.trace import Tracer
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +57,31 @@ class PipelineItemFailure(Exception):
     pass
 
 
+# Jobs of the same kind usually access the same envs, so they share one set
+_shared_envs: dict[frozenset[tuple[str, ...]], frozenset[tuple[str, ...]]] = {}
+
+
+def share_envs(envs: AbstractSet[tuple[str, ...]]) -> frozenset[tuple[str, ...]]:
+    """Returns immutable set of envs equal to given one, shared between jobs."""
+    envs = frozenset(envs)
+    return _shared_envs.setdefault(envs, envs)
+
+
+def freeze(value: Any) -> Any:
+    """
+    Returns read-only snapshot of value that can be shared between consumers.
+    Containers are converted to their immutable counterparts, other values
+    (e.g. frozen dataclasses) are returned as they are.
+    """
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(val) for key, val in value.items()})
+    elif isinstance(value, (list, tuple)):
+        return tuple(freeze(val) for val in value)
+    elif isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    return value
+
+
 class CaptureInitParams:
     """
     Class that stores __init__ args and kwargs of its descendants
@@ -54,9 +89,12 @@ class CaptureInitParams:
     """
 
     _initialized = False
-    _accessed_envs: MutableSet[tuple[str, ...]]
+    _accessed_envs: frozenset[tuple[str, ...]]
 
     def __init_subclass__(cls):
+        if "__init__" not in cls.__dict__:
+            return  # Inherited __init__ is wrapped already
+
         real_init = cls.__init__
 
         @wraps(real_init)
@@ -72,7 +110,9 @@ class CaptureInitParams:
             real_init(self, self._env, *args, **kwargs)
 
             if toplevel:
-                self._accessed_envs |= self._env.get_accessed()
+                self._accessed_envs = share_envs(
+                    self._accessed_envs | self._env.get_accessed()
+                )
                 self._env.clear_accesses()
 
         cls.__init__ = wrapped_init
@@ -100,6 +140,8 @@ class PipelineItem(ABC):
         self.prerequisites = 0
         self.required_by: list[RequiredBy] = []
         self.prerequisites_results: dict[str, Any] = {}
+        self._notified = False  # Have required_by been notified already?
+        self._shared_result: Any = None  # Frozen result given to required_by
 
     def _colored(self, msg: str, color: str) -> str:
         return self._env.colored(msg, color)
@@ -149,19 +191,31 @@ class PipelineItem(ABC):
             return
 
         self.prerequisites += 1
-        item.required_by.append(RequiredBy(self, name, condition))
+        required_by = RequiredBy(self, name, condition)
+        if item._notified or item.state == State.cancelled:
+            # Item has finished before this one was created
+            item._notify(required_by)
+        else:
+            item.required_by.append(required_by)
+
+    def _notify(self, required_by: RequiredBy) -> None:
+        """Notifies PipelineItem that depends on this one that it has finished."""
+        item, name, condition = required_by
+        if item.run_always or (
+            self.state == State.succeeded and condition(self.result)
+        ):
+            item.prerequisites -= 1
+            if name is not None:
+                item.prerequisites_results[name] = self._shared_result
+        else:
+            item.cancel()
 
     def finish(self) -> None:
         """Notifies PipelineItems that depend on this job."""
-        for item, name, condition in self.required_by:
-            if item.run_always or (
-                self.state == State.succeeded and condition(self.result)
-            ):
-                item.prerequisites -= 1
-                if name is not None:
-                    item.prerequisites_results[name] = deepcopy(self.result)
-            else:
-                item.cancel()
+        self._shared_result = freeze(self.result)
+        self._notified = True
+        for required_by in self.required_by:
+            self._notify(required_by)
 
 
 class Job(PipelineItem, CaptureInitParams):
@@ -169,30 +223,52 @@ class Job(PipelineItem, CaptureInitParams):
 
     _args: list[Any]
     _kwargs: dict[str, Any]
+    _cache: Cache  # Cache of the pipeline run, set while running
 
     def __init__(self, env: Env, name: str) -> None:
         self._env = env
-        self._accessed_envs: MutableSet[tuple[str, ...]] = set()
-        self._accessed_files: MutableSet[str] = set()
-        self._terminal_output: list[tuple[str, bool]] = []
+        self._accessed_envs: frozenset[tuple[str, ...]] = frozenset()
+        # Allocated only once something is accessed / printed
+        self._accessed_files: Optional[set[str]] = None
+        self._terminal_output: Optional[list[tuple[str, bool]]] = None
+        self._buffer_output = False
+        self.cached = False  # Was result loaded from cache?
         self.name = name
         super().__init__(name)
 
     def _print(self, msg: str, end: str = "\n", stderr: bool = False) -> None:
         """Prints text to stdout/stderr and caches it."""
+        if self._terminal_output is None:
+            self._terminal_output = []
         self._terminal_output.append((msg + end, stderr))
-        return super()._print(msg, end, stderr)
+        if self._buffer_output:
+            self.dirty = True
+        else:
+            super()._print(msg, end, stderr)
+
+    def flush_output(self) -> None:
+        """Prints text that was buffered while running."""
+        for msg, stderr in self._terminal_output or []:
+            super()._print(msg, end="", stderr=stderr)
+
+    def cancel(self) -> None:
+        if self.state == State.running:
+            return  # Already running in background, let it finish
+        super().cancel()
 
     def _access_file(self, filename: TaskPath) -> None:
         """Add file this job depends on."""
+        if self._accessed_files is None:
+            self._accessed_files = set()
         self._accessed_files.add(filename.path)
 
     @property
     def accessed_files(self) -> set[str]:
-        return set(self._accessed_files)
+        return set(self._accessed_files or ())
 
     def _signature(
         self,
+        cache: Cache,
         envs: AbstractSet[tuple[str, ...]],
         paths: AbstractSet[str],
         results: dict[str, Any],
@@ -229,9 +305,7 @@ class Job(PipelineItem, CaptureInitParams):
                 return (None, f"File nonexistent: {path}")
 
         for file in sorted(expanded_files):
-            with open(file, "rb") as f:
-                file_sign = hashlib.file_digest(f, "sha256")
-            sign.update(f"{file}={file_sign.hexdigest()}\n".encode())
+            sign.update(f"{file}={cache.file_digest(file)}\n".encode())
 
         for name, result in sorted(results.items()):
             # Trying to prevent hashing object.__str__ which is non-deterministic
@@ -244,10 +318,11 @@ class Job(PipelineItem, CaptureInitParams):
 
         return (sign.hexdigest(), None)
 
-    def _find_entry(self, cache_entries: list[CacheEntry]) -> Optional[CacheEntry]:
+    def _find_entry(self, cache: Cache) -> Optional[CacheEntry]:
         """Finds a corresponding CacheEntry for this Job."""
-        for cache_entry in cache_entries:
+        for cache_entry in cache[self.name]:
             sign, err = self._signature(
+                cache,
                 set(cache_entry.envs),
                 set(cache_entry.files),
                 self.prerequisites_results,
@@ -256,11 +331,12 @@ class Job(PipelineItem, CaptureInitParams):
                 return cache_entry
         return None
 
-    def _export(self, result: Any) -> CacheEntry:
+    def _export(self, cache: Cache, result: Any) -> CacheEntry:
         """Export this job into CacheEntry."""
         sign, err = self._signature(
+            cache,
             self._accessed_envs,
-            self._accessed_files,
+            self._accessed_files or set(),
             self.prerequisites_results,
         )
         if sign is None:
@@ -272,22 +348,32 @@ class Job(PipelineItem, CaptureInitParams):
             sign,
             result,
             self._accessed_envs,
-            self._accessed_files,
+            self._accessed_files or set(),
             self.prerequisites_results,
-            self._terminal_output,
+            self._terminal_output or [],
         )
 
-    def run_job(self, cache: Cache) -> None:
-        """Run this job. If result is already in cache use it instead."""
+    def run_job(self, cache: Cache, buffer_output: bool = False) -> None:
+        """
+        Run this job. If result is already in cache use it instead.
+        With buffer_output, nothing is printed until flush_output is called.
+        """
         if self.state == State.cancelled:
             return None
+        with Tracer.span(self.name, "job"):
+            self._run_job(cache, buffer_output)
+
+    def _run_job(self, cache: Cache, buffer_output: bool) -> None:
+        self._buffer_output = buffer_output
+        self._cache = cache
         self._check_prerequisites()
         self.state = State.running
 
-        cached = False
-        if self.name in cache and (entry := self._find_entry(cache[self.name])):
+        with Tracer.span("cache lookup", "cache"):
+            entry = self._find_entry(cache) if self.name in cache else None
+        if entry is not None:
             logger.info(f"Loading cached '{self.name}'")
-            cached = True
+            self.cached = True
             cache.move_to_top(entry)
             for msg, stderr in entry.output:
                 self._print(msg, end="", stderr=stderr)
@@ -298,13 +384,16 @@ class Job(PipelineItem, CaptureInitParams):
             try:
                 self._env.clear_accesses()
                 self.result = self._run()
-                self._accessed_envs |= self._env.get_accessed()
+                self._accessed_envs = share_envs(
+                    self._accessed_envs | self._env.get_accessed()
+                )
             except PipelineItemFailure as failure:
                 self._fail(failure)
 
         if self.state != State.failed:
-            if not cached:
-                cache.add(self._export(self.result))
+            if not self.cached:
+                with Tracer.span("cache signature", "cache"):
+                    cache.add(self._export(cache, self.result))
             self.state = State.succeeded
 
     @abstractmethod
@@ -316,34 +405,107 @@ class Job(PipelineItem, CaptureInitParams):
 class JobManager(PipelineItem):
     """Object that can create jobs and compute depending on their results."""
 
-    def create_jobs(self, env: Env) -> list[Job]:
-        """Crates this JobManager's jobs."""
+    # Jobs have no prerequisites and can always run in parallel
+    independent_jobs: bool = False
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.jobs_count = 0  # Number of jobs created so far
+        # Finished jobs are released, only their states (and failed jobs) are kept
+        self._unfinished_jobs: list[Job] = []
+        self._finished_states: Counter[State] = Counter()
+        self._failed_jobs: list[Job] = []
+        self._pending_jobs: Optional[Iterator[Job]] = None
+
+    def create_jobs(
+        self, env: Env, cache: Cache, count: Optional[int] = None
+    ) -> list[Job]:
+        """
+        Starts creating this JobManager's jobs and returns first count of them
+        (or all of them if count is None). Rest can be got by next_jobs.
+        """
         self.result: Optional[dict[str, Any]]
         self._env = env
-        if self.state == State.cancelled:
-            self.jobs = []
-        else:
+        self._cache = cache
+        if self.state != State.cancelled:
             self.state = State.running
             self._check_prerequisites()
             try:
-                self.jobs = self._get_jobs()
+                with Tracer.span(f"{self.name}: create jobs", "manager"):
+                    self._pending_jobs = iter(self._get_jobs())
             except PipelineItemFailure as failure:
                 self._fail(failure)
-                self.jobs = []
-        return self.jobs
+        return self.next_jobs(count)
+
+    def next_jobs(self, count: Optional[int] = None) -> list[Job]:
+        """Creates next count of this JobManager's jobs (or all remaining if count is None)."""
+        with Tracer.span(f"{self.name}: create jobs", "manager"):
+            new_jobs: list[Job] = []
+            while self._pending_jobs is not None and (
+                count is None or len(new_jobs) < count
+            ):
+                if self.state == State.cancelled:
+                    self._pending_jobs = None
+                    break
+                try:
+                    new_jobs.append(next(self._pending_jobs))
+                except StopIteration:
+                    self._pending_jobs = None
+                except PipelineItemFailure as failure:
+                    self._fail(failure)
+                    self._pending_jobs = None
+
+            self.jobs_count += len(new_jobs)
+            self._unfinished_jobs += new_jobs
+            return new_jobs
+
+    def has_pending_jobs(self) -> bool:
+        """Returns whether some of this JobManager's jobs have not been created yet."""
+        return self._pending_jobs is not None
 
     @abstractmethod
-    def _get_jobs(self) -> list[Job]:
-        """Actually creates this JobManager's jobs (without management)."""
+    def _get_jobs(self) -> Iterable[Job]:
+        """
+        Actually creates this JobManager's jobs (without management).
+        Jobs can be yielded one by one, so they are created only when needed.
+        Prerequisites of a job must be created before it.
+        """
         pass
 
-    def _job_states(self) -> tuple[State, ...]:
-        """States of this manager's jobs."""
-        return tuple(map(lambda j: j.state, self.jobs))
+    def unfinished_jobs(self) -> int:
+        """Returns number of created jobs that have not finished yet."""
+        self._release_finished_jobs()
+        return len(self._unfinished_jobs)
+
+    def _release_finished_jobs(self) -> None:
+        unfinished = []
+        for job in self._unfinished_jobs:
+            if job.state in (State.succeeded, State.failed, State.cancelled):
+                self._finished_states[job.state] += 1
+                if job.state == State.failed:
+                    self._failed_jobs.append(job)
+            else:
+                unfinished.append(job)
+        self._unfinished_jobs = unfinished
 
-    def _jobs_with_state(self, state: State) -> list[Job]:
-        """Filter this manager's jobs by state."""
-        return list(filter(lambda j: j.state == state, self.jobs))
+    def _job_states(self) -> set[State]:
+        """States of this manager's jobs."""
+        self._release_finished_jobs()
+        return {job.state for job in self._unfinished_jobs} | {
+            state for state, count in self._finished_states.items() if count
+        }
+
+    def _count_jobs(self, state: State) -> int:
+        """Number of this manager's jobs with given state."""
+        self._release_finished_jobs()
+        if state in (State.succeeded, State.failed, State.cancelled):
+            return self._finished_states[state]
+        return sum(job.state == state for job in self._unfinished_jobs)
+
+    def _failed(self) -> list[Job]:
+        """This manager's failed jobs."""
+        self._release_finished_jobs()
+        return self._failed_jobs
 
     def _update(self) -> None:
         """Override this function for manager-specific."""
@@ -351,18 +513,23 @@ class JobManager(PipelineItem):
 
     def update(self) -> str:
         """Update this manager's state according to its jobs and return status."""
-        self._update()
-        states = self._job_states()
-        if self.state in (State.failed, State.cancelled):
-            pass
-        elif State.in_queue in states or State.running in states:
-            self.state = State.running
-        elif State.failed in states:
-            self.state = State.failed
-        else:
-            self.state = State.running
+        with Tracer.span(f"{self.name}: update", "manager"):
+            self._update()
+            states = self._job_states()
+            if self.state in (State.failed, State.cancelled):
+                pass
+            elif (
+                State.in_queue in states
+                or State.running in states
+                or self.has_pending_jobs()
+            ):
+                self.state = State.running
+            elif State.failed in states:
+                self.state = State.failed
+            else:
+                self.state = State.running
 
-        return self._get_status()
+            return self._get_status()
 
     @abstractmethod
     def _get_status(self) -> str:
@@ -374,20 +541,20 @@ class JobManager(PipelineItem):
         Returns whether manager is ready for evaluation.
         (i.e. All of it's jobs have finished)
         """
-        return self.state == State.running and len(
-            self._jobs_with_state(State.succeeded)
-            + self._jobs_with_state(State.cancelled)
-        ) == len(self.jobs)
+        return (
+            self.state == State.running
+            and not self.has_pending_jobs()
+            and self._count_jobs(State.succeeded) + self._count_jobs(State.cancelled)
+            == self.jobs_count
+        )
 
     def any_failed(self) -> bool:
         """Returns whether this manager or its jobs had any failures so far."""
-        return (
-            self.state == State.failed or len(self._jobs_with_state(State.failed)) > 0
-        )
+        return self.state == State.failed or len(self._failed()) > 0
 
     def failures(self) -> str:
         """Returns failures of failed jobs or manager itself."""
-        failed = self._jobs_with_state(State.failed)
+        failed = self._failed()
         if len(failed):
             failed_msg = "\n".join([f'"{job.name}": {job.fail_msg}' for job in failed])
             return f"{len(failed)} jobs failed:\n{failed_msg}"
@@ -397,23 +564,28 @@ class JobManager(PipelineItem):
     def finalize(self) -> str:
         """Finalizes this JobManager - Does final evaluation and returns final status."""
 
-        if self.state == State.running:
-            try:
-                self._evaluate()
-            except PipelineItemFailure as failure:
-                self._fail(failure)
-            else:
-                self.state = State.succeeded
+        with Tracer.span(f"{self.name}: finalize", "manager"):
+            if self.state == State.running:
+                try:
+                    self._evaluate()
+                except PipelineItemFailure as failure:
+                    self._fail(failure)
+                else:
+                    self.state = State.succeeded
 
-        self.result = self._compute_result()
+            self.result = self._compute_result()
 
-        super().finish()
-        return self._get_status()
+            super().finish()
+            return self._get_status()
 
     def _evaluate(self) -> None:
         """Decide whether jobs did run as expected and return result."""
         pass
 
+    def events(self) -> list[tuple[str, dict[str, Any]]]:
+        """Returns additional progress events (name and fields) after finalization."""
+        return []
+
     def _compute_result(self) -> dict[str, Any]:
         """Creates result to be read by other managers."""
         return {}
@@ -0,0 +1,160 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import logging
+import os
+import sys
+from typing import Any, Iterable, Optional
+
+from pydantic import BaseModel
+
+from pisek.version import __version__
+from pisek.env.env import Env
+from pisek.jobs.cache import Cache
+from pisek.utils.paths import BUILD_DIR, INTERNALS_DIR, TESTS_DIR
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = os.path.join(INTERNALS_DIR, "manifest.json")
+# Don't influence results of jobs nor the recorded output
+IGNORED_ENVS = {"iteration", "jobs", "no_jumps"}
+
+
+def _fields(value: Any) -> Any:
+    """Fields of models as nested dicts. (Computed fields are left out.)"""
+    if isinstance(value, BaseModel):
+        return {
+            name: _fields(value.__dict__[name]) for name in type(value).model_fields
+        }
+    elif isinstance(value, dict):
+        return {str(key): _fields(val) for key, val in value.items()}
+    elif isinstance(value, (list, tuple)):
+        return [_fields(val) for val in value]
+    elif isinstance(value, (set, frozenset)):
+        return sorted((_fields(val) for val in value), key=repr)
+    return value
+
+
+def env_digest(env: Env) -> str:
+    """Digest of pisek version, testing settings and task config."""
+    fields = _fields(env)
+    for name in IGNORED_ENVS:
+        del fields[name]
+    content = json.dumps([__version__, fields], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def file_digest(cache: Cache, path: str) -> Optional[str]:
+    """Digest of a file (or of names in a directory), None if it doesn't exist."""
+    if os.path.isdir(path):
+        names = "\n".join(sorted(os.listdir(path)))
+        return hashlib.sha256(names.encode()).hexdigest()
+    try:
+        return cache.file_digest(path)
+    except FileNotFoundError:
+        return None
+
+
+class Manifest:
+    """
+    Record of the last successful run of a pipeline.
+
+    Contains digest of the environment, digests of all files accessed by the run
+    and the output of the run. If none of them changed, running the pipeline again
+    would only load all jobs from the cache, so the output can be printed instead.
+    """
+
+    def __init__(
+        self,
+        env: str,
+        files: dict[str, Optional[str]],
+        output: list[tuple[str, bool]],
+    ) -> None:
+        self.env = env
+        self.files = files
+        self.output = output
+
+    @classmethod
+    def create(
+        cls,
+        env: Env,
+        cache: Cache,
+        files: Iterable[str],
+        output: list[tuple[str, bool]],
+    ) -> "Manifest":
+        paths = set(files)
+        # Directories are globbed by managers which aren't cached
+        paths |= {
+            os.path.dirname(path) or "."
+            for path in paths
+            if not path.startswith((BUILD_DIR, TESTS_DIR, INTERNALS_DIR))
+        }
+        return cls(
+            env_digest(env),
+            {path: file_digest(cache, path) for path in sorted(paths)},
+            output,
+        )
+
+    @classmethod
+    def load(cls) -> Optional["Manifest"]:
+        """Load manifest of the last successful run if there is one."""
+        try:
+            with open(MANIFEST_FILE) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != __version__:
+            return None
+        return cls(data["env"], data["files"], [tuple(o) for o in data["output"]])
+
+    def export(self) -> None:
+        os.makedirs(INTERNALS_DIR, exist_ok=True)
+        with open(MANIFEST_FILE, "w") as f:
+            json.dump(
+                {
+                    "version": __version__,
+                    "env": self.env,
+                    "files": self.files,
+                    "output": self.output,
+                },
+                f,
+            )
+
+    @staticmethod
+    def remove() -> None:
+        if os.path.exists(MANIFEST_FILE):
+            os.remove(MANIFEST_FILE)
+
+    def changed_files(self, cache: Cache) -> list[str]:
+        """Files that changed since the run."""
+        return [
+            path
+            for path, digest in self.files.items()
+            if file_digest(cache, path) != digest
+        ]
+
+    def matches(self, env: Env, cache: Cache) -> bool:
+        """Whether running the pipeline again would give the same results."""
+        if env_digest(env) != self.env:
+            logger.info("Testing settings or config changed since last run")
+            return False
+        if changed := self.changed_files(cache):
+            logger.info(f"Changed since last run: {', '.join(changed)}")
+            return False
+        return True
+
+    def replay(self) -> None:
+        """Print output of the run again."""
+        for text, stderr in self.output:
+            (sys.stderr if stderr else sys.stdout).write(text)
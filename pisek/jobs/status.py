@@ -46,9 +46,8 @@ class StatusJobManager(JobManager):
 
         return self._bar(
             msg,
-            len(self._jobs_with_state(State.succeeded))
-            + (self.state == State.succeeded),
-            len(self.jobs) + 1,
+            self._count_jobs(State.succeeded) + (self.state == State.succeeded),
+            self.jobs_count + 1,
             color=color,
         )
 
@@ -63,7 +62,7 @@ class StatusJobManager(JobManager):
     def failures(self) -> str:
         """Returns failures of failed jobs."""
         fails = []
-        for job in self._jobs_with_state(State.failed):
+        for job in self._failed():
             fails.append(self._fail_message(job))
 
         if self.fail_msg != "":
@@ -30,6 +30,7 @@ from pisek.task_jobs.task_manager import (
 
 from pisek.jobs.jobs import JobManager
 from pisek.task_jobs.tools import ToolsManager
+from pisek.task_jobs.compile import CompileManager
 from pisek.task_jobs.data.manager import DataManager
 from pisek.task_jobs.generator.manager import (
     PrepareGenerator,
@@ -37,8 +38,9 @@ from pisek.task_jobs.generator.manager import (
     TestcaseInfoMixin,
 )
 from pisek.task_jobs.validator import ValidatorManager
-from pisek.task_jobs.judge import JudgeManager
+from pisek.task_jobs.judge import JudgeManager, clear_judged_outputs
 from pisek.task_jobs.solution.manager import SolutionManager
+from pisek.task_jobs.solution.solution import clear_shared_runs
 from pisek.task_jobs.testing_log import CreateTestingLog
 from pisek.task_jobs.completeness_check import CompletenessCheck
 
@@ -48,8 +50,15 @@ class TaskPipeline(JobPipeline):
 
     def __init__(self, env: Env):
         super().__init__()
+        # Results shared between jobs are valid only within one run
+        clear_shared_runs()
+        clear_judged_outputs()
+        test_solutions = not (
+            env.target == TestingTarget.generator or not env.config.solutions
+        )
         named_pipeline: list[tuple[JobManager, str]] = [
-            tools := (ToolsManager(), TOOLS_MAN_CODE)
+            tools := (ToolsManager(), TOOLS_MAN_CODE),
+            (CompileManager(test_solutions), ""),
         ]
         if env.config.in_gen is not None:
             named_pipeline.append(generator := (PrepareGenerator(), GENERATOR_MAN_CODE))
@@ -67,7 +76,7 @@ class TaskPipeline(JobPipeline):
         solutions = []
         self.input_generator: TestcaseInfoMixin
 
-        if env.target == TestingTarget.generator or not env.config.solutions:
+        if not test_solutions:
             named_pipeline.append(gen_inputs := (RunGenerator(), ""))
             gen_inputs[0].add_prerequisite(*inputs)
             self.input_generator = gen_inputs[0]
@@ -0,0 +1,115 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from functools import cache
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Iterable, Optional
+
+ARTIFACT_CACHE_VARIABLE = "PISEK_ARTIFACT_CACHE"
+
+
+@cache
+def compiler_version(compiler: str) -> str:
+    """Returns path and version of given compiler."""
+    path = shutil.which(compiler) or compiler
+    version_flag = "-iV" if os.path.basename(compiler) == "fpc" else "--version"
+    try:
+        version = subprocess.run(
+            [path, version_flag], stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        ).stdout.decode(errors="replace")
+    except OSError:
+        version = ""
+    return f"{path}\n{version}"
+
+
+def _file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class ArtifactCache:
+    """
+    Compiled programs shared by all tasks, addressed by hash of
+    compiler version, compiler arguments and contents of compiled files.
+
+    Enabled by setting PISEK_ARTIFACT_CACHE to the cache directory.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @staticmethod
+    def from_environ() -> Optional["ArtifactCache"]:
+        """Returns the artifact cache if it is enabled."""
+        directory = os.environ.get(ARTIFACT_CACHE_VARIABLE, "")
+        if not directory:
+            return None
+        return ArtifactCache(os.path.expanduser(directory))
+
+    def key(self, args: list[str], target: str, inputs: Iterable[str] = ()) -> str:
+        """
+        Computes key of compilation with given args producing target.
+        Files given in args or inputs are hashed by their content.
+        """
+        key = hashlib.sha256()
+        key.update(f"{compiler_version(args[0])}\0".encode())
+        for arg in args:
+            if os.path.isfile(arg):
+                arg = f"<file {_file_digest(arg)}>"
+            key.update(f"{arg.replace(target, '<target>')}\0".encode())
+        for input_ in sorted(inputs):
+            key.update(f"{os.path.basename(input_)}={_file_digest(input_)}\0".encode())
+        return key.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def load(self, key: str, target: str) -> Optional[str]:
+        """
+        Copies cached program to target.
+        Returns compiler diagnostics or None if the program is not cached.
+        """
+        path = self._path(key)
+        try:
+            with open(f"{path}.log") as f:
+                diagnostics = f.read()
+            _atomic_copy(path, target)
+        except FileNotFoundError:
+            return None
+        return diagnostics
+
+    def store(self, key: str, target: str, diagnostics: str) -> None:
+        """Stores compiled target together with compiler diagnostics."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_copy(target, path)
+
+        fd, tmp_log = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            f.write(diagnostics)
+        os.replace(tmp_log, f"{path}.log")
+
+
+def _atomic_copy(source: str, destination: str) -> None:
+    """Copies file so that nobody sees it partially written."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination) or ".")
+    os.close(fd)
+    try:
+        shutil.copy(source, tmp_path)
+        os.replace(tmp_path, destination)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
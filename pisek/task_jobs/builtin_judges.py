@@ -0,0 +1,276 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Output comparison done inside pisek, so that no process needs to be spawned
+for each output. Verdicts and messages are the same as of `diff -Bb`
+and of judge-token from judgelib.
+"""
+
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+import math
+import mmap
+import os
+import re
+import sys
+from typing import Iterator, Optional, Union
+
+Data = Union[bytes, mmap.mmap]
+
+CHUNK_SIZE = 1 << 20
+
+
+@contextmanager
+def _map_file(path: str) -> Iterator[Data]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""  # Empty files cannot be mapped
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def _same_content(data1: Data, data2: Data) -> bool:
+    if len(data1) != len(data2):
+        return False
+    for start in range(0, len(data1), CHUNK_SIZE):
+        if data1[start : start + CHUNK_SIZE] != data2[start : start + CHUNK_SIZE]:
+            return False
+    return True
+
+
+# diff -Bb
+
+_LINE_RE = re.compile(rb"[^\n]*\n|[^\n]+")
+_SPACES_RE = re.compile(rb"[ \t\n\v\f\r]+")
+
+
+def _nonblank_lines(data: Data) -> Iterator[tuple[int, Optional[bytes]]]:
+    """
+    Yields lines normalized as with `diff -b` that are not blank,
+    each with number of blank lines before it. Finally yields number
+    of trailing blank lines with None.
+    """
+    blank = 0
+    for match in _LINE_RE.finditer(data):
+        line = _SPACES_RE.sub(b" ", match.group()).rstrip(b" ")
+        if line:
+            yield blank, line
+            blank = 0
+        else:
+            blank += 1
+    yield blank, None
+
+
+def diff_files(output: str, correct: str) -> Optional[bool]:
+    """
+    Returns whether `diff -Bb output correct` finds the files the same.
+
+    Returns None when this cannot be easily decided. These are binary files
+    and files differing in blank lines that are not trailing.
+    (Then the result depends on how diff aligns the blank lines.)
+    """
+    with _map_file(output) as data1, _map_file(correct) as data2:
+        if _same_content(data1, data2):
+            return True
+        if data1.find(b"\0") >= 0 or data2.find(b"\0") >= 0:
+            return None
+
+        blank_lines_differ = False
+        for (blank1, line1), (blank2, line2) in zip(
+            _nonblank_lines(data1), _nonblank_lines(data2)
+        ):
+            if line1 != line2:
+                # Non-blank line must be in some hunk
+                return False
+            if line1 is None:
+                # Only trailing blank lines differ, which diff ignores
+                return None if blank_lines_differ else True
+            if blank1 != blank2:
+                blank_lines_differ = True
+
+    raise RuntimeError("Unreachable")  # To make mypy happy
+
+
+# judge-token
+
+MAX_TOKEN_SIZE = 32 << 20
+
+_TOKEN_RE = re.compile(rb"[^ \t\r\n]+")
+_TOKEN_OR_NEWLINE_RE = re.compile(rb"[^ \t\r\n]+|\n")
+_STRTOD_RE = re.compile(
+    rb"""[+-]?(?:
+        (?P<dec>(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)
+        | (?P<hex>0[xX](?:[0-9a-fA-F]+\.?[0-9a-fA-F]*|\.[0-9a-fA-F]+)(?:[pP][+-]?[0-9]+)?)
+        | (?i:inf(?:inity)?|nan(?:\([0-9A-Za-z_]*\))?)
+    )""",
+    re.VERBOSE,
+)
+_HEX_RE = re.compile(
+    rb"[+-]?0[xX]([0-9a-fA-F]*)\.?([0-9a-fA-F]*)(?:[pP]([+-]?[0-9]+))?"
+)
+
+
+class _Rejected(Exception):
+    pass
+
+
+def _c_string(token: bytes) -> bytes:
+    """Token as seen by C string functions."""
+    return token.split(b"\0", 1)[0]
+
+
+def _to_double(token: bytes) -> Optional[float]:
+    """Parses token as strtod in tokenizer::to_double does."""
+    match = _STRTOD_RE.fullmatch(token)
+    if match is None:
+        return None
+
+    if match["dec"] is not None:
+        x = float(token)
+        if math.isinf(x):
+            return None  # ERANGE on overflow
+    elif match["hex"] is not None:
+        try:
+            x = float.fromhex(token.decode())
+        except OverflowError:
+            return None  # ERANGE on overflow
+    else:
+        return float(token.split(b"(")[0])  # inf or nan
+
+    if abs(x) < sys.float_info.min and not _is_exact(x, match):
+        return None  # ERANGE on inexact underflow
+    return x
+
+
+def _is_exact(x: float, match: re.Match) -> bool:
+    if match["dec"] is not None:
+        try:
+            return Decimal(x) == Decimal(match.group().decode())
+        except InvalidOperation:
+            # Exponent is out of Decimal's range, so the number
+            # is either zero or very far from any double
+            mantissa = re.split(rb"[eE]", match["dec"])[0]
+            return mantissa.strip(b"0.") == b""
+
+    hex_match = _HEX_RE.fullmatch(match.group())
+    assert hex_match is not None
+    whole, fraction, exponent = hex_match.groups()
+    mantissa = int(whole + fraction or b"0", 16)
+    if mantissa == 0 or x == 0:
+        return mantissa == 0
+    value = Fraction(mantissa, 16 ** len(fraction)) * Fraction(2) ** int(exponent or 0)
+    return Fraction(abs(x)) == value
+
+
+class _Tokenizer:
+    """Reads tokens as tokenizer from judgelib."""
+
+    def __init__(self, path: str, data: Data, report_lines: bool) -> None:
+        self.name = os.path.basename(path)
+        self.report_lines = report_lines
+        self.token = b""
+        self._data = data
+        self._pos = 0
+
+    def get_token(self) -> Optional[bytes]:
+        regex = _TOKEN_OR_NEWLINE_RE if self.report_lines else _TOKEN_RE
+        match = regex.search(self._data, self._pos)
+        if match is None:
+            self._pos = len(self._data)
+            return None
+
+        self.token = match.group()
+        self._pos = match.end()
+        if self.token == b"\n":
+            self.token = b""
+        elif len(self.token) > MAX_TOKEN_SIZE:
+            self._pos = match.start() + MAX_TOKEN_SIZE + 1
+            self.reject(b"Token too long")
+        return self.token
+
+    def reject(self, message: bytes) -> None:
+        line = self._data[: self._pos].count(b"\n") + 1
+        raise _Rejected(
+            f"Error at {self.name} line {line}: ".encode() + message + b"\n"
+        )
+
+
+class TokenJudge:
+    """Compares tokens of two files as judge-token from judgelib."""
+
+    def __init__(
+        self,
+        ignore_newlines: bool = False,
+        ignore_trailing_newlines: bool = True,
+        ignore_case: bool = False,
+        float_rel_error: Optional[float] = None,
+        float_abs_error: Optional[float] = None,
+    ) -> None:
+        self.ignore_newlines = ignore_newlines
+        self.ignore_trailing_newlines = ignore_trailing_newlines
+        self.ignore_case = ignore_case
+        self.real_mode = float_rel_error is not None
+        self.rel_eps = 1e-5 if float_rel_error is None else float_rel_error
+        self.abs_eps = 1e-30 if float_abs_error is None else float_abs_error
+
+    def judge(self, output: str, correct: str) -> tuple[bool, str]:
+        """
+        Returns whether the output is accepted and message judge-token would
+        write to stderr. Raises OSError if files cannot be read.
+        """
+        with _map_file(output) as data1, _map_file(correct) as data2:
+            t1 = _Tokenizer(output, data1, not self.ignore_newlines)
+            t2 = _Tokenizer(correct, data2, not self.ignore_newlines)
+            try:
+                self._compare(t1, t2)
+            except _Rejected as rejected:
+                return False, rejected.args[0].decode("utf-8", errors="replace")
+        return True, ""
+
+    def _compare(self, t1: _Tokenizer, t2: _Tokenizer) -> None:
+        while True:
+            a, b = t1.get_token(), t2.get_token()
+            if a is None:
+                if b is not None and not self._trailing_nl(t2):
+                    t1.reject(b"Ends too early")
+                break
+            elif b is None:
+                if not self._trailing_nl(t1):
+                    t2.reject(b"Garbage at the end")
+                break
+            elif not self._tokens_equal(a, b):
+                t1.reject(b"Found <%s>, expected <%s>" % (_c_string(a), _c_string(b)))
+
+    def _tokens_equal(self, a: bytes, b: bytes) -> bool:
+        if self.real_mode:
+            x1, x2 = _to_double(a), _to_double(b)
+            if x1 is not None and x2 is not None:
+                if x1 == x2:
+                    return True
+                eps = max(abs(x2 * self.rel_eps), self.abs_eps)
+                return abs(x1 - x2) <= eps
+            # If they fail to convert, compare them as strings.
+
+        a, b = _c_string(a), _c_string(b)
+        if self.ignore_case:
+            return a.lower() == b.lower()
+        return a == b
+
+    def _trailing_nl(self, t: _Tokenizer) -> bool:
+        # Ignore empty lines at the end of file
+        if _c_string(t.token) or not self.ignore_trailing_newlines:
+            return False
+        t.report_lines = False
+        return t.get_token() is None
@@ -16,31 +16,33 @@
 
 import random
 import string
+from typing import Any, Callable
 
 from pisek.env.env import Env
 from pisek.utils.paths import TaskPath
 from pisek.task_jobs.task_job import TaskJob
 
 
-def randword(length: int):
+def randword(length: int, rng: random.Random):
     letters = string.ascii_lowercase
-    return "".join(random.choice(letters) for _ in range(length))
+    return "".join(rng.choice(letters) for _ in range(length))
 
 
-NUMER_MODIFIERS = [
-    lambda _: 0,
-    lambda x: int(x) + 1,
-    lambda x: int(x) - 1,
-    lambda x: -int(x),
-    lambda x: int(x) + random.randint(1, 9) / 10,
+# Jobs can run in parallel threads so each has its own random.Random
+NUMER_MODIFIERS: list[Callable[[str, random.Random], Any]] = [
+    lambda _, rng: 0,
+    lambda x, rng: int(x) + 1,
+    lambda x, rng: int(x) - 1,
+    lambda x, rng: -int(x),
+    lambda x, rng: int(x) + rng.randint(1, 9) / 10,
 ]
-ANY_MODIFIERS = [
-    lambda x: f"{x} {x}",
-    lambda _: "",
-    lambda x: randword(len(x)),
-    lambda x: randword(len(x) + 1),
-    lambda x: randword(len(x) - 1),
-    lambda _: random.randint(-10000, 10000),
+ANY_MODIFIERS: list[Callable[[str, random.Random], Any]] = [
+    lambda x, rng: f"{x} {x}",
+    lambda _, rng: "",
+    lambda x, rng: randword(len(x), rng),
+    lambda x, rng: randword(len(x) + 1, rng),
+    lambda x, rng: randword(len(x) - 1, rng),
+    lambda _, rng: rng.randint(-10000, 10000),
 ]
 
 
@@ -74,8 +76,8 @@ class Incomplete(Invalidate):
         with self._open_file(self.from_file) as f:
             lines = f.readlines()
 
-        random.seed(self.seed)
-        lines = lines[: random.randint(0, len(lines) - 1)]
+        rng = random.Random(self.seed)
+        lines = lines[: rng.randint(0, len(lines) - 1)]
 
         with self._open_file(self.to_file, "w") as f:
             f.write("".join(lines))
@@ -99,11 +101,11 @@ class ChaosMonkey(Invalidate):
             for line in f.readlines():
                 lines.append(line.rstrip("\n").split(" "))
 
-        random.seed(self.seed)
-        line = random.randint(0, min(2, len(lines) - 1))
+        rng = random.Random(self.seed)
+        line = rng.randint(0, min(2, len(lines) - 1))
         if line == 2:
-            line = random.randint(2, len(lines) - 1)
-        token = random.randint(0, len(lines[line]) - 1)
+            line = rng.randint(2, len(lines) - 1)
+        token = rng.randint(0, len(lines[line]) - 1)
 
         modifiers = ANY_MODIFIERS[:]
         try:
@@ -112,7 +114,7 @@ class ChaosMonkey(Invalidate):
         except ValueError:
             pass
 
-        lines[line][token] = str(random.choice(modifiers)(lines[line][token]))
+        lines[line][token] = str(rng.choice(modifiers)(lines[line][token], rng))
 
         with self._open_file(self.to_file, "w") as f:
             for line in lines:
@@ -21,9 +21,68 @@ import subprocess
 import sys
 
 from pisek.env.env import Env
+from pisek.config.config_types import OutCheck
 from pisek.utils.paths import TaskPath
-from pisek.jobs.jobs import PipelineItemFailure
+from pisek.jobs.jobs import State, Job, PipelineItemFailure
+from pisek.jobs.cache import Cache
+from pisek.task_jobs.task_manager import TaskJobManager
 from pisek.task_jobs.program import ProgramsJob
+from pisek.task_jobs.artifact_cache import ArtifactCache
+from pisek.task_jobs.tools import PrepareShuffleJudge
+
+
+class CompileManager(TaskJobManager):
+    """
+    Compiles all programs at once, so that compilations can run in parallel.
+    Managers using the programs later get their compilations from cache.
+    """
+
+    independent_jobs = True
+
+    def __init__(self, test_solutions: bool):
+        self._test_solutions = test_solutions
+        super().__init__("Compiling programs")
+
+    def _get_jobs(self) -> list[Job]:
+        config = self._env.config
+        # Jobs must be created the same way as in other managers to share cache
+        jobs: list[Job] = []
+        if config.in_gen is not None:
+            jobs.append(Precompile(self._env, config.in_gen_path))
+        if config.validator is not None:
+            jobs.append(Precompile(self._env, config.validator_path))
+
+        if not self._test_solutions:
+            return jobs
+
+        if config.out_check == OutCheck.judge and config.out_judge is not None:
+            jobs.append(Precompile(self._env, config.out_judge_path))
+        elif config.out_check == OutCheck.shuffle:
+            jobs.append(PrecompileShuffleJudge(self._env))
+
+        for solution in self._env.solutions:
+            jobs.append(Precompile(self._env, config.solution_path(solution), True))
+
+        # Solutions may share a source, which is compiled into the same target
+        unique_jobs: dict[str, Job] = {}
+        for job in jobs:
+            unique_jobs.setdefault(job.name, job)
+        return list(unique_jobs.values())
+
+
+class PrecompileMixin(Job):
+    """
+    Compiles a program in advance. Failures are silently ignored
+    and left to be reported by the job compiling the program later.
+    """
+
+    def run_job(self, cache: Cache, buffer_output: bool = False) -> None:
+        super().run_job(cache, buffer_output)
+        if self.state == State.failed:
+            self.state = State.succeeded
+            self.fail_msg = ""
+            self._terminal_output = None
+            self.dirty = False
 
 
 class Compile(ProgramsJob):
@@ -133,17 +192,32 @@ class Compile(ProgramsJob):
     def _run_compilation(self, args: list[str], program: TaskPath, **kwargs) -> None:
         self._check_tool(args[0])
 
+        artifacts = ArtifactCache.from_environ()
+        if artifacts is not None:
+            headers = [header.path for header in self.headers]
+            key = artifacts.key(args, self.target.path, headers)
+            diagnostics = artifacts.load(key, self.target.path)
+            if diagnostics is not None:
+                if diagnostics:
+                    self._print(diagnostics, end="", stderr=True)
+                return
+
         comp = subprocess.Popen(args, **kwargs, stderr=subprocess.PIPE)
+        lines = []
         while comp.stderr is not None:
             line = comp.stderr.readline().decode()
             if not line:
                 break
+            lines.append(line)
             self._print(line, end="", stderr=True)
 
         comp.wait()
         if comp.returncode != 0:
             raise PipelineItemFailure(f"Compilation of {program:p} failed.")
 
+        if artifacts is not None:
+            artifacts.store(key, self.target.path, "".join(lines))
+
     def _check_tool(self, tool: str) -> None:
         """Checks that a tool exists."""
         try:
@@ -213,3 +287,11 @@ COMPILE_RULES = {
 
 def supported_extensions() -> list[str]:
     return list(COMPILE_RULES)
+
+
+class Precompile(PrecompileMixin, Compile):
+    pass
+
+
+class PrecompileShuffleJudge(PrecompileMixin, PrepareShuffleJudge):
+    pass
@@ -32,7 +32,7 @@ class CompletenessCheck(TaskJobManager):
         return []
 
     def _get_judge_outs(self) -> set[TaskPath]:
-        judge_outs = self.prerequisites_results[JUDGE_MAN_CODE]["judge_outs"]
+        judge_outs = set(self.prerequisites_results[JUDGE_MAN_CODE]["judge_outs"])
         for solution in self._env.solutions:
             judge_outs |= self.prerequisites_results[f"{SOLUTION_MAN_CODE}{solution}"][
                 "judge_outs"
@@ -10,14 +10,13 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-from typing import Any, Iterable
+from typing import Any, Iterable, Mapping, Optional, Sequence
 
 from pisek.utils.paths import TaskPath, InputPath, OutputPath
 from pisek.jobs.jobs import Job, PipelineItemFailure
 from pisek.config.config_types import TaskType
 from pisek.task_jobs.task_manager import TaskJobManager, GENERATOR_MAN_CODE
 from pisek.task_jobs.data.testcase_info import TestcaseInfo, TestcaseGenerationMode
-from pisek.task_jobs.validator import ValidatorJob
 from pisek.task_jobs.generator.manager import TestcaseInfoMixin
 
 from .data import LinkData
@@ -88,6 +87,7 @@ class DataManager(TaskJobManager, TestcaseInfoMixin):
         self._check_one_input_in_nonsample_test()
 
         jobs: list[Job] = []
+        input_ready: dict[TestcaseInfo, Optional[Job]] = {}
 
         for testcase in sorted(used_inputs, key=lambda i: i.name):
             name = testcase.name
@@ -102,7 +102,10 @@ class DataManager(TaskJobManager, TestcaseInfoMixin):
                         input_target_path.to_raw(self._env.config.in_format),
                     )
                 )
-                jobs.extend(self._check_input_jobs(input_target_path, link))
+                check_jobs, input_ready[testcase] = self._check_input_jobs(
+                    input_target_path, link
+                )
+                jobs.extend(check_jobs)
             if (
                 mode == TestcaseGenerationMode.static
                 and self._env.config.task_type != TaskType.interactive
@@ -117,23 +120,18 @@ class DataManager(TaskJobManager, TestcaseInfoMixin):
                 )
                 jobs.extend(self._check_output_jobs(output_target_path, link))
 
-        for test_num, testcases in self._testcase_infos.items():
-            for testcase in testcases:
-                if testcase.generation_mode == TestcaseGenerationMode.generated:
-                    continue
-
-                if test_num > 0 and self._env.config.validator is not None:
-                    jobs.append(
-                        ValidatorJob(
-                            self._env,
-                            self._env.config.validator,
-                            testcase.input_path(self._env, None),
-                            test_num,
-                        )
-                    )
+        for testcase, prerequisite in input_ready.items():
+            jobs += self._validate_jobs(
+                testcase.input_path(self._env, None),
+                self._testcase_tests(testcase),
+                prerequisite,
+            )
 
         return jobs
 
+    def _all_testcases(self) -> Mapping[int, Sequence[TestcaseInfo]]:
+        return self._testcase_infos
+
     def _report_unused_inputs(self, unused_inputs: Iterable[TestcaseInfo]) -> None:
         inputs = list(sorted(unused_inputs, key=lambda inp: inp.name))
         if self._env.config.checks.no_unused_inputs and inputs:
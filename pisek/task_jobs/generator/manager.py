@@ -14,20 +14,22 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from abc import abstractmethod
+from collections import defaultdict
 import random
-from typing import cast, Any, Optional
+from typing import cast, Any, Iterator, Mapping, Optional, Sequence
 from hashlib import blake2b
 
 from pisek.env.env import Env
 from pisek.utils.paths import TaskPath, InputPath, OutputPath, SanitizablePath
-from pisek.config.config_types import GenType, DataFormat
+from pisek.config.config_types import GenType, ValidatorType, DataFormat
 from pisek.jobs.jobs import Job, JobManager
 from pisek.task_jobs.task_manager import TaskJobManager
 from pisek.task_jobs.compile import Compile
 from pisek.task_jobs.program import RunResultKind
 from pisek.task_jobs.data.data import InputSmall, OutputSmall, LinkData
 from pisek.task_jobs.tools import IsClean, Sanitize
-from pisek.task_jobs.validator import ValidatorJob
+from pisek.task_jobs.validator import ValidatorJob, MultiTestValidatorJob
 from pisek.task_jobs.solution.solution import RunBatchSolution
 from pisek.task_jobs.data.testcase_info import TestcaseInfo, TestcaseGenerationMode
 
@@ -48,6 +50,11 @@ from .pisek_v1 import (
     PisekV1Generate,
     PisekV1TestDeterminism,
 )
+from .pisek_multi_v1 import (
+    PisekMultiV1ListInputs,
+    PisekMultiV1Generate,
+    PisekMultiV1TestDeterminism,
+)
 
 SEED_BYTES = 8
 SEED_RANGE = range(0, 1 << (SEED_BYTES * 8))
@@ -80,6 +87,7 @@ def list_inputs_job(env: Env, generator: str) -> GeneratorListInputs:
         GenType.opendata_v1: OpendataV1ListInputs,
         GenType.cms_old: CmsOldListInputs,
         GenType.pisek_v1: PisekV1ListInputs,
+        GenType.pisek_multi_v1: PisekMultiV1ListInputs,
     }
 
     return LIST_INPUTS[env.config.gen_type](env=env, generator=generator)
@@ -92,6 +100,7 @@ def generate_input(
         GenType.opendata_v1: OpendataV1Generate,
         GenType.cms_old: CmsOldGenerate,
         GenType.pisek_v1: PisekV1Generate,
+        GenType.pisek_multi_v1: PisekMultiV1Generate,
     }[env.config.gen_type](
         env=env, generator=generator, testcase_info=testcase_info, seed=seed
     )
@@ -100,9 +109,10 @@ def generate_input(
 def generator_test_determinism(
     env: Env, generator: str, testcase_info: TestcaseInfo, seed: Optional[int]
 ) -> Optional[GeneratorTestDeterminism]:
-    TEST_DETERMINISM = {
+    TEST_DETERMINISM: dict[GenType, type[GeneratorTestDeterminism]] = {
         GenType.opendata_v1: OpendataV1TestDeterminism,
         GenType.pisek_v1: PisekV1TestDeterminism,
+        GenType.pisek_multi_v1: PisekMultiV1TestDeterminism,
     }
 
     if env.config.gen_type not in TEST_DETERMINISM:
@@ -115,9 +125,25 @@ def generator_test_determinism(
 class TestcaseInfoMixin(JobManager):
     def __init__(self, name: str, **kwargs) -> None:
         self.inputs: set[InputPath] = set()
-        self._gen_inputs_job: dict[Optional[int], GenerateInput] = {}
+        self._gen_inputs_job: dict[Optional[int], Job] = {}
+        self._input_ready_job: dict[Optional[int], Optional[Job]] = {}
+        self._tests_of_testcase: Optional[dict[TestcaseInfo, list[int]]] = None
         super().__init__(name=name, **kwargs)
 
+    @abstractmethod
+    def _all_testcases(self) -> Mapping[int, Sequence[TestcaseInfo]]:
+        """Get all inputs grouped by test."""
+        pass
+
+    def _testcase_tests(self, testcase_info: TestcaseInfo) -> list[int]:
+        """Get tests containing given testcase."""
+        if self._tests_of_testcase is None:
+            self._tests_of_testcase = defaultdict(list)
+            for num, testcases in self._all_testcases().items():
+                for testcase in testcases:
+                    self._tests_of_testcase[testcase].append(num)
+        return self._tests_of_testcase.get(testcase_info, [])
+
     def _get_seed(self, iteration: int, testcase_info: TestcaseInfo) -> int:
         name_hash = blake2b(digest_size=SEED_BYTES)
         name_hash.update(
@@ -125,17 +151,20 @@ class TestcaseInfoMixin(JobManager):
         )
         return int.from_bytes(name_hash.digest())
 
-    def _testcase_info_jobs(self, testcase_info: TestcaseInfo, test: int) -> list[Job]:
-        seeds: list[Optional[int]]
+    def _testcase_seeds(self, testcase_info: TestcaseInfo) -> list[Optional[int]]:
         if testcase_info.seeded:
-            seeds = []
-            for i in range(testcase_info.repeat):
-                seeds.append(self._get_seed(i, testcase_info))
+            return [
+                self._get_seed(i, testcase_info) for i in range(testcase_info.repeat)
+            ]
         else:
-            seeds = [None]
+            return [None]
+
+    def _testcase_info_jobs(self, testcase_info: TestcaseInfo, test: int) -> list[Job]:
+        seeds = self._testcase_seeds(testcase_info)
 
         jobs: list[Job] = []
         self._gen_inputs_job = {}
+        self._input_ready_job = {}
 
         skipped: bool = False
         for i, seed in enumerate(seeds):
@@ -148,8 +177,6 @@ class TestcaseInfoMixin(JobManager):
 
             inp_jobs = self._generate_input_jobs(testcase_info, seed, test, i == 0)
             out_jobs = self._solution_jobs(testcase_info, seed, test)
-            if seed in self._gen_inputs_job and len(out_jobs) > 0:
-                out_jobs[0].add_prerequisite(self._gen_inputs_job[seed])
 
             jobs += inp_jobs + out_jobs
 
@@ -183,12 +210,11 @@ class TestcaseInfoMixin(JobManager):
         jobs: list[Job] = []
         input_path = testcase_info.input_path(self._env, seed)
 
-        gen_inp: Optional[GenerateInput]
+        # Job after which the input is generated and sanitized
+        input_ready: Optional[Job] = None
         if testcase_info.generation_mode == TestcaseGenerationMode.generated:
             jobs.append(gen_inp := self._generate_input_job(testcase_info, seed))
-            self._gen_inputs_job[seed] = gen_inp
-        else:
-            gen_inp = None
+            input_ready = gen_inp
 
         if (
             testcase_info.generation_mode == TestcaseGenerationMode.generated
@@ -201,23 +227,42 @@ class TestcaseInfoMixin(JobManager):
             if test_det is not None:
                 jobs.append(test_det)
                 test_det.add_prerequisite(gen_inp)
+                # Testing determinism rewrites the input
+                self._gen_inputs_job[seed] = input_ready = test_det
 
         if testcase_info.generation_mode == TestcaseGenerationMode.generated:
-            jobs += self._check_input_jobs(input_path)
-
-        if self._env.config.validator is not None and test > 0:
-            jobs.append(
-                check_input := ValidatorJob(
-                    self._env,
-                    self._env.config.validator,
-                    input_path,
-                    test,
-                )
-            )
-            check_input.add_prerequisite(gen_inp)
+            check_jobs, input_ready = self._check_input_jobs(input_path, input_ready)
+            jobs += check_jobs
+
+        self._input_ready_job[seed] = input_ready
+
+        if self._env.config.validator_type == ValidatorType.multi_test:
+            tests = self._testcase_tests(testcase_info)
+        else:
+            tests = [test]
+        jobs += self._validate_jobs(input_path, tests, input_ready)
 
         return jobs
 
+    def _validate_jobs(
+        self, input_path: InputPath, tests: list[int], prerequisite: Optional[Job]
+    ) -> list[Job]:
+        """Returns jobs validating given input for given tests."""
+        validator = self._env.config.validator
+        tests = [test for test in tests if test > 0]
+        if validator is None or not tests:
+            return []
+
+        jobs: list[Job]
+        if self._env.config.validator_type == ValidatorType.multi_test:
+            jobs = [MultiTestValidatorJob(self._env, validator, input_path, tests)]
+        else:
+            jobs = [ValidatorJob(self._env, validator, input_path, t) for t in tests]
+
+        for job in jobs:
+            job.add_prerequisite(prerequisite)
+        return jobs
+
     def _generate_input_job(
         self, testcase_info: TestcaseInfo, seed: Optional[int]
     ) -> GenerateInput:
@@ -257,19 +302,24 @@ class TestcaseInfoMixin(JobManager):
 
     def _check_input_jobs(
         self, input_path: InputPath, prerequisite: Optional[Job] = None
-    ) -> list[Job]:
+    ) -> tuple[list[Job], Optional[Job]]:
+        """
+        Returns jobs checking given input
+        and the job after which the input is sanitized.
+        """
         jobs: list[Job] = []
 
         sanitize = self._sanitize_job(input_path, self._env.config.in_format)
         if sanitize is not None:
             jobs.append(sanitize)
             sanitize.add_prerequisite(prerequisite)
+            prerequisite = sanitize
 
         if self._env.config.limits.input_max_size != 0:
             jobs.append(input_small := InputSmall(self._env, input_path))
             input_small.add_prerequisite(prerequisite)
 
-        return jobs
+        return jobs, prerequisite
 
     def _check_output_jobs(
         self, output_path: OutputPath, prerequisite: Optional[Job]
@@ -280,6 +330,7 @@ class TestcaseInfoMixin(JobManager):
         if sanitize is not None:
             jobs.append(sanitize)
             sanitize.add_prerequisite(prerequisite, name="create_source")
+            prerequisite = sanitize
 
         if self._env.config.limits.output_max_size != 0:
             jobs.append(out_small := OutputSmall(self._env, output_path))
@@ -303,11 +354,7 @@ class RunGenerator(TaskJobManager, TestcaseInfoMixin):
     def __init__(self) -> None:
         super().__init__("Run generator")
 
-    def _get_jobs(self) -> list[Job]:
-        jobs = []
-
+    def _get_jobs(self) -> Iterator[Job]:
         for sub_num, inputs in self._all_testcases().items():
             for inp in inputs:
-                jobs += self._testcase_info_jobs(inp, sub_num)
-
-        return jobs
+                yield from self._testcase_info_jobs(inp, sub_num)
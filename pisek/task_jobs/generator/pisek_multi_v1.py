@@ -0,0 +1,93 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+from typing import Optional
+
+from pisek.utils.text import tab
+from pisek.env.env import Env
+from pisek.config.config_types import ProgramType
+from pisek.utils.paths import InputPath
+from pisek.jobs.jobs import PipelineItemFailure
+from pisek.task_jobs.program import ProgramsJob
+from pisek.task_jobs.program_server import ProgramServerError
+from pisek.task_jobs.data.testcase_info import TestcaseInfo
+
+from .base_classes import GenerateInput, GeneratorTestDeterminism
+from .pisek_v1 import PisekV1ListInputs
+
+MULTI_GENERATE_ARG = "-"
+GENERATED_REPLY = "ok"
+
+
+class PisekMultiV1ListInputs(PisekV1ListInputs):
+    """Lists all inputs for pisek-multi-v1 generator."""
+
+    pass
+
+
+class PisekMultiV1GeneratorJob(ProgramsJob):
+    """Abstract class for jobs with generator generating inputs in one process."""
+
+    generator: str
+    seed: Optional[int]
+    testcase_info: TestcaseInfo
+    input_path: InputPath
+
+    def __init__(self, env: Env, *, name: str = "", **kwargs) -> None:
+        super().__init__(env=env, name=name, **kwargs)
+
+    def _gen(self) -> None:
+        seed = "-"
+        if self.testcase_info.seeded:
+            assert self.seed is not None
+            if self.seed < 0:
+                raise ValueError(f"seed {self.seed} is negative")
+            seed = f"{self.seed:016x}"
+
+        input_path = self.input_path.to_raw(self._env.config.in_format)
+        self.make_filedirs(input_path)
+        try:
+            os.remove(input_path.path)
+        except FileNotFoundError:
+            pass
+        self._access_file(input_path)
+
+        failed_msg = f"{self.generator} failed on input {self.testcase_info.name}" + (
+            ":" if self.seed is None else f", seed {self.seed:016x}:"
+        )
+        try:
+            reply = self._request_program(
+                ProgramType.gen,
+                self.generator,
+                [self.testcase_info.name, seed, input_path.path],
+                args=[MULTI_GENERATE_ARG],
+            )
+        except ProgramServerError as e:
+            raise PipelineItemFailure(f"{failed_msg}\n{tab(str(e))}")
+
+        if reply != GENERATED_REPLY:
+            raise PipelineItemFailure(f"{failed_msg}\n{tab(reply)}")
+        if not self._file_exists(input_path):
+            raise PipelineItemFailure(f"{failed_msg}\n{tab('No input generated.')}")
+
+
+class PisekMultiV1Generate(PisekMultiV1GeneratorJob, GenerateInput):
+    """Generates input with given name."""
+
+    pass
+
+
+class PisekMultiV1TestDeterminism(PisekMultiV1GeneratorJob, GeneratorTestDeterminism):
+    """Tests determinism of generating a given input."""
+
+    pass
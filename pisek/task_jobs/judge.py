@@ -15,11 +15,15 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from abc import abstractmethod
+from dataclasses import replace
 from decimal import Decimal
 from functools import cache
 import os
+import hashlib
 import random
 import subprocess
+import threading
+import time
 from typing import Any, Optional, Union
 from tempfile import gettempdir
 from uuid import uuid4
@@ -31,10 +35,13 @@ from pisek.jobs.jobs import State, Job, PipelineItemFailure
 from pisek.utils.text import tab
 from pisek.task_jobs.task_manager import TaskJobManager
 from pisek.task_jobs.run_result import RunResult, RunResultKind
+from pisek.task_jobs.task_job import FileVersion, file_versions
 from pisek.task_jobs.program import ProgramsJob
 from pisek.task_jobs.compile import Compile
 from pisek.task_jobs.chaos_monkey import Incomplete, ChaosMonkey
-from pisek.task_jobs.tools import PrepareTokenJudge, PrepareShuffleJudge
+from pisek.task_jobs.tools import PrepareShuffleJudge
+from pisek.task_jobs.builtin_judges import TokenJudge, diff_files
+from pisek.task_jobs.program_server import ProgramServerError
 from pisek.task_jobs.solution.solution_result import (
     Verdict,
     SolutionResult,
@@ -50,6 +57,7 @@ class JudgeManager(TaskJobManager):
 
     def __init__(self) -> None:
         super().__init__("Preparing judge")
+        self._judge_outs: set[TaskPath] = set()
 
     def _get_jobs(self) -> list[Job]:
         jobs: list[Job] = []
@@ -61,8 +69,6 @@ class JudgeManager(TaskJobManager):
                     f"Unset judge for out_check={self._env.config.out_check.name}"
                 )
             jobs.append(comp := Compile(self._env, self._env.config.out_judge_path))
-        elif self._env.config.out_check == OutCheck.tokens:
-            jobs.append(comp := PrepareTokenJudge(self._env))
         elif self._env.config.out_check == OutCheck.shuffle:
             jobs.append(comp := PrepareShuffleJudge(self._env))
 
@@ -117,16 +123,18 @@ class JudgeManager(TaskJobManager):
                         if comp is not None:
                             run_judge.add_prerequisite(comp)
                         run_judge.add_prerequisite(invalidate)
+
+        # Jobs are released once finished, so outputs are collected now
+        for created in jobs:
+            if isinstance(created, RunJudge):
+                if isinstance(created, RunCMSJudge):
+                    self._judge_outs.add(created.points_file)
+                self._judge_outs.add(created.judge_log_file)
         return jobs
 
     def _compute_result(self) -> dict[str, Any]:
         result: dict[str, Any] = {}
-        result["judge_outs"] = set()
-        for job in self.jobs:
-            if isinstance(job, RunJudge):
-                if isinstance(job, RunCMSJudge):
-                    result["judge_outs"].add(job.points_file)
-                result["judge_outs"].add(job.judge_log_file)
+        result["judge_outs"] = self._judge_outs
 
         return result
 
@@ -174,6 +182,10 @@ class RunJudge(ProgramsJob):
         """Here actually do the judging."""
         pass
 
+    def _memoized_judge(self) -> SolutionResult:
+        """Judges, reusing results of judging the same output if possible."""
+        return self._judge()
+
     @abstractmethod
     def _judging_message(self) -> str:
         pass
@@ -185,7 +197,7 @@ class RunJudge(ProgramsJob):
     def _run(self) -> SolutionResult:
         self._load_solution_run_res()
         if self._solution_run_res.kind == RunResultKind.OK:
-            result = self._judge()
+            result = self._memoized_judge()
         elif self._solution_run_res.kind == RunResultKind.RUNTIME_ERROR:
             result = RelativeSolutionResult(
                 Verdict.error, None, self._solution_run_res, None, Decimal(0)
@@ -289,6 +301,9 @@ class RunCMSJudge(RunJudge):
         self.judge = judge
         self.points_file = self.judge_log_file.replace_suffix(".points")
 
+    def _judge_files(self) -> list[TaskPath]:
+        return [self.points_file, self.judge_log_file]
+
     def _load_points(self, result: RunResult) -> Decimal:
         with self._open_file(result.stdout_file) as f:
             points_str = f.read().split("\n")[0]
@@ -331,6 +346,10 @@ class RunCMSJudge(RunJudge):
 class RunBatchJudge(RunJudge):
     """Runs batch judge on single input. (Abstract class)"""
 
+    @staticmethod
+    def job_name(output: OutputPath) -> str:
+        return f"Judge {output:p}"
+
     def __init__(
         self,
         env: Env,
@@ -344,7 +363,7 @@ class RunBatchJudge(RunJudge):
     ) -> None:
         super().__init__(
             env=env,
-            name=f"Judge {output:p}",
+            name=self.job_name(output),
             judge=judge,
             test=test,
             input_=input_,
@@ -367,6 +386,79 @@ class RunBatchJudge(RunJudge):
     def _judging_message(self) -> str:
         return f"output {self.output:p} for input {self.input:p}"
 
+    def _memoized_judge(self) -> SolutionResult:
+        if self._env.config.out_check != OutCheck.judge:
+            # Builtin judges are cheap and their messages contain output paths
+            return self._judge()
+
+        for file in self._judged_files():
+            self._access_file(file)
+        key = self._judge_key()
+
+        with _judged_outputs_lock:
+            judged = _judged_outputs.get(key)
+        if judged is not None and file_versions(judged[1]) == judged[2]:
+            # The same output has already been judged for another solution
+            result, files, _ = judged
+            assert result.judge_rr is not None
+            judge_rr = result.judge_rr
+            for src, dst in zip(files, self._judge_files()):
+                self._copy_file(src, dst)
+            if isinstance(judge_rr.stdout_file, TaskPath):
+                judge_rr = replace(judge_rr, stdout_file=self._judge_files()[0])
+            judge_rr = replace(judge_rr, stderr_file=self.judge_log_file)
+            return replace(
+                result, solution_rr=self._solution_run_res, judge_rr=judge_rr
+            )
+
+        result = self._judge()
+        files = self._judge_files()
+        with _judged_outputs_lock:
+            _judged_outputs[key] = (result, files, file_versions(files))
+        return result
+
+    def _judge_files(self) -> list[TaskPath]:
+        """Files written by the judge."""
+        return [self.judge_log_file]
+
+    def _judged_files(self) -> list[TaskPath]:
+        """Files the judge gets."""
+        files: list[TaskPath] = [self.input, self.output]
+        if self._env.config.judge_needs_out:
+            # Otherwise the correct output might not even exist
+            files.append(self.correct_output)
+        return files
+
+    def _judge_key(self) -> str:
+        """Returns key identifying judging by the judge and contents of files."""
+        key = hashlib.sha256()
+        executable = TaskPath.executable_file(self._env, self.judge)
+        for file in [executable] + self._judged_files():
+            key.update(f"{self._file_digest(file)}\n".encode())
+        key.update(
+            repr(
+                (
+                    self.test,
+                    getattr(self, "seed", None),
+                    self._env.config.judge_needs_out,
+                )
+            ).encode()
+        )
+        return key.hexdigest()
+
+
+# Results of judging outputs, shared by all solutions producing the same output
+_judged_outputs: dict[str, tuple[SolutionResult, list[TaskPath], list[FileVersion]]] = (
+    {}
+)
+_judged_outputs_lock = threading.Lock()
+
+
+def clear_judged_outputs() -> None:
+    """Forgets judgings shared in previous runs of the pipeline."""
+    with _judged_outputs_lock:
+        _judged_outputs.clear()
+
 
 class RunDiffJudge(RunBatchJudge):
     """Judges solution output and correct output using diff."""
@@ -393,75 +485,72 @@ class RunDiffJudge(RunBatchJudge):
     def _judge(self) -> SolutionResult:
         self._access_file(self.output)
         self._access_file(self.correct_output)
-        diff = subprocess.run(
-            ["diff", "-Bbq", self.output.path, self.correct_output.path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
+        try:
+            same = diff_files(self.output.path, self.correct_output.path)
+        except OSError:
+            same = None
+
+        if same is None:
+            # Leave hard cases to diff itself
+            diff = subprocess.run(
+                ["diff", "-Bbq", self.output.path, self.correct_output.path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            returncode, stderr = diff.returncode, diff.stderr.decode("utf-8")
+        else:
+            returncode, stderr = (0 if same else 1), ""
+
         # XXX: Okay, it didn't finish in no time, but this is not meant to be used
         rr = RunResult(
             RunResultKind.OK,
-            diff.returncode,
+            returncode,
             0,
             0,
-            status=("Files are the same" if diff.returncode == 0 else "Files differ")
+            status=("Files are the same" if returncode == 0 else "Files differ")
             + f": {self.output.col(self._env)} {self.correct_output.col(self._env)}",
         )
-        if diff.returncode == 0:
+        if returncode == 0:
             return RelativeSolutionResult(
                 Verdict.ok, None, self._solution_run_res, rr, Decimal(1)
             )
-        elif diff.returncode == 1:
+        elif returncode == 1:
             return RelativeSolutionResult(
                 Verdict.wrong_answer, None, self._solution_run_res, rr, Decimal(0)
             )
         else:
-            raise PipelineItemFailure(
-                f"Diff failed:\n{tab(diff.stderr.decode('utf-8'))}"
-            )
+            raise PipelineItemFailure(f"Diff failed:\n{tab(stderr)}")
 
 
 class RunJudgeLibJudge(RunBatchJudge):
     """Judges solution output and correct output using judgelib judge."""
 
     @abstractmethod
-    def _get_flags(self) -> list[str]:
+    def _run_judge(self) -> tuple[int, str]:
+        """Runs the judge and returns its return code and stderr."""
         pass
 
     def _judge(self) -> SolutionResult:
         self._access_file(self.output)
         self._access_file(self.correct_output)
 
-        executable = TaskPath.executable_path(self._env, self.judge)
-
-        judge = subprocess.run(
-            [
-                executable.path,
-                *self._get_flags(),
-                self.output.path,
-                self.correct_output.path,
-            ],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-
-        stderr = judge.stderr.decode("utf-8")
+        returncode, stderr = self._run_judge()
 
         # XXX: Okay, it didn't finish in no time, but this is not meant to be used
         rr = RunResult(
             RunResultKind.OK,
-            judge.returncode,
+            returncode,
             0,
             0,
             status=(stderr.strip() or "Files are equivalent")
             + f": {self.output.col(self._env)} {self.correct_output.col(self._env)}",
         )
 
-        if judge.returncode == 42:
+        if returncode == 42:
             return RelativeSolutionResult(
                 Verdict.ok, None, self._solution_run_res, rr, Decimal(1)
             )
-        elif judge.returncode == 43:
+        elif returncode == 43:
             return RelativeSolutionResult(
                 Verdict.wrong_answer, None, self._solution_run_res, rr, Decimal(0)
             )
@@ -491,23 +580,19 @@ class RunTokenJudge(RunJudgeLibJudge):
             expected_verdict=expected_verdict,
         )
 
-    def _get_flags(self) -> list[str]:
-        flags = ["-t"]
-        if self._env.config.tokens_ignore_newlines:
-            flags.append("-n")
-        if self._env.config.tokens_ignore_case:
-            flags.append("-i")
-        if self._env.config.tokens_float_rel_error != None:
-            flags.extend(
-                [
-                    "-r",
-                    "-e",
-                    str(self._env.config.tokens_float_rel_error),
-                    "-E",
-                    str(self._env.config.tokens_float_abs_error),
-                ]
-            )
-        return flags
+    def _run_judge(self) -> tuple[int, str]:
+        config = self._env.config
+        judge = TokenJudge(
+            ignore_newlines=bool(config.tokens_ignore_newlines),
+            ignore_case=bool(config.tokens_ignore_case),
+            float_rel_error=config.tokens_float_rel_error,
+            float_abs_error=config.tokens_float_abs_error,
+        )
+        try:
+            accepted, message = judge.judge(self.output.path, self.correct_output.path)
+        except OSError as e:
+            return 44, f"Unable to open {e.filename} for reading: {e.strerror}\n"
+        return (42 if accepted else 43), message
 
 
 class RunShuffleJudge(RunJudgeLibJudge):
@@ -546,6 +631,20 @@ class RunShuffleJudge(RunJudgeLibJudge):
 
         return flags
 
+    def _run_judge(self) -> tuple[int, str]:
+        executable = TaskPath.executable_path(self._env, self.judge)
+        judge = subprocess.run(
+            [
+                executable.path,
+                *self._get_flags(),
+                self.output.path,
+                self.correct_output.path,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        return judge.returncode, judge.stderr.decode("utf-8")
+
 
 class RunOpendataJudge(RunBatchJudge):
     """Judges solution output using judge with the opendata interface. (Abstract class)"""
@@ -693,6 +792,81 @@ class RunCMSBatchJudge(RunCMSJudge, RunBatchJudge):
         return sol_result
 
 
+class RunMultiJudge(RunCMSJudge, RunBatchJudge):
+    """
+    Judges solution output using judge with pisek-multi-v1 interface.
+    The judge is started only once and judges all outputs.
+    """
+
+    def __init__(
+        self,
+        env: Env,
+        judge: str,
+        test: int,
+        input_: InputPath,
+        output: OutputPath,
+        correct_output: OutputPath,
+        seed: Optional[int],
+        expected_verdict: Optional[Verdict],
+        **kwargs,
+    ) -> None:
+        super().__init__(
+            env=env,
+            judge=judge,
+            test=test,
+            input_=input_,
+            output=output,
+            correct_output=correct_output,
+            expected_verdict=expected_verdict,
+            **kwargs,
+        )
+        self.seed = seed
+
+    def _judge(self) -> SolutionResult:
+        config = self._env.config
+        self._access_file(self.output)
+        if config.judge_needs_in:
+            self._access_file(self.input)
+        if config.judge_needs_out:
+            self._access_file(self.correct_output)
+
+        request = [
+            str(self.test),
+            f"{self.seed:016x}" if self.seed is not None else OPENDATA_NO_SEED,
+            self.input.path if config.judge_needs_in else "-",
+            self.correct_output.path if config.judge_needs_out else "-",
+            self.output.path,
+        ]
+
+        start = time.monotonic()
+        try:
+            reply = self._request_program(ProgramType.judge, self.judge, request)
+        except ProgramServerError as e:
+            raise PipelineItemFailure(
+                f"Judge failed on {self._judging_message()}:\n{tab(str(e))}"
+            )
+        elapsed = time.monotonic() - start
+
+        points, _, message = reply.strip().partition(" ")
+        with self._open_file(self.points_file, "w") as f:
+            f.write(f"{points}\n")
+        with self._open_file(self.judge_log_file, "w") as f:
+            f.write(f"{message}\n")
+        self._access_file(self.points_file)
+        self._access_file(self.judge_log_file)
+
+        result = RunResult(
+            RunResultKind.OK,
+            0,
+            elapsed,
+            elapsed,
+            self.points_file,
+            self.judge_log_file,
+            "Finished successfully",
+        )
+        return self._load_solution_result(result)
+
+
 def judge_job(
     input_: InputPath,
     output: OutputPath,
@@ -702,7 +876,12 @@ def judge_job(
     expected_verdict: Optional[Verdict],
     env: Env,
 ) -> Union[
-    RunDiffJudge, RunTokenJudge, RunShuffleJudge, RunOpendataV1Judge, RunCMSBatchJudge
+    RunDiffJudge,
+    RunTokenJudge,
+    RunShuffleJudge,
+    RunOpendataV1Judge,
+    RunCMSBatchJudge,
+    RunMultiJudge,
 ]:
     """Returns JudgeJob according to contest type."""
     if env.config.out_check == OutCheck.diff:
@@ -730,6 +909,17 @@ def judge_job(
             correct_output,
             expected_verdict,
         )
+    elif env.config.judge_type == JudgeType.pisek_multi_v1:
+        return RunMultiJudge(
+            env,
+            env.config.out_judge,
+            test,
+            input_,
+            output,
+            correct_output,
+            seed,
+            expected_verdict,
+        )
     else:
         return RunOpendataV1Judge(
             env,
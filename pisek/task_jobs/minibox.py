@@ -0,0 +1,191 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import atexit
+from dataclasses import dataclass
+import logging
+import os
+from queue import Queue
+import socket
+import subprocess
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_REPLY_SIZE = 65536
+
+
+@dataclass(frozen=True)
+class MiniboxResult:
+    """Exit code of minibox together with its meta information."""
+
+    returncode: int
+    meta: dict[str, str]
+    error: str
+
+    @staticmethod
+    def parse_meta(meta_raw: str) -> dict[str, str]:
+        return dict(line.split(":", 1) for line in meta_raw.splitlines() if ":" in line)
+
+
+class MiniboxServer:
+    """Minibox running in server mode. Runs programs sent over a socket,
+    so that a new minibox needn't be started for each of them.
+
+    Can be used from multiple threads."""
+
+    def __init__(self, minibox: str) -> None:
+        self._socket, server_socket = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+        with server_socket:
+            self._process = subprocess.Popen(
+                [minibox, "--server"],
+                stdin=server_socket.fileno(),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+            )
+
+        if self._socket.recv(MAX_REPLY_SIZE) != b"ready":
+            self._socket.close()
+            self._process.wait()
+            raise RuntimeError("Minibox server failed to start.")
+
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._pending: dict[int, tuple[Queue, int]] = {}
+        self._alive = True
+        self._error = ""
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+    @property
+    def alive(self) -> bool:
+        return self._alive
+
+    def run(
+        self,
+        args: list[str],
+        fds: dict[int, int],
+        results: "Queue[tuple[int, MiniboxResult]]",
+        tag: int,
+    ) -> None:
+        """
+        Runs minibox with given args passing it given file descriptors
+        (target fd -> fd). When it finishes, (tag, result) is put to results.
+        """
+        with self._lock:
+            if not self._alive:
+                results.put((tag, self._failed_result()))
+                return
+
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (results, tag)
+
+            targets = "".join(map(str, fds.keys()))
+            message = "\0".join([str(request_id), targets] + args) + "\0"
+            try:
+                socket.send_fds(self._socket, [message.encode()], list(fds.values()))
+            except OSError:
+                del self._pending[request_id]
+                results.put((tag, self._failed_result()))
+
+    def _read_replies(self) -> None:
+        while True:
+            try:
+                reply = self._socket.recv(MAX_REPLY_SIZE)
+            except OSError:
+                reply = b""
+
+            if not reply:
+                break
+
+            request_id, returncode, meta = reply.decode().split("\n", 2)
+            with self._lock:
+                results, tag = self._pending.pop(int(request_id))
+
+            meta_dict = MiniboxResult.parse_meta(meta)
+            results.put(
+                (
+                    tag,
+                    MiniboxResult(
+                        int(returncode), meta_dict, meta_dict.get("message", "")
+                    ),
+                )
+            )
+
+        self._process.wait()
+        assert self._process.stderr is not None  # To make mypy happy
+        self._error = self._process.stderr.read().decode()
+        with self._lock:
+            self._alive = False
+            for results, tag in self._pending.values():
+                results.put((tag, self._failed_result()))
+            self._pending.clear()
+
+    def _failed_result(self) -> MiniboxResult:
+        return MiniboxResult(
+            -1, {}, f"Minibox server exited unexpectedly.\n{self._error}".strip()
+        )
+
+    def close(self) -> None:
+        """Stops the server. Programs already running are left to finish."""
+        self._socket.shutdown(socket.SHUT_RDWR)
+        self._reader.join()
+        self._socket.close()
+        assert self._process.stderr is not None  # To make mypy happy
+        self._process.stderr.close()
+
+
+_servers: dict[str, tuple[tuple[int, int], Optional[MiniboxServer]]] = {}
+_servers_lock = threading.Lock()
+
+
+def get_minibox_server(minibox: str) -> Optional[MiniboxServer]:
+    """
+    Returns a running server for given minibox executable.
+    Returns None if server mode is not supported.
+    """
+    path = os.path.abspath(minibox)
+    stat = os.stat(path)
+    version = (stat.st_ino, stat.st_mtime_ns)
+
+    with _servers_lock:
+        if path in _servers:
+            server_version, server = _servers[path]
+            if server_version == version and (server is None or server.alive):
+                return server
+            del _servers[path]
+            if server is not None:
+                server.close()
+
+        try:
+            server = MiniboxServer(path)
+        except (AttributeError, OSError, RuntimeError) as e:
+            # Sockets not supported by OS or an older minibox
+            logger.warning(f"Unable to start minibox server: {e}")
+            server = None
+
+        _servers[path] = (version, server)
+        return server
+
+
+@atexit.register
+def close_minibox_servers() -> None:
+    """Stops all running minibox servers."""
+    with _servers_lock:
+        for _, server in _servers.values():
+            if server is not None:
+                server.close()
+        _servers.clear()
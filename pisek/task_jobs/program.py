@@ -17,8 +17,11 @@
 from dataclasses import dataclass, field
 import logging
 import os
+from queue import Queue
+import selectors
 import tempfile
-from typing import Optional, Any, Union, Callable
+import time
+from typing import Optional, Any, Union, Callable, Iterator
 import signal
 import subprocess
 
@@ -27,11 +30,17 @@ from pisek.env.env import Env
 from pisek.utils.paths import TaskPath, LogPath
 from pisek.jobs.jobs import PipelineItemFailure
 from pisek.utils.text import tab
+from pisek.utils.trace import Tracer
+from pisek.task_jobs.minibox import MiniboxResult, MiniboxServer, get_minibox_server
+from pisek.task_jobs.program_server import program_server
 from pisek.task_jobs.run_result import RunResultKind, RunResult
 from pisek.task_jobs.task_job import TaskJob
 
 logger = logging.getLogger(__name__)
 
+POLL_MIN_DELAY = 0.0001  # seconds
+POLL_MAX_DELAY = 0.01  # seconds
+
 
 @dataclass
 class ProgramPoolItem:
@@ -46,10 +55,8 @@ class ProgramPoolItem:
     stderr: Optional[TaskPath]
     env: dict[str, str] = field(default_factory=lambda: {})
 
-    def to_popen(self, minibox: str, meta_file: str) -> dict[str, Any]:
-        """Returns subprocess.Popen args for executing this PoolItem."""
-        result: dict[str, Any] = {}
-
+    def to_minibox_args(self) -> list[str]:
+        """Returns minibox args for executing this PoolItem."""
         minibox_args = []
         minibox_args.append(f"--time={self.time_limit}")
         minibox_args.append(f"--wall-time={self.clock_limit}")
@@ -60,23 +67,34 @@ class ProgramPoolItem:
             attr = getattr(self, std)
             if isinstance(attr, TaskPath):
                 minibox_args.append(f"--{std}={attr.path}")
-            elif getattr(self, std) is None:
+            elif attr is None:
                 minibox_args.append(f"--{std}=/dev/null")
 
-            if isinstance(attr, int):
-                result[std] = attr
-            else:
-                result[std] = subprocess.PIPE
-
         for key, val in self.env.items():
             minibox_args.append(f"--env={key}={val}")
 
         minibox_args.append("--silent")
-        minibox_args.append(f"--meta={meta_file}")
+        return minibox_args + ["--run", "--", self.executable.path] + self.args
 
-        result["args"] = (
-            [minibox] + minibox_args + ["--run", "--", self.executable.path] + self.args
-        )
+    def passed_fds(self) -> dict[int, int]:
+        """Returns file descriptors to be inherited by the program."""
+        fds = {}
+        for target, std in enumerate(("stdin", "stdout")):
+            if isinstance(attr := getattr(self, std), int):
+                fds[target] = attr
+        return fds
+
+    def to_popen(self, minibox: str, meta_file: str) -> dict[str, Any]:
+        """Returns subprocess.Popen args for executing this PoolItem."""
+        result: dict[str, Any] = {}
+        for std in ("stdin", "stdout", "stderr"):
+            attr = getattr(self, std)
+            if isinstance(attr, int):
+                result[std] = attr
+            else:
+                result[std] = subprocess.PIPE
+
+        result["args"] = [minibox, f"--meta={meta_file}"] + self.to_minibox_args()
         return result
 
 
@@ -86,7 +104,7 @@ class ProgramsJob(TaskJob):
     def __init__(self, env: Env, name: str, **kwargs) -> None:
         super().__init__(env=env, name=name, **kwargs)
         self._program_pool: list[ProgramPoolItem] = []
-        self._callback: Optional[Callable[[subprocess.Popen], None]] = None
+        self._callback: Optional[Callable[[ProgramPoolItem], None]] = None
 
     def _load_compiled(self, program: TaskPath) -> TaskPath:
         """Loads name of compiled program."""
@@ -167,108 +185,210 @@ class ProgramsJob(TaskJob):
             env=env,
         )
 
-    def _load_callback(self, callback: Callable[[subprocess.Popen], None]) -> None:
+    def _load_callback(self, callback: Callable[[ProgramPoolItem], None]) -> None:
         if self._callback is not None:
             raise RuntimeError("Callback already loaded.")
         self._callback = callback
 
     def _run_programs(self) -> list[RunResult]:
         """Runs all programs in execution pool."""
+        minibox = TaskPath.executable_path(self._env, "minibox").path
+        with Tracer.span("run programs", "program"):
+            with Tracer.span("minibox server", "program"):
+                server = get_minibox_server(minibox)
+            if server is None:
+                minibox_results = self._run_programs_separately(minibox)
+            else:
+                minibox_results = self._run_programs_on_server(server)
+
+            with Tracer.span("parse meta", "program"):
+                return [
+                    self._to_run_result(pool_item, result)
+                    for pool_item, result in zip(self._program_pool, minibox_results)
+                ]
+
+    def _trace_program(self, pool_item: ProgramPoolItem, result: MiniboxResult) -> None:
+        """Records wall time of a program that has just finished."""
+        if Tracer.enabled and "time-wall" in result.meta:
+            wall_time = float(result.meta["time-wall"]) * 1e6
+            Tracer.complete(
+                pool_item.executable.name,
+                "program",
+                Tracer.now() - wall_time,
+                wall_time,
+                time=result.meta.get("time"),
+                status=result.meta.get("status", "OK"),
+            )
+
+    def _run_programs_on_server(self, server: MiniboxServer) -> list[MiniboxResult]:
+        """Runs all programs in execution pool using a minibox server."""
+        finished: "Queue[tuple[int, MiniboxResult]]" = Queue()
+        with Tracer.span("minibox launch", "program"):
+            for i, pool_item in enumerate(self._program_pool):
+                args = pool_item.to_minibox_args()
+                logger.debug("Executing on minibox server '" + " ".join(args) + "'")
+                server.run(args, pool_item.passed_fds(), finished, i)
+
+        results: list[Optional[MiniboxResult]] = [None] * len(self._program_pool)
+        for _ in self._program_pool:
+            i, result = finished.get()
+            self._trace_program(self._program_pool[i], result)
+            if self._callback is not None and all(r is None for r in results):
+                self._callback(self._program_pool[i])
+            results[i] = result
+
+        return [r for r in results if r is not None]
+
+    def _run_programs_separately(self, minibox: str) -> list[MiniboxResult]:
+        """Runs all programs in execution pool, each in a new minibox."""
         running_pool: list[subprocess.Popen] = []
         meta_files: list[str] = []
-        minibox = TaskPath.executable_path(self._env, "minibox").path
-        for pool_item in self._program_pool:
-            fd, meta_file = tempfile.mkstemp()
-            os.close(fd)
-            meta_files.append(meta_file)
+        with Tracer.span("minibox launch", "program"):
+            for pool_item in self._program_pool:
+                fd, meta_file = tempfile.mkstemp()
+                os.close(fd)
+                meta_files.append(meta_file)
 
-            popen = pool_item.to_popen(minibox, meta_file)
-            logger.debug("Executing './" + " ".join(popen["args"]) + "'")
-            running_pool.append(subprocess.Popen(**popen))
+                popen = pool_item.to_popen(minibox, meta_file)
+                logger.debug("Executing './" + " ".join(popen["args"]) + "'")
+                running_pool.append(subprocess.Popen(**popen))
 
         callback_exec = False
-        while True:
-            states = [process.poll() is not None for process in running_pool]
-            if not callback_exec and any(states):
+        for process in self._wait_for_processes(running_pool):
+            if not callback_exec:
                 callback_exec = True
                 if self._callback is not None:
-                    self._callback(running_pool[states.index(True)])
-
-            if all(states):
-                break
+                    self._callback(self._program_pool[running_pool.index(process)])
 
-        run_results = []
-        for pool_item, (process, meta_file) in zip(
-            self._program_pool, zip(running_pool, meta_files)
+        results = []
+        for pool_item, process, meta_file in zip(
+            self._program_pool, running_pool, meta_files
         ):
             process.wait()
             assert process.stderr is not None  # To make mypy happy
 
-            with open(meta_file) as f:
-                meta_raw = f.read().strip().split("\n")
+            with Tracer.span("parse meta", "program"), open(meta_file) as f:
+                meta = MiniboxResult.parse_meta(f.read())
 
             assert meta_file.startswith("/tmp")  # Better safe then sorry
             os.remove(meta_file)
 
-            meta = {key: val for key, val in map(lambda x: x.split(":", 1), meta_raw)}
-            if process.returncode == 0:
-                t, wt = float(meta["time"]), float(meta["time-wall"])
-                run_results.append(
-                    RunResult(
-                        RunResultKind.OK,
-                        0,
-                        t,
-                        wt,
-                        pool_item.stdout,
-                        pool_item.stderr,
-                        "Finished successfully",
-                    )
+            results.append(
+                MiniboxResult(process.returncode, meta, process.stderr.read().decode())
+            )
+            self._trace_program(pool_item, results[-1])
+
+        return results
+
+    def _to_run_result(
+        self, pool_item: ProgramPoolItem, result: MiniboxResult
+    ) -> RunResult:
+        """Converts minibox result of a program to RunResult."""
+        meta = dict(result.meta)
+        if result.returncode == 0:
+            t, wt = float(meta["time"]), float(meta["time-wall"])
+            return RunResult(
+                RunResultKind.OK,
+                0,
+                t,
+                wt,
+                pool_item.stdout,
+                pool_item.stderr,
+                "Finished successfully",
+            )
+        elif result.returncode == 1:
+            t, wt = float(meta["time"]), float(meta["time-wall"])
+            if meta["status"] in ("RE", "SG"):
+                if meta["status"] == "RE":
+                    return_code = int(meta["exitcode"])
+                elif meta["status"] == "SG":
+                    return_code = int(meta["exitsig"])
+                    meta["message"] += f" ({signal.Signals(return_code).name})"
+
+                return RunResult(
+                    RunResultKind.RUNTIME_ERROR,
+                    return_code,
+                    t,
+                    wt,
+                    pool_item.stdout,
+                    pool_item.stderr,
+                    meta["message"],
                 )
-            elif process.returncode == 1:
-                t, wt = float(meta["time"]), float(meta["time-wall"])
-                if meta["status"] in ("RE", "SG"):
-                    if meta["status"] == "RE":
-                        return_code = int(meta["exitcode"])
-                    elif meta["status"] == "SG":
-                        return_code = int(meta["exitsig"])
-                        meta["message"] += f" ({signal.Signals(return_code).name})"
-
-                    run_results.append(
-                        RunResult(
-                            RunResultKind.RUNTIME_ERROR,
-                            return_code,
-                            t,
-                            wt,
-                            pool_item.stdout,
-                            pool_item.stderr,
-                            meta["message"],
-                        )
-                    )
-                elif meta["status"] == "TO":
-                    timeout = (
-                        f"{pool_item.time_limit}s"
-                        if t > pool_item.time_limit
-                        else f"{pool_item.clock_limit}ws"
-                    )
-                    run_results.append(
-                        RunResult(
-                            RunResultKind.TIMEOUT,
-                            -1,
-                            t,
-                            wt,
-                            pool_item.stdout,
-                            pool_item.stderr,
-                            f"Timeout after {timeout}",
-                        )
+            elif meta["status"] == "TO":
+                timeout = (
+                    f"{pool_item.time_limit}s"
+                    if t > pool_item.time_limit
+                    else f"{pool_item.clock_limit}ws"
+                )
+                return RunResult(
+                    RunResultKind.TIMEOUT,
+                    -1,
+                    t,
+                    wt,
+                    pool_item.stdout,
+                    pool_item.stderr,
+                    f"Timeout after {timeout}",
+                )
+            else:
+                raise RuntimeError(f"Unknown minibox status {meta['message']}.")
+        else:
+            raise PipelineItemFailure(f"Minibox error:\n{tab(result.error)}")
+
+    @staticmethod
+    def _wait_for_processes(
+        processes: list[subprocess.Popen],
+    ) -> Iterator[subprocess.Popen]:
+        """Yields processes as they finish. Sleeps while waiting."""
+        pidfds: dict[int, subprocess.Popen] = {}
+        try:
+            for process in processes:
+                pidfds[os.pidfd_open(process.pid)] = process
+        except (AttributeError, OSError):
+            # pidfds not supported (not Linux or old kernel)
+            for pidfd in pidfds:
+                os.close(pidfd)
+            yield from ProgramsJob._poll_processes(processes)
+            return
+
+        with selectors.DefaultSelector() as selector:
+            for pidfd, process in pidfds.items():
+                selector.register(pidfd, selectors.EVENT_READ, process)
+
+            try:
+                while len(selector.get_map()):
+                    # Report simultaneously finished processes in pool order
+                    finished = sorted(
+                        (key for key, _ in selector.select()),
+                        key=lambda key: processes.index(key.data),
                     )
-                else:
-                    raise RuntimeError(f"Unknown minibox status {meta['message']}.")
+                    for key in finished:
+                        selector.unregister(key.fd)
+                        os.close(key.fd)
+                        key.data.wait()
+                        yield key.data
+            finally:
+                for key in list(selector.get_map().values()):
+                    selector.unregister(key.fd)
+                    os.close(key.fd)
+
+    @staticmethod
+    def _poll_processes(
+        processes: list[subprocess.Popen],
+    ) -> Iterator[subprocess.Popen]:
+        """Yields processes as they finish. Polls with increasing sleeps."""
+        running = list(processes)
+        delay = POLL_MIN_DELAY
+        while len(running):
+            finished = [process for process in running if process.poll() is not None]
+            for process in finished:
+                running.remove(process)
+                yield process
+
+            if len(finished):
+                delay = POLL_MIN_DELAY
             else:
-                raise PipelineItemFailure(
-                    f"Minibox error:\n{tab(process.stderr.read().decode())}"
-                )
-
-        return run_results
+                time.sleep(delay)
+                delay = min(2 * delay, POLL_MAX_DELAY)
 
     def _run_program(
         self,
@@ -280,6 +400,30 @@ class ProgramsJob(TaskJob):
         self._load_program(program_type, program, **kwargs)
         return self._run_programs()[0]
 
+    def _request_program(
+        self,
+        program_type: ProgramType,
+        program: str,
+        request: list[str],
+        args: list[str] = [],
+    ) -> str:
+        """
+        Sends request to the program running with the pisek-multi-v1 interface
+        and returns its reply. The program is started if no instance is idle.
+
+        Raises ProgramServerError if the program fails.
+        """
+        run = self._env.config.runs[f"{program_type}_{program}"]
+        executable = self._load_compiled(run.exec)
+        self._access_file(executable)
+
+        with program_server(
+            TaskPath.executable_path(self._env, "minibox").path,
+            [executable.path] + run.args + args,
+            [f"--mem={run.mem_limit*1024}", f"--processes={run.process_limit}"],
+        ) as server:
+            return server.request(request, run.clock_limit())
+
     def _run_tool(
         self,
         program: str,
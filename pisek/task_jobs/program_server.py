@@ -0,0 +1,165 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import atexit
+from contextlib import contextmanager
+import os
+import selectors
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Iterator
+
+READ_SIZE = 4096
+
+
+class ProgramServerError(Exception):
+    pass
+
+
+class ProgramServer:
+    """
+    Program with a pisek-multi-v1 interface. It is started once
+    and gets requests as lines on its stdin. It replies each with a line.
+
+    Serves one request at a time, use program_server to get one for a request.
+    """
+
+    def __init__(self, minibox: str, args: list[str], limits: list[str]) -> None:
+        self._stderr = tempfile.TemporaryFile()
+        self._process = subprocess.Popen(
+            [minibox, *limits, "--silent", "--run", "--", *args],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=self._stderr,
+        )
+        self._buffer = b""
+
+    @property
+    def alive(self) -> bool:
+        return self._process.poll() is None
+
+    def request(self, request: list[str], timeout: float) -> str:
+        """
+        Sends request to the program and returns its reply.
+        Timeout is in seconds, 0 means no timeout.
+        """
+        for field in request:
+            # Fields are separated by spaces and the request ends with a newline
+            if field.split() != [field]:
+                raise ProgramServerError(
+                    f"Cannot pass '{field}' to the program, "
+                    "it is empty or contains whitespace."
+                )
+
+        assert self._process.stdin is not None  # To make mypy happy
+        try:
+            self._process.stdin.write((" ".join(request) + "\n").encode())
+            self._process.stdin.flush()
+        except BrokenPipeError:
+            pass  # Reported when reading the reply
+        return self._read_line(timeout)
+
+    def _read_line(self, timeout: float) -> str:
+        assert self._process.stdout is not None  # To make mypy happy
+        stdout = self._process.stdout.fileno()
+        deadline = time.monotonic() + timeout
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(stdout, selectors.EVENT_READ)
+            while b"\n" not in self._buffer:
+                remaining = deadline - time.monotonic()
+                if timeout and remaining <= 0:
+                    stderr = self._read_stderr()
+                    self.close()
+                    raise ProgramServerError(
+                        f"Program did not reply in {timeout}s.\n{stderr}".strip()
+                    )
+                if not selector.select(remaining if timeout else None):
+                    continue
+
+                data = os.read(stdout, READ_SIZE)
+                if not data:
+                    self._process.wait()
+                    raise ProgramServerError(
+                        f"Program exited without replying.\n{self._read_stderr()}".strip()
+                    )
+                self._buffer += data
+
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return line.decode()
+
+    def _read_stderr(self) -> str:
+        self._stderr.seek(0)
+        return self._stderr.read().decode(errors="replace").strip()
+
+    def close(self) -> None:
+        """Stops the program."""
+        if self.alive:
+            # Minibox kills the program on termination
+            self._process.terminate()
+        self._process.wait()
+        for stream in (self._process.stdin, self._process.stdout, self._stderr):
+            if stream is not None:
+                stream.close()
+
+
+# Idle running programs (with versions of their executables)
+_servers: dict[tuple[str, ...], list[tuple[tuple[int, int], ProgramServer]]] = {}
+_servers_lock = threading.Lock()
+
+
+@contextmanager
+def program_server(
+    minibox: str, args: list[str], limits: list[str]
+) -> Iterator[ProgramServer]:
+    """
+    Lends an idle running program started with given args in minibox
+    with given limits. If all of them are busy, another one is started,
+    so requests from multiple threads run in parallel.
+    Programs that have exited or whose executable has changed are stopped.
+    """
+    stat = os.stat(args[0])
+    version = (stat.st_ino, stat.st_mtime_ns)
+    key = (minibox, *limits, "--", *args)
+
+    server = None
+    with _servers_lock:
+        idle = _servers.setdefault(key, [])
+        while idle and server is None:
+            server_version, candidate = idle.pop()
+            if server_version == version and candidate.alive:
+                server = candidate
+            else:
+                candidate.close()
+
+    if server is None:
+        server = ProgramServer(minibox, args, limits)
+    try:
+        yield server
+    finally:
+        if server.alive:
+            with _servers_lock:
+                _servers[key].append((version, server))
+        else:
+            server.close()
+
+
+@atexit.register
+def close_program_servers() -> None:
+    """Stops all running programs."""
+    with _servers_lock:
+        for idle in _servers.values():
+            for _, server in idle:
+                server.close()
+        _servers.clear()
@@ -16,7 +16,8 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from decimal import Decimal
-from typing import Any, Optional
+import os
+from typing import Any, Iterator, Optional
 
 from pisek.jobs.jobs import State, Job, PipelineItemFailure
 from pisek.env.env import Env
@@ -51,28 +52,68 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
         self._tests_results: dict[int, Verdict] = {}
         super().__init__(f"Run {solution_label}")
 
-    def _get_jobs(self) -> list[Job]:
+    def _get_jobs(self) -> Iterator[Job]:
         self.is_primary: bool = self._env.config.solutions[self.solution_label].primary
         self._solution = self._env.config.solutions[self.solution_label].run
 
-        jobs: list[Job] = []
+        self._sols: dict[TaskPath, RunSolution] = {}
+        self._judges: dict[TaskPath, RunJudge] = {}
 
-        jobs.append(
+        yield (
             compile_ := Compile(
                 self._env, self._env.config.solution_path(self.solution_label), True
             )
         )
         self._compile_job = compile_
 
-        self._sols: dict[TaskPath, RunSolution] = {}
-        self._judges: dict[TaskPath, RunJudge] = {}
-
-        for sub_num, inputs in self._all_testcases().items():
-            self.tests.append(TestJobGroup(self._env, sub_num))
-            for inp in inputs:
-                jobs += self._testcase_info_jobs(inp, sub_num)
-
-        return jobs
+        self.tests = [
+            TestJobGroup(self._env, sub_num) for sub_num in self._all_testcases()
+        ]
+        # Each testcase is created in the tests it belongs to at once,
+        # so it is new in the first of them (as in the order of tests)
+        testcases = list(
+            dict.fromkeys(
+                inp for inputs in self._all_testcases().values() for inp in inputs
+            )
+        )
+        if self._env.adaptive_order:
+            # Tests are cancelled as soon as their verdict is known,
+            # so failing inputs should run first
+            testcases.sort(key=self._testcase_priority)
+
+        for testcase_info in testcases:
+            for sub_num in self._testcase_tests(testcase_info):
+                yield from self._testcase_info_jobs(testcase_info, sub_num)
+
+    def _testcase_priority(
+        self, testcase_info: TestcaseInfo
+    ) -> tuple[bool, float, int]:
+        """
+        Returns key for ordering testcases. Testcases that failed
+        in the previous run go first, then the slowest ones and the biggest inputs.
+        Uses only cached results, so no jobs need to be created.
+        """
+        failed, time, size = False, 0.0, 0
+        for seed in self._testcase_seeds(testcase_info):
+            input_path = testcase_info.input_path(
+                self._env, seed, solution=self.solution_label
+            )
+            name = self._judge_name(input_path)
+            if name in self._cache:
+                result = self._cache.last_entry(name).result
+                if isinstance(result, SolutionResult):
+                    failed |= result.verdict != Verdict.ok
+                    time = max(time, result.solution_rr.time)
+            if os.path.exists(input_path.path):
+                size = max(size, os.path.getsize(input_path.path))
+
+        return (not failed, -time, -size)
+
+    def _judge_name(self, input_path: InputPath) -> str:
+        """Name of the job judging the solution on given input."""
+        if self._env.config.task_type == TaskType.interactive:
+            return RunInteractive.job_name(self._solution, input_path)
+        return RunBatchJudge.job_name(input_path.to_output())
 
     def _register_skipped_testcase(
         self, testcase_info: TestcaseInfo, seed: Optional[int], test: int
@@ -81,11 +122,11 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
             self._env, seed, solution=self.solution_label
         )
         if self._env.config.tests[test].new_in_test(input_path.name):
-            self.tests[-1].new_run_jobs.append(self._sols[input_path])
-            self.tests[-1].new_jobs.append(self._judges[input_path])
             self._sols[input_path].require()
+            self.tests[test].add_run_job(self._sols[input_path])
+            self.tests[test].new_jobs.append(self._judges[input_path])
         else:
-            self.tests[-1].previous_jobs.append(self._judges[input_path])
+            self.tests[test].previous_jobs.append(self._judges[input_path])
 
     def _generate_input_jobs(
         self,
@@ -102,12 +143,14 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
             jobs = []
 
         jobs.append(
-            SymlinkData(
+            link := SymlinkData(
                 self._env,
                 testcase_info.input_path(self._env, seed),
                 testcase_info.input_path(self._env, seed, solution=self.solution_label),
             )
         )
+        link.add_prerequisite(self._input_ready_job.get(seed))
+        self._input_ready_job[seed] = link
         return jobs
 
     def _respects_seed_jobs(
@@ -129,25 +172,31 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
         run_sol: RunSolution
         run_judge: RunJudge
         if self._env.config.task_type == TaskType.batch:
+            reference_checks: list[Job] = []
             if (
                 testcase_info.generation_mode == TestcaseGenerationMode.static
                 and self._generate_inputs
             ):
-                jobs += self._check_output_jobs(
-                    testcase_info.reference_output(self._env, seed),
-                    None,
+                jobs += (
+                    reference_checks := self._check_output_jobs(
+                        testcase_info.reference_output(self._env, seed),
+                        None,
+                    )
                 )
 
             run_batch_sol, run_judge = self._create_batch_jobs(
                 testcase_info, seed, test
             )
             run_sol = run_batch_sol
+            for check in reference_checks:
+                run_judge.add_prerequisite(check)
 
             jobs.append(run_batch_sol)
 
-            for add_job in self._check_output_jobs(
+            output_checks = self._check_output_jobs(
                 run_batch_sol.output.to_sanitized_output(), run_batch_sol
-            ):
+            )
+            for add_job in output_checks:
                 run_judge.add_prerequisite(add_job)
                 jobs.append(add_job)
 
@@ -161,6 +210,9 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
                 )
                 jobs.append(link)
                 link.add_prerequisite(run_batch_sol)
+                # Primary solution links its own output
+                for add_job in output_checks:
+                    link.add_prerequisite(add_job)
                 run_judge.add_prerequisite(link)
             else:
                 run_judge.add_prerequisite(run_batch_sol)
@@ -169,12 +221,15 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
 
         elif self._env.config.task_type == TaskType.interactive:
             run_sol = run_judge = self._create_interactive_jobs(input_path, test)
+            run_sol.add_prerequisite(self._compile_job)
             jobs.append(run_sol)
 
+        run_sol.add_prerequisite(self._input_ready_job.get(seed))
+
         self._sols[input_path] = run_sol
         self._judges[input_path] = run_judge
-        self.tests[-1].new_jobs.append(run_judge)
-        self.tests[-1].new_run_jobs.append(run_sol)
+        self.tests[test].new_jobs.append(run_judge)
+        self.tests[test].add_run_job(run_sol)
 
         return jobs
 
@@ -289,6 +344,20 @@ class SolutionManager(TaskJobManager, TestcaseInfoMixin):
                 f"Solution {self.solution_label} should have gotten at most {p_max} but got {self.solution_points} points."
             )
 
+    def events(self) -> list[tuple[str, dict[str, Any]]]:
+        if self.solution_points is None:
+            return []
+        return [
+            (
+                "solution_points",
+                {
+                    "solution": self.solution_label,
+                    "points": self.solution_points,
+                    "tests": {num: v.name for num, v in self._tests_results.items()},
+                },
+            )
+        ]
+
     def _compute_result(self) -> dict[str, Any]:
         result: dict[str, Any] = super()._compute_result()
 
@@ -325,6 +394,13 @@ class TestJobGroup(TaskHelper):
         self.new_jobs: list[RunJudge] = []
         self._canceled: bool = False
 
+    def add_run_job(self, job: RunSolution) -> None:
+        """Adds solution run needed by this test."""
+        self.new_run_jobs.append(job)
+        if self._canceled:
+            # Jobs are created while running, so the test can be cancelled already
+            job.unrequire()
+
     @property
     def all_jobs(self) -> list[RunJudge]:
         return self.previous_jobs + self.new_jobs
@@ -11,15 +11,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from dataclasses import replace
+import hashlib
 import os
 import tempfile
+import threading
 import time
-from typing import Optional
+from typing import Callable, Optional
 
 from pisek.env.env import Env
-from pisek.utils.paths import TaskPath, InputPath
+from pisek.utils.paths import TaskPath, InputPath, LogPath
 from pisek.config.config_types import ProgramType
-from pisek.task_jobs.program import RunResult, ProgramsJob
+from pisek.task_jobs.task_job import FileVersion, file_versions
+from pisek.task_jobs.program import RunResult, ProgramsJob, ProgramPoolItem
 from pisek.task_jobs.solution.solution_result import Verdict, SolutionResult
 from pisek.task_jobs.judge import RunCMSJudge
 
@@ -78,16 +82,82 @@ class RunBatchSolution(RunSolution):
         self.log_file = input_.to_log("solution")
 
     def _run(self) -> RunResult:
-        return self._run_program(
+        self._load_program(
             program_type=self._solution_type(),
             program=self.solution,
             stdin=self.input,
             stdout=self.output,
             stderr=self.log_file,
         )
+        key = _run_key(self._program_pool[0], self._file_digest)
+
+        with _shared_run_lock(key):
+            # Same runs running at the same time wait here for the first one
+            with _shared_runs_lock:
+                shared = _shared_runs.get(key)
+            if shared is not None and file_versions(shared[1:3]) == shared[3]:
+                # The same executable has already been run on this input
+                result, output, log_file, _ = shared
+                self._program_pool.clear()
+                self._copy_file(output, self.output)
+                self._copy_file(log_file, self.log_file)
+                return replace(
+                    result, stdout_file=self.output, stderr_file=self.log_file
+                )
+
+            result = self._run_programs()[0]
+            files = (self.output, self.log_file)
+            with _shared_runs_lock:
+                _shared_runs[key] = (result, *files, file_versions(files))
+            return result
+
+
+# Results of runs of solutions on inputs, shared by all solutions
+# whose executables are byte-identical.
+_shared_runs: dict[str, tuple[RunResult, TaskPath, LogPath, list[FileVersion]]] = {}
+_shared_run_locks: dict[str, threading.Lock] = {}
+_shared_runs_lock = threading.Lock()
+
+
+def clear_shared_runs() -> None:
+    """Forgets runs shared in previous runs of the pipeline."""
+    with _shared_runs_lock:
+        _shared_runs.clear()
+        _shared_run_locks.clear()
+
+
+def _shared_run_lock(key: str) -> threading.Lock:
+    """Returns lock held while the run with given key is looked up or running."""
+    with _shared_runs_lock:
+        return _shared_run_locks.setdefault(key, threading.Lock())
+
+
+def _run_key(program: ProgramPoolItem, file_digest: Callable[[TaskPath], str]) -> str:
+    """Returns key identifying the run by contents of files and limits."""
+    key = hashlib.sha256()
+    for file in (program.executable, program.stdin):
+        assert isinstance(file, TaskPath)
+        key.update(f"{file_digest(file)}\n".encode())
+    key.update(
+        repr(
+            (
+                program.args,
+                program.time_limit,
+                program.clock_limit,
+                program.mem_limit,
+                program.process_limit,
+                program.env,
+            )
+        ).encode()
+    )
+    return key.hexdigest()
 
 
 class RunInteractive(RunCMSJudge, RunSolution):
+    @staticmethod
+    def job_name(solution: str, input_: InputPath) -> str:
+        return f"Run {solution} on input {input_:n}"
+
     def __init__(
         self,
         env: Env,
@@ -102,7 +172,7 @@ class RunInteractive(RunCMSJudge, RunSolution):
         self.sol_log_file = input_.to_log("solution")
         super().__init__(
             env=env,
-            name=f"Run {solution} on input {input_:n}",
+            name=self.job_name(solution, input_),
             judge=judge,
             test=test,
             input_=input_,
@@ -53,7 +53,7 @@ class Verdict(Enum):
         return max(len(v.name) for v in Verdict)
 
 
-@dataclass(init=False)
+@dataclass(init=False, frozen=True)
 class SolutionResult(ABC):
     """Class representing result of a solution on given input."""
 
@@ -70,7 +70,7 @@ class SolutionResult(ABC):
         return self.verdict.mark()
 
 
-@dataclass
+@dataclass(frozen=True)
 class RelativeSolutionResult(SolutionResult):
     verdict: Verdict
     message: Optional[str]
@@ -89,7 +89,7 @@ class RelativeSolutionResult(SolutionResult):
         return super().mark()
 
 
-@dataclass
+@dataclass(frozen=True)
 class AbsoluteSolutionResult(SolutionResult):
     verdict: Verdict
     message: Optional[str]
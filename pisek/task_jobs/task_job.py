@@ -42,6 +42,20 @@ from pisek.jobs.jobs import Job
 T = TypeVar("T")
 P = ParamSpec("P")
 
+FileVersion = Optional[tuple[int, int, int]]
+
+
+def file_versions(files: Iterable[TaskPath]) -> list[FileVersion]:
+    """Returns inode, size and mtime of given files, so that changes can be detected."""
+    versions: list[FileVersion] = []
+    for file in files:
+        try:
+            stat = os.stat(file.path)
+            versions.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            versions.append(None)
+    return versions
+
 
 class TaskHelper:
     _env: Env
@@ -140,6 +154,7 @@ class TaskJob(Job, TaskHelper):
 
     def _remove_file(self, filename: TaskPath):
         "Removes given file. It must be created inside this job."
+        assert self._accessed_files is not None
         self._accessed_files.remove(filename.path)
         return os.remove(filename.path)
 
@@ -153,6 +168,10 @@ class TaskJob(Job, TaskHelper):
             content = f.read()
         return len(content.strip()) > 0
 
+    def _file_digest(self, filename: TaskPath) -> str:
+        """Returns sha256 digest of given file, reused while it doesn't change."""
+        return self._cache.file_digest(filename.path)
+
     @_file_access(2)
     def _copy_file(self, filename: TaskPath, dst: TaskPath):
         self.make_filedirs(dst)
@@ -10,13 +10,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
+from typing import Mapping, Sequence
+
 from pisek.utils.paths import TaskPath, InputPath, OutputPath
 from pisek.config.task_config import TestConfig
 from pisek.jobs.status import StatusJobManager
 from pisek.task_jobs.task_job import TaskHelper
 from pisek.task_jobs.data.testcase_info import TestcaseInfo
 
-
 TOOLS_MAN_CODE = "tools"
 GENERATOR_MAN_CODE = "generator"
 INPUTS_MAN_CODE = "inputs"
@@ -39,10 +40,10 @@ class TaskJobManager(StatusJobManager, TaskHelper):
             for inp in self._test_testcases(self._env.config.tests[0])
         ]
 
-    def _test_testcases(self, test: TestConfig) -> list[TestcaseInfo]:
+    def _test_testcases(self, test: TestConfig) -> Sequence[TestcaseInfo]:
         """Get all inputs of given test."""
         return self.prerequisites_results[INPUTS_MAN_CODE]["testcase_info"][test.num]
 
-    def _all_testcases(self) -> dict[int, list[TestcaseInfo]]:
+    def _all_testcases(self) -> Mapping[int, Sequence[TestcaseInfo]]:
         """Get all inputs grouped by test."""
         return self.prerequisites_results[INPUTS_MAN_CODE]["testcase_info"]
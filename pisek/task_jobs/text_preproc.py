@@ -0,0 +1,135 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""
+Text normalization done inside pisek, so that no process needs to be spawned
+for each file. Output and error messages are the same as of text-preproc.c
+from KSP Open-data Submitter. (It is kept in pisek/tools for reference
+and the equivalence is tested.)
+"""
+
+from typing import BinaryIO, Iterator
+
+CHUNK_SIZE = 1 << 20  # Must be even, so that UTF-16 characters are not split
+
+UTF8_BOM = b"\xef\xbb\xbf"
+UTF16_LE_BOM = b"\xff\xfe"
+UTF16_BE_BOM = b"\xfe\xff"
+
+_PRINTABLE = bytes(range(32, 127)) + b"\t\n\r"
+
+
+class TextPreprocError(Exception):
+    """File cannot be normalized."""
+
+    pass
+
+
+def _check_printable(chars: bytes, offset: int, step: int = 1) -> None:
+    """Checks that all characters are printable. Character i is at offset + i*step."""
+    bad = chars.translate(None, _PRINTABLE)
+    if bad:
+        pos = chars.find(bad[:1])
+        raise TextPreprocError(
+            f"File contains non-printable character (code {bad[0]} at position {offset + pos * step})"
+        )
+
+
+def _ascii(f: BinaryIO, chunk: bytes, offset: int) -> Iterator[tuple[bytes, bytes]]:
+    while chunk:
+        _check_printable(chunk, offset)
+        yield chunk, chunk.replace(b"\r", b"")
+        offset += len(chunk)
+        chunk = f.read(CHUNK_SIZE)
+
+
+def _utf16(
+    f: BinaryIO, chunk: bytes, offset: int, is_be: bool
+) -> Iterator[tuple[bytes, bytes]]:
+    while chunk:
+        if len(chunk) % 2 and (more := f.read(CHUNK_SIZE)):
+            chunk += more  # Don't split a character between chunks
+            continue
+
+        even = len(chunk) - len(chunk) % 2
+        high, low = chunk[0:even:2], chunk[1:even:2]
+        if not is_be:
+            high, low = low, high
+
+        if high.count(0) != len(high):
+            # First character with non-zero high byte, unless there is a bad one before
+            pos = len(high) - len(high.lstrip(b"\0"))
+            _check_printable(low[:pos], offset, 2)
+            code = (high[pos] << 8) | low[pos]
+            raise TextPreprocError(
+                f"File contains non-printable character (code {code} at position {offset + 2 * pos})"
+            )
+        _check_printable(low, offset, 2)
+        yield chunk[:even], low.replace(b"\r", b"")
+
+        if even < len(chunk):
+            raise TextPreprocError(
+                f"File in UTF-16 contains incomplete character (at position {offset + even})"
+            )
+        offset += len(chunk)
+        chunk = f.read(CHUNK_SIZE)
+
+
+def preprocess(f: BinaryIO) -> Iterator[tuple[bytes, bytes]]:
+    """
+    Yields consecutive chunks of the file together with their normalized version.
+    Raises TextPreprocError if the file cannot be normalized.
+    """
+    chunk = f.read(CHUNK_SIZE)
+    while 0 < len(chunk) < len(UTF8_BOM) and (more := f.read(CHUNK_SIZE)):
+        chunk += more  # Don't split the BOM between chunks
+    if not chunk:
+        return
+
+    bom = b""
+    for bom in (UTF8_BOM, UTF16_LE_BOM, UTF16_BE_BOM, b""):
+        if chunk.startswith(bom):
+            break
+    if bom:
+        yield bom, b""
+        chunk = chunk[len(bom) :] or f.read(CHUNK_SIZE)
+
+    chunks: Iterator[tuple[bytes, bytes]]
+    if bom in (UTF16_LE_BOM, UTF16_BE_BOM):
+        chunks = _utf16(f, chunk, len(bom), bom == UTF16_BE_BOM)
+    else:
+        chunks = _ascii(f, chunk, len(bom))
+
+    last = b""
+    for raw, normalized in chunks:
+        yield raw, normalized
+        last = normalized[-1:] or last
+
+    if last not in (b"", b"\n"):
+        yield b"", b"\n"
+
+
+def sanitize(input_: str, output: str) -> None:
+    """Writes normalized input to output."""
+    with open(input_, "rb") as inp, open(output, "wb") as out:
+        for _, normalized in preprocess(inp):
+            out.write(normalized)
+
+
+def is_clean(path: str) -> bool:
+    """Returns whether the file is the same after normalization."""
+    clean = True
+    with open(path, "rb") as f:
+        for raw, normalized in preprocess(f):
+            # Read the whole file anyway, as normalization can still fail
+            clean = clean and raw == normalized
+    return clean
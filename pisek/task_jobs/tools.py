@@ -21,12 +21,13 @@ import subprocess
 
 from pisek.jobs.jobs import Job, PipelineItemFailure
 from pisek.env.env import Env
+from pisek.utils.text import tab
 from pisek.utils.paths import TaskPath, SanitizablePath
-from pisek.config.task_config import ProgramType
 from pisek.task_jobs.task_job import TaskJob
 from pisek.task_jobs.task_manager import TaskJobManager
-from pisek.task_jobs.program import ProgramsJob
 from pisek.task_jobs.run_result import RunResult, RunResultKind
+from pisek.task_jobs.artifact_cache import ArtifactCache
+from pisek.task_jobs.text_preproc import TextPreprocError, sanitize, is_clean
 
 
 class ToolsManager(TaskJobManager):
@@ -39,11 +40,29 @@ class ToolsManager(TaskJobManager):
         self.makedirs(TaskPath.executable_path(self._env, "."))
         jobs: list[Job] = [
             PrepareMinibox(self._env),
-            PrepareTextPreprocessor(self._env),
         ]
         return jobs
 
 
+def compile_tool(args: list[str], target: TaskPath, inputs: list[str] = []) -> bool:
+    """
+    Compiles a tool into target, or copies it from the artifact cache.
+    Returns whether it succeeded.
+    """
+    artifacts = ArtifactCache.from_environ()
+    if artifacts is not None:
+        key = artifacts.key(args, target.path, inputs)
+        if artifacts.load(key, target.path) is not None:
+            return True
+
+    if subprocess.run(args).returncode != 0:
+        return False
+
+    if artifacts is not None:
+        artifacts.store(key, target.path, "")
+    return True
+
+
 class PrepareMinibox(TaskJob):
     """Compiles minibox."""
 
@@ -54,10 +73,10 @@ class PrepareMinibox(TaskJob):
         source = files("pisek").joinpath("tools/minibox.c")
         executable = TaskPath.executable_path(self._env, "minibox")
         self._access_file(executable)
-        gcc = subprocess.run(
+        gcc = compile_tool(
             [
                 "gcc",
-                source,
+                str(source),
                 "-o",
                 executable.path,
                 "-std=gnu11",
@@ -68,40 +87,13 @@ class PrepareMinibox(TaskJob):
                 "-Wno-parentheses",
                 "-Wno-sign-compare",
                 "-Wno-unused-result",
-            ]
+            ],
+            executable,
         )
-        if gcc.returncode != 0:
+        if not gcc:
             raise PipelineItemFailure("Minibox compilation failed.")
 
 
-class PrepareTextPreprocessor(TaskJob):
-    """Compiles Text Preprocessor."""
-
-    def __init__(self, env: Env, **kwargs) -> None:
-        super().__init__(env=env, name="Prepare text preprocessor", **kwargs)
-
-    def _run(self):
-        source = files("pisek").joinpath("tools/text-preproc.c")
-        executable = TaskPath.executable_path(self._env, "text-preproc")
-        self._access_file(executable)
-        gcc = subprocess.run(
-            [
-                "gcc",
-                source,
-                "-o",
-                executable.path,
-                "-std=gnu11",
-                "-O2",
-                "-Wall",
-                "-Wextra",
-                "-Wno-parentheses",
-                "-Wno-sign-compare",
-            ]
-        )
-        if gcc.returncode != 0:
-            raise PipelineItemFailure("Text preprocessor compilation failed.")
-
-
 class PrepareJudgeLibJudge(TaskJob):
     """Compiles judge from judgelib."""
 
@@ -117,12 +109,12 @@ class PrepareJudgeLibJudge(TaskJob):
         executable = TaskPath.executable_path(self._env, self.judge)
         self._access_file(executable)
 
-        gpp = subprocess.run(
+        gpp = compile_tool(
             [
                 "g++",
-                *sources,
+                *map(str, sources),
                 "-I",
-                source_dir,
+                str(source_dir),
                 "-o",
                 executable.path,
                 "-std=gnu++17",
@@ -131,22 +123,15 @@ class PrepareJudgeLibJudge(TaskJob):
                 "-Wextra",
                 "-Wno-parentheses",
                 "-Wno-sign-compare",
-            ]
+            ],
+            executable,
+            [str(file) for file in source_dir.iterdir() if file.is_file()],
         )
 
-        if gpp.returncode != 0:
+        if not gpp:
             raise PipelineItemFailure(f"{self.judge_name} compilation failed.")
 
 
-class PrepareTokenJudge(PrepareJudgeLibJudge):
-    """Compiles judge-token from judgelib."""
-
-    def __init__(self, env: Env, **kwargs) -> None:
-        super().__init__(
-            env=env, judge_name="token judge", judge="judge-token", **kwargs
-        )
-
-
 class PrepareShuffleJudge(PrepareJudgeLibJudge):
     """Compiles judge-shuffle from judgelib."""
 
@@ -156,26 +141,6 @@ class PrepareShuffleJudge(PrepareJudgeLibJudge):
         )
 
 
-class TextPreprocAbstract(ProgramsJob):
-    """Abstract job that has method for file sanitization."""
-
-    def _run_text_preproc(self, input_: TaskPath, output: TaskPath) -> None:
-        try:
-            os.remove(output.path)
-        except FileNotFoundError:
-            pass
-
-        result = self._run_tool(
-            "text-preproc",
-            stdin=input_,
-            stdout=output,
-        )
-        if result.returncode != 42:
-            raise self._create_program_failure(
-                f"Text preprocessor failed on file: {input_:p}", result
-            )
-
-
 class SanitizeAbstact(TaskJob):
     def __init__(self, env: Env, input_: TaskPath, output: TaskPath, **kwargs) -> None:
         self.input = input_
@@ -195,8 +160,8 @@ class SanitizeAbstact(TaskJob):
         pass
 
 
-class Sanitize(SanitizeAbstact, TextPreprocAbstract):
-    """Sanitize text file using Text Preprocessor."""
+class Sanitize(SanitizeAbstact):
+    """Sanitize text file."""
 
     def __init__(self, env: Env, input_: TaskPath, output: TaskPath, **kwargs) -> None:
         super().__init__(
@@ -204,11 +169,24 @@ class Sanitize(SanitizeAbstact, TextPreprocAbstract):
         )
 
     def _sanitize(self):
-        return self._run_text_preproc(self.input, self.output)
+        self._access_file(self.input)
+        self._access_file(self.output)
+        self.make_filedirs(self.output)
+        try:
+            os.remove(self.output.path)
+        except FileNotFoundError:
+            pass
+
+        try:
+            sanitize(self.input.path, self.output.path)
+        except TextPreprocError as e:
+            raise PipelineItemFailure(
+                f"Sanitization of file {self.input:p} failed:\n{tab(str(e))}"
+            )
 
 
-class IsClean(SanitizeAbstact, TextPreprocAbstract):
-    """Check that file is same after sanitizing with Text Preprocessor."""
+class IsClean(SanitizeAbstact):
+    """Check that file is same after sanitizing."""
 
     def __init__(self, env: Env, input_: TaskPath, output: TaskPath, **kwargs) -> None:
         super().__init__(
@@ -216,8 +194,16 @@ class IsClean(SanitizeAbstact, TextPreprocAbstract):
         )
 
     def _sanitize(self):
-        self._run_text_preproc(self.input, self.output)
-        if not self._files_equal(self.input, self.output):
+        self._access_file(self.input)
+        try:
+            clean = is_clean(self.input.path)
+        except TextPreprocError as e:
+            raise PipelineItemFailure(
+                f"Sanitization of file {self.input:p} failed:\n{tab(str(e))}"
+            )
+        if not clean:
             raise PipelineItemFailure(
                 f"File {self.input:p} is not clean. Check encoding, missing newline at the end or \\r."
             )
+        # Contents are the same, so there is no need to write them again
+        self._link_file(self.input, self.output, overwrite=True)
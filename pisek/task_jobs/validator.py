@@ -16,6 +16,7 @@
 
 from pisek.jobs.jobs import State, Job, PipelineItemFailure
 from pisek.env.env import Env
+from pisek.utils.text import tab
 from pisek.utils.paths import TaskPath, InputPath
 from pisek.config.task_config import ProgramType
 from pisek.task_jobs.task_manager import TaskJobManager
@@ -23,6 +24,8 @@ from pisek.task_jobs.run_result import RunResult, RunResultKind
 from pisek.task_jobs.program import ProgramsJob
 from pisek.task_jobs.compile import Compile
 
+VALID_REPLY = "ok"
+
 
 class ValidatorManager(TaskJobManager):
     """Runs validator on inputs."""
@@ -89,3 +92,56 @@ class ValidatorJob(ProgramsJob):
                 result,
             )
         return result
+
+
+class MultiTestValidatorJob(ProgramsJob):
+    """Runs validator on single input for all tests containing it at once."""
+
+    def __init__(
+        self,
+        env: Env,
+        validator: str,
+        input_: InputPath,
+        tests: list[int],
+        **kwargs,
+    ):
+        super().__init__(
+            env=env,
+            name=f"Validate {input_:n} on tests {' '.join(map(str, tests))}",
+            **kwargs,
+        )
+        self.validator = validator
+        self.tests = tests
+        self.input = input_
+        self.log_file = input_.to_log(validator)
+        self.reply_file = input_.to_log(f"{validator}.out")
+
+    def _run(self) -> RunResult:
+        result = self._run_program(
+            ProgramType.validator,
+            self.validator,
+            args=list(map(str, self.tests)),
+            stdin=self.input,
+            stdout=self.reply_file,
+            stderr=self.log_file,
+        )
+        if result.kind != RunResultKind.OK:
+            raise self._create_program_failure(
+                f"Validator failed on {self.input:p} (tests {' '.join(map(str, self.tests))}):",
+                result,
+            )
+
+        with self._open_file(self.reply_file) as f:
+            replies = f.read().splitlines()
+        if len(replies) != len(self.tests):
+            raise PipelineItemFailure(
+                f"Validator should print {len(self.tests)} lines on {self.input:p}, "
+                f"but printed {len(replies)}."
+            )
+
+        for test, reply in zip(self.tests, replies):
+            if reply.strip() != VALID_REPLY:
+                raise PipelineItemFailure(
+                    f"Validator failed on {self.input:p} (test {test}):\n" + tab(reply)
+                )
+        return result
@@ -30,6 +30,9 @@
 #include <sys/signal.h>
 #include <sys/resource.h>
 #include <sys/stat.h>
+#include <sys/socket.h>
+#include <sys/uio.h>
+#include <poll.h>
 
 #ifdef __APPLE__
 #include <crt_externs.h>
@@ -798,6 +801,7 @@ Options:\n\
 \n\
 Commands:\n\
     --run -- <cmd> ...\tRun given command within sandbox\n\
+    --server\t\tRun commands sent over a socket on stdin (see serve())\n\
     --version\t\tDisplay program version and configuration\n\
 ");
   exit(2);
@@ -806,6 +810,7 @@ Commands:\n\
 enum opt_code {
   OPT_VERSION = 256,
   OPT_RUN,
+  OPT_SERVER,
   OPT_STDERR_TO_STDOUT,
 };
 
@@ -821,6 +826,7 @@ static const struct option long_opts[] = {
   { "meta",		1, NULL, 'M' },
   { "processes",	2, NULL, 'p' },
   { "run",		0, NULL, OPT_RUN },
+  { "server",		0, NULL, OPT_SERVER },
   { "silent",		0, NULL, 's' },
   { "stack",		1, NULL, 'k' },
   { "stderr",		1, NULL, 'r' },
@@ -834,8 +840,8 @@ static const struct option long_opts[] = {
   { NULL,		0, NULL, 0 }
 };
 
-int
-main(int argc, char **argv)
+static enum opt_code
+parse_options(int argc, char **argv)
 {
   int c;
   enum opt_code mode = 0;
@@ -897,6 +903,7 @@ main(int argc, char **argv)
 	extra_timeout = 1000*atof(optarg);
 	break;
       case OPT_RUN:
+      case OPT_SERVER:
       case OPT_VERSION:
 	if (!mode || (int) mode == c)
 	  mode = c;
@@ -911,6 +918,299 @@ main(int argc, char **argv)
 	usage(NULL);
       }
 
+  return mode;
+}
+
+/*** Server mode ***/
+
+/*
+ *  In server mode, minibox reads requests from a SOCK_SEQPACKET socket
+ *  on its stdin. Each request is a single message consisting of
+ *  NUL-terminated strings: request id, target descriptors of passed
+ *  file descriptors (e.g. "01" if stdin and stdout are passed using
+ *  SCM_RIGHTS) and minibox options including the --run command.
+ *
+ *  Every request is run by a forked keeper process exactly as if
+ *  minibox was started with the given options. When it finishes,
+ *  a reply "<id>\n<exit code>\n<meta>" is sent back, where exit code
+ *  is negative if the keeper was killed by a signal.
+ *
+ *  The server exits when the other end of the socket is closed.
+ */
+
+#define SERVER_MAX_REQUEST 65536
+#define SERVER_MAX_FDS 3
+#define SERVER_MAX_ID 32
+
+struct server_job {
+  pid_t pid;
+  int meta_fd;
+  char id[SERVER_MAX_ID];
+  char *meta;
+  size_t meta_len, meta_size;
+};
+
+static int server_fd;
+static int devnull_fd;
+static struct server_job *server_jobs;
+static int server_jobs_count, server_jobs_size;
+
+static void NONRET __attribute__((format(printf,1,2)))
+server_die(char *msg, ...)
+{
+  va_list args;
+  va_start(args, msg);
+  fputs("minibox server: ", stderr);
+  vfprintf(stderr, msg, args);
+  fputc('\n', stderr);
+  va_end(args);
+  exit(2);
+}
+
+static void
+set_cloexec(int fd)
+{
+  if (fcntl(fd, F_SETFD, fcntl(fd, F_GETFD) | FD_CLOEXEC) < 0)
+    server_die("fcntl: %m");
+}
+
+static void
+server_send(const char *buf, size_t len)
+{
+  ssize_t n;
+  do
+    n = send(server_fd, buf, len, 0);
+  while (n < 0 && errno == EINTR);
+  if (n < 0)
+    {
+      if (errno == EPIPE || errno == ECONNRESET)
+	exit(0);
+      server_die("send: %m");
+    }
+}
+
+static void NONRET
+server_keeper(char **argv, int argc, int *fds, int nfds, const char *targets, int meta_fd)
+{
+  close(server_fd);
+  for (int i=0; i < server_jobs_count; i++)
+    close(server_jobs[i].meta_fd);
+
+  for (int i=0; i<3; i++)
+    if (dup2(devnull_fd, i) < 0)
+      _exit(2);
+  for (int i=0; i < nfds; i++)
+    {
+      if (dup2(fds[i], targets[i] - '0') < 0)
+	_exit(2);
+      close(fds[i]);
+    }
+  close(devnull_fd);
+
+  metafile = fdopen(meta_fd, "w");
+  if (!metafile)
+    _exit(2);
+
+  optind = 0;
+  if (parse_options(argc, argv) != OPT_RUN)
+    die("Only --run is allowed in server mode");
+  if (optind >= argc)
+    die("--run mode requires a command to run");
+
+  umask(022);
+  run(argv+optind);
+  exit(0);
+}
+
+static void
+server_request(void)
+{
+  static char buf[SERVER_MAX_REQUEST];
+  union {
+    struct cmsghdr align;
+    char buf[CMSG_SPACE(sizeof(int) * SERVER_MAX_FDS)];
+  } control;
+  struct iovec iov = { .iov_base = buf, .iov_len = sizeof(buf) };
+  struct msghdr msg = {
+    .msg_iov = &iov,
+    .msg_iovlen = 1,
+    .msg_control = control.buf,
+    .msg_controllen = sizeof(control.buf),
+  };
+
+  ssize_t n = recvmsg(server_fd, &msg, 0);
+  if (n < 0)
+    {
+      if (errno == EINTR)
+	return;
+      server_die("recvmsg: %m");
+    }
+  if (!n)
+    exit(0);
+  if (msg.msg_flags & (MSG_TRUNC | MSG_CTRUNC))
+    server_die("Request too long");
+
+  int fds[SERVER_MAX_FDS], nfds = 0;
+  for (struct cmsghdr *cmsg = CMSG_FIRSTHDR(&msg); cmsg; cmsg = CMSG_NXTHDR(&msg, cmsg))
+    if (cmsg->cmsg_level == SOL_SOCKET && cmsg->cmsg_type == SCM_RIGHTS)
+      {
+	int count = (cmsg->cmsg_len - CMSG_LEN(0)) / sizeof(int);
+	for (int i=0; i < count && nfds < SERVER_MAX_FDS; i++)
+	  memcpy(&fds[nfds++], CMSG_DATA(cmsg) + i * sizeof(int), sizeof(int));
+      }
+  for (int i=0; i < nfds; i++)
+    set_cloexec(fds[i]);
+
+  if (buf[n-1])
+    server_die("Request is not NUL-terminated");
+
+  char **argv = xmalloc((n + 2) * sizeof(char *));
+  int argc = 0;
+  for (char *arg = buf; arg < buf + n; arg += strlen(arg) + 1)
+    argv[argc++] = arg;
+  if (argc < 2 || strlen(argv[0]) >= SERVER_MAX_ID || strlen(argv[1]) != (size_t) nfds)
+    server_die("Malformed request");
+  for (int i=0; i < nfds; i++)
+    if (argv[1][i] < '0' || argv[1][i] > '2')
+      server_die("Invalid target descriptor %c", argv[1][i]);
+
+  int meta_pipe[2];
+  if (pipe(meta_pipe) < 0)
+    server_die("pipe: %m");
+  set_cloexec(meta_pipe[0]);
+  set_cloexec(meta_pipe[1]);
+
+  // Options are parsed by the keeper, argv[1] becomes its program name
+  pid_t pid = fork();
+  if (pid < 0)
+    server_die("fork: %m");
+  if (!pid)
+    {
+      close(meta_pipe[0]);
+      argv[argc] = NULL;
+      server_keeper(argv+1, argc-1, fds, nfds, argv[1], meta_pipe[1]);
+    }
+
+  close(meta_pipe[1]);
+  for (int i=0; i < nfds; i++)
+    close(fds[i]);
+
+  if (server_jobs_count == server_jobs_size)
+    {
+      server_jobs_size = server_jobs_size ? 2*server_jobs_size : 16;
+      server_jobs = realloc(server_jobs, server_jobs_size * sizeof(struct server_job));
+      if (!server_jobs)
+	server_die("Out of memory");
+    }
+  struct server_job *job = &server_jobs[server_jobs_count++];
+  bzero(job, sizeof(*job));
+  job->pid = pid;
+  job->meta_fd = meta_pipe[0];
+  strcpy(job->id, argv[0]);
+  free(argv);
+}
+
+/* Reads meta of the job, returns 0 when the keeper has finished */
+static int
+server_read_meta(struct server_job *job)
+{
+  if (job->meta_size - job->meta_len < 1024)
+    {
+      job->meta_size = job->meta_size ? 2*job->meta_size : 4096;
+      job->meta = realloc(job->meta, job->meta_size);
+      if (!job->meta)
+	server_die("Out of memory");
+    }
+  ssize_t n = read(job->meta_fd, job->meta + job->meta_len, job->meta_size - job->meta_len);
+  if (n < 0)
+    {
+      if (errno == EINTR)
+	return 1;
+      server_die("read: %m");
+    }
+  job->meta_len += n;
+  return n > 0;
+}
+
+static void
+server_finish(struct server_job *job)
+{
+  int stat;
+  pid_t p;
+  close(job->meta_fd);
+  do
+    p = waitpid(job->pid, &stat, 0);
+  while (p < 0 && errno == EINTR);
+  if (p < 0)
+    server_die("waitpid: %m");
+
+  int rc = WIFEXITED(stat) ? WEXITSTATUS(stat) : -WTERMSIG(stat);
+  char header[64];
+  int header_len = snprintf(header, sizeof(header), "%s\n%d\n", job->id, rc);
+  char *reply = xmalloc(header_len + job->meta_len);
+  memcpy(reply, header, header_len);
+  if (job->meta_len)
+    memcpy(reply + header_len, job->meta, job->meta_len);
+  server_send(reply, header_len + job->meta_len);
+  free(reply);
+  free(job->meta);
+}
+
+static void NONRET
+serve(void)
+{
+  server_fd = 0;
+  set_cloexec(server_fd);
+  devnull_fd = open("/dev/null", O_RDWR);
+  if (devnull_fd < 0)
+    server_die("open(\"/dev/null\"): %m");
+  set_cloexec(devnull_fd);
+  signal(SIGPIPE, SIG_IGN);
+
+  const char ready[] = "ready";
+  server_send(ready, sizeof(ready) - 1);
+
+  struct pollfd *pfds = NULL;
+  int pfds_size = 0;
+  for (;;)
+    {
+      if (pfds_size < server_jobs_count + 1)
+	{
+	  pfds_size = server_jobs_size + 1;
+	  pfds = realloc(pfds, pfds_size * sizeof(struct pollfd));
+	  if (!pfds)
+	    server_die("Out of memory");
+	}
+      pfds[0] = (struct pollfd) { .fd = server_fd, .events = POLLIN };
+      for (int i=0; i < server_jobs_count; i++)
+	pfds[i+1] = (struct pollfd) { .fd = server_jobs[i].meta_fd, .events = POLLIN };
+
+      int jobs_count = server_jobs_count;
+      if (poll(pfds, jobs_count + 1, -1) < 0)
+	{
+	  if (errno == EINTR)
+	    continue;
+	  server_die("poll: %m");
+	}
+
+      // Go backwards, so that removing a job does not move unprocessed ones
+      for (int i = jobs_count - 1; i >= 0; i--)
+	if (pfds[i+1].revents && !server_read_meta(&server_jobs[i]))
+	  {
+	    server_finish(&server_jobs[i]);
+	    server_jobs[i] = server_jobs[--server_jobs_count];
+	  }
+
+      if (pfds[0].revents)
+	server_request();
+    }
+}
+
+int
+main(int argc, char **argv)
+{
+  enum opt_code mode = parse_options(argc, argv);
+
   if (!mode)
     usage("Please specify a minibox command (e.g. --run).\n");
   if (mode == OPT_VERSION)
@@ -928,6 +1228,8 @@ main(int argc, char **argv)
 	usage("--run mode requires a command to run\n");
       run(argv+optind);
       break;
+    case OPT_SERVER:
+      serve();
     default:
       die("Internal error: mode mismatch");
     }
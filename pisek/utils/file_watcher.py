@@ -0,0 +1,156 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import time
+from typing import Iterable, Optional
+
+FileStat = Optional[tuple]
+Snapshot = dict[str, FileStat]
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+)
+
+
+def file_stat(path: str) -> FileStat:
+    """
+    Returns what identifies contents of a file cheaply, None if it does not exist.
+    For a directory returns its (not hidden) entries.
+    """
+    try:
+        if os.path.isdir(path):
+            return tuple(sorted(n for n in os.listdir(path) if not n.startswith(".")))
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def snapshot(paths: Iterable[str]) -> Snapshot:
+    """Current state of given files."""
+    return {path: file_stat(path) for path in paths}
+
+
+class FileWatcher:
+    """
+    Waits until some of given files (or entries of given directories) change.
+
+    Inotify on the directories containing the files is used for waking up,
+    if it isn't available (or a directory doesn't exist) files are polled.
+    Changes are always confirmed by comparing stats of the files.
+    """
+
+    def __init__(self, poll_interval: float = 0.5, debounce: float = 0.1) -> None:
+        self._poll_interval = poll_interval
+        self._debounce = debounce
+        self._watches: dict[str, int] = {}
+        self._libc: Optional[ctypes.CDLL] = None
+        self._fd = -1
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd >= 0:
+            self._libc, self._fd = libc, fd
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._libc is not None
+
+    def close(self) -> None:
+        if self._libc is not None:
+            os.close(self._fd)
+            self._libc = None
+            self._watches = {}
+
+    def __enter__(self) -> "FileWatcher":
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def wait(self, files: Snapshot) -> list[str]:
+        """
+        Blocks until some file differs from the given snapshot
+        and returns the changed files.
+        """
+        all_watched = self._update_watches(files)
+        timeout = None if all_watched else self._poll_interval
+
+        while not (changed := self._changed(files)):
+            if self._libc is None:
+                time.sleep(self._poll_interval)
+            elif self._wait_for_events(timeout):
+                time.sleep(self._debounce)  # Let writes of the editor finish
+                self._drain()
+        return changed
+
+    def _changed(self, files: Snapshot) -> list[str]:
+        return sorted(path for path, stat in files.items() if file_stat(path) != stat)
+
+    def _update_watches(self, files: Snapshot) -> bool:
+        """Watches directories of the files. Returns whether all could be watched."""
+        if self._libc is None:
+            return False
+
+        dirs = {
+            path if os.path.isdir(path) else os.path.dirname(path) or "."
+            for path in files
+        }
+        for dir_ in set(self._watches) - dirs:
+            self._libc.inotify_rm_watch(self._fd, self._watches.pop(dir_))
+
+        all_watched = True
+        for dir_ in dirs - set(self._watches):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(dir_), ctypes.c_uint32(WATCH_MASK)
+            )
+            if wd >= 0:
+                self._watches[dir_] = wd
+            else:
+                all_watched = False
+        return all_watched
+
+    def _wait_for_events(self, timeout: Optional[float]) -> bool:
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        return bool(readable)
+
+    def _drain(self) -> None:
+        # We don't need to parse the events, stats of the files are compared anyway.
+        try:
+            while os.read(self._fd, 1 << 16):
+                pass
+        except BlockingIOError:
+            pass
@@ -15,7 +15,9 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from dataclasses import dataclass
+from functools import lru_cache
 import os
+import sys
 from typing import Optional, TYPE_CHECKING
 from pisek.config.config_types import DataFormat
 
@@ -31,15 +33,29 @@ INPUTS_SUBDIR = "_inputs/"
 FUZZING_OUTPUTS_SUBDIR = "_fuzzing/"
 
 
+@lru_cache(maxsize=2**16)
+def _join_path(*path: str) -> str:
+    """Joins and normalizes path. Result is interned so equal paths share memory."""
+    return sys.intern(os.path.normpath(os.path.join(*path)))
+
+
 @dataclass(frozen=True)
 class TaskPath:
     """Class representing a path to task file."""
 
+    __slots__ = ("path",)
     path: str
 
     def __init__(self, *path: str):
-        joined_path = os.path.normpath(os.path.join(*path))
-        object.__setattr__(self, "path", joined_path)
+        object.__setattr__(self, "path", _join_path(*path))
+
+    def __getstate__(self) -> str:
+        return self.path
+
+    def __setstate__(self, state: str | dict[str, str]) -> None:
+        if isinstance(state, dict):  # Pickled before TaskPath had slots
+            state = state["path"]
+        object.__setattr__(self, "path", state)
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}(path={self.path})"
@@ -110,11 +126,15 @@ class TaskPath:
 
 
 class JudgeablePath(TaskPath):
+    __slots__ = ()
+
     def to_judge_log(self, judge: str) -> "LogPath":
         return LogPath(self.replace_suffix(f".{judge}.log").path)
 
 
 class SanitizablePath(TaskPath):
+    __slots__ = ()
+
     def to_raw(self, format: DataFormat) -> "RawPath":
         if format == DataFormat.binary:
             return RawPath(self.path)
@@ -122,6 +142,8 @@ class SanitizablePath(TaskPath):
 
 
 class InputPath(SanitizablePath):
+    __slots__ = ()
+
     def __init__(self, env: "Env", *path, solution: Optional[str] = None) -> None:
         if solution is None:
             super().__init__(TESTS_DIR, INPUTS_SUBDIR, *path)
@@ -136,6 +158,8 @@ class InputPath(SanitizablePath):
 
 
 class OutputPath(JudgeablePath, SanitizablePath):
+    __slots__ = ()
+
     @staticmethod
     def static(*path) -> "OutputPath":
         return OutputPath(TESTS_DIR, INPUTS_SUBDIR, *path)
@@ -152,12 +176,16 @@ class OutputPath(JudgeablePath, SanitizablePath):
 
 
 class LogPath(JudgeablePath):
+    __slots__ = ()
+
     @staticmethod
     def generator_log(generator: str) -> "LogPath":
         return LogPath(TESTS_DIR, INPUTS_SUBDIR, f"{generator}.log")
 
 
 class RawPath(TaskPath):
+    __slots__ = ()
+
     def to_sanitized_output(self) -> OutputPath:
         return OutputPath(self.path.removesuffix(".raw"))
 
@@ -16,57 +16,240 @@
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
 from datetime import datetime
+import io
+import multiprocessing
 import os
 import sys
-from typing import Callable
+import time
+import traceback
+from typing import Callable, Optional
 
-from pisek.jobs.job_pipeline import JobPipeline
+from pisek.jobs.job_pipeline import JobPipeline, share_job_slots
 from pisek.utils.util import clean_non_relevant_files
 from pisek.utils.text import eprint
-from pisek.utils.terminal import TARGET_LINE_WIDTH
-from pisek.utils.paths import INTERNALS_DIR
+from pisek.utils.terminal import TARGET_LINE_WIDTH, recording_output
+from pisek.utils.paths import BUILD_DIR, INTERNALS_DIR, TESTS_DIR
+from pisek.utils.file_watcher import FileWatcher, snapshot
+from pisek.config.config_hierarchy import CONFIG_FILENAME
 from pisek.utils.colors import ColorSettings
+from pisek.utils.trace import Tracer
 from pisek.env.env import Env
 from pisek.jobs.cache import Cache
+from pisek.jobs.events import EventLog
+from pisek.jobs.manifest import Manifest
 
 PATH = "."
 
 LOCK_FILE = os.path.join(INTERNALS_DIR, "lock")
 
 
-def run_pipeline(path: str, pipeline_class: Callable[[Env], JobPipeline], **env_args):
-    with ChangedCWD(path):
+def run_pipeline(
+    path: str,
+    pipeline_class: Callable[[Env], JobPipeline],
+    events: Optional[str] = None,
+    trace: Optional[str] = None,
+    **env_args,
+):
+    if trace is not None:
+        trace = os.path.abspath(trace)
+        Tracer.start()
+    try:
+        return _run_pipeline(path, pipeline_class, events, **env_args)
+    finally:
+        if trace is not None:
+            Tracer.export(trace)
+
+
+def _run_pipeline(
+    path: str,
+    pipeline_class: Callable[[Env], JobPipeline],
+    events: Optional[str],
+    **env_args,
+):
+    with EventLog(events) as event_log, ChangedCWD(path):
         env = Env.load(**env_args)
         if env is None:
             return True
         cache = Cache.load()
 
-        all_accessed_files: set[str] = set()
-        for i in range(env.repeat):
-            env.iteration = i  # XXX: Dirty trick
-            if env.repeat > 1:
-                if i != 0:
-                    print()
-                text = f" Run {i+1}/{env.repeat} "
-                text = (
-                    ((TARGET_LINE_WIDTH - len(text)) // 2) * "-"
-                    + text
-                    + ((TARGET_LINE_WIDTH - len(text) + 1) // 2) * "-"
-                )
-                print(ColorSettings.colored(text, "cyan"))
-                print()
+        # Runs recorded in detail must really run
+        if env.repeat == 1 and events is None and not Tracer.enabled:
+            manifest = Manifest.load()
+            if manifest is not None and manifest.matches(env, cache):
+                manifest.replay()
+                return False
+        Manifest.remove()
 
-            pipeline = pipeline_class(env.fork())
-            result = pipeline.run_jobs(cache, env)
-            if result:
-                return result
-            all_accessed_files |= pipeline.all_accessed_files
+        with recording_output() as output:
+            result, all_accessed_files = _run_pipeline_repeated(
+                pipeline_class, env, cache, event_log
+            )
+        if result:
+            return result
 
         clean_non_relevant_files(all_accessed_files)
+        if env.repeat == 1:
+            Manifest.create(env, cache, all_accessed_files, output).export()
+            cache.export()  # Digests of files
         return False
 
 
+def _run_pipeline_repeated(
+    pipeline_class: Callable[[Env], JobPipeline],
+    env: Env,
+    cache: Cache,
+    event_log: EventLog,
+) -> tuple[bool, set[str]]:
+    all_accessed_files: set[str] = set()
+    for i in range(env.repeat):
+        env.iteration = i  # XXX: Dirty trick
+        if env.repeat > 1:
+            if i != 0:
+                print()
+            text = _header(f" Run {i+1}/{env.repeat} ")
+            print(ColorSettings.colored(text, "cyan"))
+            print()
+
+        pipeline = pipeline_class(env.fork())
+        result = pipeline.run_jobs(cache, env, event_log)
+        if result:
+            return result, all_accessed_files
+        all_accessed_files |= pipeline.all_accessed_files
+
+    return False, all_accessed_files
+
+
+def run_pipelines(
+    paths: list[str],
+    pipeline_class: Callable[[Env], JobPipeline],
+    jobs: int = 1,
+    **env_args,
+) -> bool:
+    """
+    Runs pipelines of multiple tasks at once, with at most jobs jobs running in total.
+
+    As the working directory is common for the whole process,
+    each task is tested in its own process. Their jobs share slots,
+    so small tasks fill the gaps left by large ones.
+    Output of each task is printed when it finishes, summary at the end.
+    """
+    context = multiprocessing.get_context("spawn")
+    slots = context.BoundedSemaphore(jobs)
+    env_args |= {"jobs": jobs, "no_jumps": True}
+
+    results: dict[str, tuple[bool, float]] = {}
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(paths)),
+        mp_context=context,
+        max_tasks_per_child=1,  # Tasks mustn't share global state
+        initializer=share_job_slots,
+        initargs=(slots,),
+    ) as executor:
+        futures = {
+            executor.submit(_run_task_pipeline, path, pipeline_class, env_args): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                failed, output, duration = future.result()
+            except Exception as err:
+                failed, output, duration = (
+                    True,
+                    "".join(traceback.format_exception(err)),
+                    0.0,
+                )
+            results[path] = (failed, duration)
+
+            print(ColorSettings.colored(_header(f" {path} "), "cyan"))
+            print(output, end="")
+            print()
+
+    print(ColorSettings.colored(_header(" Summary "), "cyan"))
+    width = max(len(path) for path in paths)
+    for path in paths:
+        failed, duration = results[path]
+        result = ColorSettings.colored(
+            *((f"{'failed':<6}", "red") if failed else (f"{'ok':<6}", "green"))
+        )
+        print(f"{path:<{width}}  {result}  {duration:7.2f}s")
+    return any(failed for failed, _ in results.values())
+
+
+def _run_task_pipeline(
+    path: str, pipeline_class: Callable[[Env], JobPipeline], env_args: dict
+) -> tuple[bool, str, float]:
+    """Runs pipeline of a task in a worker process of run_pipelines."""
+    ColorSettings.set_state(not env_args["plain"] and not env_args["no_colors"])
+    output = io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(output), redirect_stderr(output):
+        try:
+            with Lock(path):
+                failed = bool(run_pipeline(path, pipeline_class, **env_args))
+        except SystemExit:  # Task is locked
+            failed = True
+    return failed, output.getvalue(), time.perf_counter() - start
+
+
+def _header(text: str) -> str:
+    return (
+        ((TARGET_LINE_WIDTH - len(text)) // 2) * "-"
+        + text
+        + ((TARGET_LINE_WIDTH - len(text) + 1) // 2) * "-"
+    )
+
+
+def watch_pipeline(
+    path: str, pipeline_class: Callable[[Env], JobPipeline], **env_args
+) -> bool:
+    """
+    Runs pipeline again each time a file it depends on changes.
+
+    Cache (with digests of files) is kept in memory between runs,
+    so only jobs depending on the changed files are run again.
+    Config is loaded again only when it changes.
+    """
+    with ChangedCWD(path), FileWatcher() as watcher:
+        env = Env.load(**env_args)
+        cache = Cache.load()
+        watched = snapshot([CONFIG_FILENAME])
+
+        while True:
+            if env is not None:
+                pipeline = pipeline_class(env.fork())
+                if not pipeline.run_jobs(cache, env):
+                    clean_non_relevant_files(pipeline.all_accessed_files)
+
+                # Keep stats from before the run so that changes during it are noticed
+                files = {CONFIG_FILENAME} | {
+                    file
+                    for file in pipeline.all_accessed_files
+                    if not file.startswith((BUILD_DIR, TESTS_DIR, INTERNALS_DIR))
+                }
+                # New programs and static inputs are found by managers listing these
+                files |= {os.path.dirname(file) or "." for file in files}
+                new_files = snapshot(files - watched.keys())
+                watched = {file: watched.get(file) for file in files} | new_files
+
+            print()
+            print(
+                ColorSettings.colored(
+                    f"Watching {len(watched)} files for changes...", "cyan"
+                )
+            )
+            changed = watcher.wait(watched)
+            print(f"Changed: {', '.join(changed)}")
+            print()
+
+            watched = snapshot(watched)
+            if CONFIG_FILENAME in changed:
+                env = Env.load(**env_args)
+
+
 class ChangedCWD:
     def __init__(self, path):
         self._path = path
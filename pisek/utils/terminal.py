@@ -13,8 +13,10 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from contextlib import contextmanager
 import os
-from typing import TYPE_CHECKING
+import sys
+from typing import TYPE_CHECKING, Any, Iterator, TextIO
 
 from pisek.utils.text import pad
 
@@ -33,3 +35,39 @@ TARGET_LINE_WIDTH = min(terminal_width, 100)
 
 def right_aligned_text(left: str, right: str, offset: int = 0):
     return pad(left, TARGET_LINE_WIDTH - len(right) + offset - 1) + " " + right
+
+
+class RecordedStream:
+    """Stream writing to another stream and recording everything written."""
+
+    def __init__(
+        self, stream: TextIO, record: list[tuple[str, bool]], stderr: bool
+    ) -> None:
+        self.stream = stream
+        self._record = record
+        self._stderr = stderr
+
+    def write(self, text: str) -> int:
+        self._record.append((text, self._stderr))
+        return self.stream.write(text)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def recording_output() -> Iterator[list[tuple[str, bool]]]:
+    """Records output to stdout and stderr as (text, is_stderr) pairs."""
+    record: list[tuple[str, bool]] = []
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = RecordedStream(stdout, record, False)  # type: ignore[assignment]
+    sys.stderr = RecordedStream(stderr, record, True)  # type: ignore[assignment]
+    try:
+        yield record
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+def unrecorded(stream: TextIO) -> TextIO:
+    """Stream for output that is rewritten later, so it shouldn't be recorded."""
+    return stream.stream if isinstance(stream, RecordedStream) else stream
@@ -0,0 +1,85 @@
+# pisek  - Tool for developing tasks for programming competitions.
+#
+# Copyright (c)   2024        Daniel Skýpala <daniel@honza.info>
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import threading
+import time
+from typing import Any, ContextManager, Iterator, Optional
+
+
+class __Tracer:
+    """
+    Singleton object recording spans in Chrome trace event format.
+    (Viewable in chrome://tracing or https://ui.perfetto.dev)
+    Can be used from multiple threads. Does nothing unless started.
+    """
+
+    def __init__(self) -> None:
+        self._events: Optional[list[dict[str, Any]]] = None
+        self._start = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._events is not None
+
+    def start(self) -> None:
+        """Starts recording spans."""
+        self._events = []
+        self._start = time.perf_counter()
+
+    def now(self) -> float:
+        """Time since the start in microseconds."""
+        return (time.perf_counter() - self._start) * 1e6
+
+    def complete(
+        self, name: str, category: str, start: float, duration: float, **args: Any
+    ) -> None:
+        """Records span with given start and duration (in microseconds)."""
+        if self._events is None:
+            return
+        self._events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round(start, 3),
+                "dur": round(duration, 3),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+    def span(self, name: str, category: str, **args: Any) -> ContextManager[None]:
+        """Records span lasting for the with block."""
+        if self._events is None:
+            return nullcontext()
+        return self._span(name, category, **args)
+
+    @contextmanager
+    def _span(self, name: str, category: str, **args: Any) -> Iterator[None]:
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.complete(name, category, start, self.now() - start, **args)
+
+    def export(self, path: str) -> None:
+        """Writes recorded spans to path and stops recording."""
+        events, self._events = self._events, None
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+Tracer = __Tracer()
@@ -0,0 +1,79 @@
+"""
+Tests that builtin token judge gives the same results as judge-token.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import pisek
+from pisek.task_jobs.builtin_judges import TokenJudge
+
+REAL_CASES = [
+    (b"1\n", b"1.000001\n"),
+    (b"1\n", b"1.1\n"),
+    (b"0x1p-2\n", b"0.25\n"),
+    (b"1e-400\n", b"0\n"),  # Inexact underflow
+    (b"0e-400\n", b"0\n"),
+    (b"1e-99999999999999999999\n", b"0\n"),  # Exponent out of Decimal's range
+    (b"0.0e-99999999999999999999\n", b"0\n"),
+    (b"1e99999999999999999999\n", b"0\n"),
+    (b"4.9406564584124654e-324\n", b"5e-324\n"),
+]
+
+
+class TestTokenJudge(unittest.TestCase):
+    def judge(self, output: bytes, correct: bytes, tmp_dir: str) -> tuple[bool, str]:
+        paths = []
+        for name, data in (("output", output), ("correct", correct)):
+            paths.append(os.path.join(tmp_dir, name))
+            with open(paths[-1], "wb") as f:
+                f.write(data)
+        judge = TokenJudge(float_rel_error=1e-5, float_abs_error=1e-30)
+        return judge.judge(*paths)
+
+    def test_huge_exponent(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.assertEqual(
+                self.judge(b"1e-99999999999999999999\n", b"0\n", tmp_dir),
+                (
+                    False,
+                    "Error at output line 1: "
+                    "Found <1e-99999999999999999999>, expected <0>\n",
+                ),
+            )
+            self.assertEqual(
+                self.judge(b"0e-99999999999999999999\n", b"0\n", tmp_dir), (True, "")
+            )
+
+    @unittest.skipUnless(shutil.which("g++"), "g++ is needed to compile judge-token")
+    def test_same_as_judge_token(self):
+        judgelib = os.path.join(os.path.dirname(pisek.__file__), "tools", "judgelib")
+        sources = [
+            source
+            for source in glob.glob(os.path.join(judgelib, "*.cc"))
+            if os.path.basename(source) != "judge-shuffle.cc"
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            executable = os.path.join(tmp_dir, "judge-token")
+            subprocess.run(["g++", "-O2", "-o", executable] + sources, check=True)
+
+            for output, correct in REAL_CASES:
+                with self.subTest(output=output, correct=correct):
+                    result = self.judge(output, correct, tmp_dir)
+                    c_run = subprocess.run(
+                        [executable, "-t", "-r", "-e", "1e-5", "-E", "1e-30"]
+                        + [os.path.join(tmp_dir, "output")]
+                        + [os.path.join(tmp_dir, "correct")],
+                        capture_output=True,
+                    )
+                    self.assertIn(c_run.returncode, (42, 43))
+                    c_result = (c_run.returncode == 42, c_run.stderr.decode())
+                    self.assertEqual(result, c_result)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,61 @@
+"""
+Tests loading of corrupted cache and pruning of file digests.
+"""
+
+import os
+import tempfile
+import unittest
+
+from pisek.jobs.cache import Cache, CACHE_CONTENT_FILE
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._cwd = os.getcwd()
+        os.chdir(self._tmp_dir.name)
+
+    def tearDown(self):
+        os.chdir(self._cwd)
+        self._tmp_dir.cleanup()
+
+    def test_corrupted(self):
+        Cache()._db.close()
+        for suffix in ("", "-wal", "-shm"):
+            with open(CACHE_CONTENT_FILE + suffix, "wb") as f:
+                f.write(b"Not a database" * 1000)
+
+        cache = Cache.load()
+        self.assertEqual(cache.entry_names(), [])
+        cache._db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(CACHE_CONTENT_FILE + suffix):
+                with open(CACHE_CONTENT_FILE + suffix, "rb") as f:
+                    self.assertNotIn(b"Not a database", f.read())
+
+    def test_prune_file_digests(self):
+        for name in ("used", "unused", "removed"):
+            with open(name, "w") as f:
+                f.write(f"{name}\n")
+            os.utime(name, ns=(0, 0))  # Not racy
+
+        cache = Cache()
+        for name in ("used", "unused", "removed"):
+            cache.file_digest(name)
+        cache.export()
+        cache._db.close()
+
+        os.remove("removed")
+        cache = Cache.load()
+        cache.file_digest("used")
+        cache.prune_file_digests()
+        cache.export()
+        cache._db.close()
+
+        cache = Cache.load()
+        self.assertEqual(list(cache._file_digests), ["used"])
+        cache._db.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
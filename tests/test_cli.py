@@ -2,7 +2,9 @@
 Tests the command-line interface.
 """
 
+import json
 import os
+import sqlite3
 
 import unittest
 from io import StringIO
@@ -39,6 +41,48 @@ class TestCLI(TestFixture):
         self.check_files()
 
 
+class TestCLIParallel(TestCLI):
+    def args(self):
+        return [["test", "--timeout", "0.2", "--jobs", "4"]]
+
+
+class TestCLIAdaptiveOrder(TestCLI):
+    def args(self):
+        return [
+            ["test", "--timeout", "0.2"],
+            ["test", "--timeout", "0.2", "--adaptive-order"],
+        ]
+
+
+class TestCLIArtifactCache(TestCLI):
+    def setUp(self):
+        super().setUp()
+        os.environ["PISEK_ARTIFACT_CACHE"] = os.path.join(
+            self.fixtures_dir, "artifacts"
+        )
+
+    def tearDown(self):
+        del os.environ["PISEK_ARTIFACT_CACHE"]
+        super().tearDown()
+
+    def args(self):
+        return [["test", "--timeout", "0.2"], ["--clean", "test", "--timeout", "0.2"]]
+
+
+class TestCLICorruptedCache(TestCLI):
+    def args(self):
+        return [["test", "--timeout", "0.2"], ["test", "--timeout", "0.2"]]
+
+    def runTest(self):
+        with mock.patch("sys.stdout", new=StringIO()):
+            with mock.patch("sys.stderr", new=StringIO()):
+                self.assertFalse(main(["test", "--timeout", "0.2"]))
+        with sqlite3.connect(".pisek/cache.db") as db:
+            db.execute("UPDATE jobs SET entries = ?", (b"not a pickle",))
+        os.remove(".pisek/manifest.json")
+        super().runTest()
+
+
 class TestCLITestSolution(TestCLI):
     def args(self):
         return [["test", "solution", "solve"]]
@@ -49,6 +93,11 @@ class TestCLITestGenerator(TestCLI):
         return [["test", "generator"]]
 
 
+class TestCLITestAll(TestCLI):
+    def args(self):
+        return [["test-all", ".", "--timeout", "0.2", "--jobs", "2"]]
+
+
 class TestCLIClean(TestCLI):
     def args(self):
         return [["clean"]]
@@ -62,6 +111,97 @@ class TestCLITestingLog(TestCLI):
         return ["testing_log.json"]
 
 
+class TestCLIEvents(TestCLI):
+    def args(self):
+        return [["test", "--timeout", "0.2", "--events", "events.jsonl"]]
+
+    def created_files(self):
+        return ["events.jsonl"]
+
+    def check_files(self):
+        super().check_files()
+        with open(os.path.join(self.task_dir, "events.jsonl")) as f:
+            events = [json.loads(line) for line in f]
+
+        kinds = {event["event"] for event in events}
+        for kind in ("job_queued", "job_started", "job_finished", "manager_finalized"):
+            self.assertIn(kind, kinds)
+        points = [e for e in events if e["event"] == "solution_points"]
+        self.assertIn("solve", [e["solution"] for e in points])
+
+
+class TestCLITrace(TestCLI):
+    def args(self):
+        return [["test", "--timeout", "0.2", "--jobs", "4", "--trace", "trace.json"]]
+
+    def created_files(self):
+        return ["trace.json"]
+
+    def check_files(self):
+        super().check_files()
+        with open(os.path.join(self.task_dir, "trace.json")) as f:
+            events = json.load(f)["traceEvents"]
+
+        categories = {event["cat"] for event in events}
+        self.assertEqual(categories, {"job", "manager", "cache", "program"})
+
+
+class TestCLIManifest(TestCLI):
+    def test(self):
+        with mock.patch("sys.stdout", new=StringIO()) as std_out:
+            with mock.patch("sys.stderr", new=StringIO()) as std_err:
+                self.assertFalse(main(["test", "--timeout", "0.2"]))
+        return std_out.getvalue() + std_err.getvalue()
+
+    def runTest(self):
+        self.log_files()
+        output = self.test()
+
+        with mock.patch(
+            "pisek.jobs.job_pipeline.JobPipeline.run_jobs",
+            side_effect=AssertionError("Pipeline shouldn't run"),
+        ):
+            self.assertEqual(self.test(), output)
+
+        with open("solve.py", "a") as f:
+            f.write("# Changed\n")
+        with mock.patch(
+            "pisek.jobs.job_pipeline.JobPipeline.run_jobs", return_value=False
+        ) as run_jobs:
+            self.test()
+            run_jobs.assert_called_once()
+
+        self.check_files()
+
+
+class TestCLIWatch(TestCLI):
+    def runTest(self):
+        self.log_files()
+        watched = []
+
+        def wait(files):
+            watched.append(files)
+            if len(watched) > 1:
+                raise KeyboardInterrupt
+            with open("solve.py", "a") as f:
+                f.write("# Changed\n")
+            return ["solve.py"]
+
+        with mock.patch(
+            "pisek.utils.pipeline_tools.FileWatcher.wait", side_effect=wait
+        ):
+            with mock.patch("sys.stdout", new=StringIO()) as std_out:
+                with mock.patch("sys.stderr", new=StringIO()):
+                    with self.assertRaises(KeyboardInterrupt):
+                        main(["watch", "--timeout", "0.2"])
+
+        self.assertIn("solve.py", watched[0])
+        self.assertIn("config", watched[0])
+        self.assertIn(".", watched[0])
+        self.assertIn("Changed: solve.py", std_out.getvalue())
+        self.check_files()
+
+
 class TestCLIVisualize(TestCLI):
     def args(self):
         return [["test", "--testing-log"], ["visualize"]]
@@ -87,6 +87,16 @@ class TestInvalidJudgeScore(TestSumCMS):
         overwrite_file(self.task_dir, "judge.cpp", "judge_invalid_score.cpp")
 
 
+class TestJudgeWithoutCorrectOutput(TestSumCMS):
+    def modify_task(self):
+        overwrite_file(self.task_dir, "judge.cpp", "judge_no_out.cpp")
+
+        def modification_fn(raw_config):
+            raw_config["tests"]["judge_needs_out"] = "0"
+
+        modify_config(self.task_dir, modification_fn)
+
+
 class TestStrictValidator(TestSumCMS):
     """A validator whose bounds are stricter than what the generator creates."""
 
@@ -97,6 +107,61 @@ class TestStrictValidator(TestSumCMS):
         overwrite_file(self.task_dir, "validate.py", "validate_strict.py")
 
 
+class TestMultiTestValidator(TestSumCMS):
+    def modify_task(self):
+        def modification_fn(raw_config):
+            raw_config["tests"]["checker"] = "validate_multi"
+            raw_config["tests"]["validator_type"] = "multi-test"
+
+        modify_config(self.task_dir, modification_fn)
+
+
+class TestStrictMultiTestValidator(TestSumCMS):
+    """A multi-test validator whose bounds are stricter than what the generator creates."""
+
+    def expecting_success(self):
+        return False
+
+    def modify_task(self):
+        def modification_fn(raw_config):
+            raw_config["tests"]["checker"] = "validate_multi_strict"
+            raw_config["tests"]["validator_type"] = "multi-test"
+
+        modify_config(self.task_dir, modification_fn)
+
+
+class TestDuplicateSolutions(TestSumCMS):
+    """Solutions with byte-identical executables share their runs."""
+
+    def modify_task(self):
+        shutil.copy(
+            os.path.join(self.task_dir, "solve_0b.py"),
+            os.path.join(self.task_dir, "solve_0b_copy.py"),
+        )
+
+        def modification_fn(raw_config):
+            raw_config["solution_solve_0b_copy"] = raw_config["solution_solve_0b"]
+            raw_config["solution_solve_0b_copy"]["source"] = "solve_0b_copy"
+
+        modify_config(self.task_dir, modification_fn)
+
+
+class TestSameOutputSolutions(TestSumCMS):
+    """Solutions with the same outputs share judging of them."""
+
+    def modify_task(self):
+        with open(os.path.join(self.task_dir, "solve_0b.py")) as f:
+            source = f.read()
+        with open(os.path.join(self.task_dir, "solve_0b_other.py"), "w") as f:
+            f.write(source + "\n# Different source, same outputs\n")
+
+        def modification_fn(raw_config):
+            raw_config["solution_solve_0b_other"] = raw_config["solution_solve_0b"]
+            raw_config["solution_solve_0b_other"]["source"] = "solve_0b_other"
+
+        modify_config(self.task_dir, modification_fn)
+
+
 class TestDirtySample(TestSumCMS):
     """Sample without newline at the end."""
 
@@ -166,6 +231,19 @@ class TestNoLFInTextOutput(TestSumCMS):
         modify_config(self.task_dir, modification_fn)
 
 
+class TestUTF16TextOutput(TestSumCMS):
+    """Output in UTF-16 with CRLF line endings with out_format=text."""
+
+    def expecting_success(self):
+        return True
+
+    def modify_task(self):
+        def modification_fn(raw_config):
+            raw_config["solution_solve"]["source"] = "solve_utf16"
+
+        modify_config(self.task_dir, modification_fn)
+
+
 class TestNoLFInStrictTextOutput(TestSumCMS):
     """Output without newline at the end with out_format=text."""
 
@@ -206,6 +284,20 @@ class TestStub(TestFixtureVariant):
         return "../fixtures/odd_stub/"
 
 
+class TestMultiGenerator(TestStub):
+    def modify_task(self):
+        def modification_fn(raw_config):
+            raw_config["tests"]["in_gen"] = "gen_multi"
+            raw_config["tests"]["gen_type"] = "pisek-multi-v1"
+
+        modify_config(self.task_dir, modification_fn)
+
+
+class TestMultiGeneratorParallel(TestMultiGenerator):
+    def env_args(self):
+        return {"jobs": 4}
+
+
 class TestBigInput(TestStub):
     def expecting_success(self):
         return False
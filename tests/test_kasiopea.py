@@ -166,6 +166,38 @@ class TestPythonJudge(TestSumKasiopea):
         modify_config(self.task_dir, modification_fn)
 
 
+class TestMultiJudge(TestSumKasiopea):
+    def expecting_success(self):
+        return True
+
+    def modify_task(self):
+        def modification_fn(raw_config):
+            raw_config["tests"]["out_check"] = "judge"
+            raw_config["tests"]["out_judge"] = "judge_multi"
+            raw_config["tests"]["judge_type"] = "pisek-multi-v1"
+
+        modify_config(self.task_dir, modification_fn)
+
+
+class TestMultiJudgeParallel(TestMultiJudge):
+    def env_args(self):
+        return {"jobs": 4}
+
+
+class TestMultiJudgeWithNoOutput(TestSumKasiopea):
+    def expecting_success(self):
+        return False
+
+    def modify_task(self):
+        def modification_fn(raw_config):
+            raw_config["tests"]["judge_needs_out"] = "0"
+            raw_config["tests"]["out_check"] = "judge"
+            raw_config["tests"]["out_judge"] = "judge_multi"
+            raw_config["tests"]["judge_type"] = "pisek-multi-v1"
+
+        modify_config(self.task_dir, modification_fn)
+
+
 class TestBadJudge(TestSumKasiopea):
     def expecting_success(self):
         return False
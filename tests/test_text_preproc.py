@@ -0,0 +1,128 @@
+"""
+Tests that text normalization gives the same results as text-preproc.c.
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import pisek
+from pisek.task_jobs import text_preproc
+from pisek.task_jobs.text_preproc import TextPreprocError, preprocess
+
+UTF8_BOM = b"\xef\xbb\xbf"
+UTF16_LE_BOM = b"\xff\xfe"
+UTF16_BE_BOM = b"\xfe\xff"
+
+CASES = [
+    b"",
+    b"\n",
+    b"1 2\n",
+    b"1 2",  # Missing final newline
+    b"1 2 \t\n3  \n\n",  # Trailing whitespace is kept
+    b"1\r\n2\r\n",
+    b"1\r2\r",
+    b"1\r\n2",
+    b"\r",
+    b"a" * 9 + b"\r\n" + b"b" * 9,
+    UTF8_BOM,
+    UTF8_BOM + b"1 2\r\n",
+    UTF8_BOM + b"1 2",
+    UTF8_BOM[:2],  # Incomplete BOM
+    UTF8_BOM[:2] + b"1\n",
+    UTF16_LE_BOM,
+    UTF16_LE_BOM + "1 2\r\n3".encode("utf-16-le"),
+    UTF16_BE_BOM + "1 2\r\n3\n".encode("utf-16-be"),
+    UTF16_LE_BOM + "1 2\n".encode("utf-16-le") + b"3",  # Incomplete character
+    UTF16_BE_BOM + "1 č\n".encode("utf-16-be"),
+    UTF16_LE_BOM + "1\x002\n".encode("utf-16-le"),
+    b"1 2\x00\n",
+    b"1 2\x7f\n",
+    "1 č\n".encode(),
+    b"\t" * 7 + b"\x1b",
+]
+
+# Small chunks test that nothing is split in the wrong place
+CHUNK_SIZES = [2, 4, 6, text_preproc.CHUNK_SIZE]
+
+
+def normalize(data: bytes, chunk_size: int) -> tuple[bytes, str]:
+    """Returns normalized data and error message (one of them is empty)."""
+    with mock.patch.object(text_preproc, "CHUNK_SIZE", chunk_size):
+        raw, normalized = b"", b""
+        try:
+            for raw_chunk, normalized_chunk in preprocess(io.BytesIO(data)):
+                raw += raw_chunk
+                normalized += normalized_chunk
+        except TextPreprocError as e:
+            return b"", str(e)
+
+    assert raw == data, "Raw chunks must cover the whole file"
+    return normalized, ""
+
+
+class TestTextPreproc(unittest.TestCase):
+    def test_expected(self):
+        expected = {
+            b"": b"",
+            b"1 2": b"1 2\n",
+            b"1 2 \t\n3  \n\n": b"1 2 \t\n3  \n\n",
+            b"1\r\n2": b"1\n2\n",
+            b"1\r2\r": b"12\n",
+            UTF8_BOM: b"",
+            UTF8_BOM + b"1 2": b"1 2\n",
+            UTF16_LE_BOM + "1 2\r\n3".encode("utf-16-le"): b"1 2\n3\n",
+        }
+        for data, normalized in expected.items():
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(data=data, chunk_size=chunk_size):
+                    self.assertEqual(normalize(data, chunk_size), (normalized, ""))
+
+    def test_errors(self):
+        expected = [
+            (
+                UTF8_BOM[:2],
+                "File contains non-printable character (code 239 at position 0)",
+            ),
+            (
+                UTF16_LE_BOM + "1 2\n".encode("utf-16-le") + b"3",
+                "File in UTF-16 contains incomplete character (at position 10)",
+            ),
+            (
+                UTF16_BE_BOM + "1 č\n".encode("utf-16-be"),
+                "File contains non-printable character (code 269 at position 6)",
+            ),
+        ]
+        for data, message in expected:
+            for chunk_size in CHUNK_SIZES:
+                with self.subTest(data=data, chunk_size=chunk_size):
+                    self.assertEqual(normalize(data, chunk_size), (b"", message))
+
+    @unittest.skipUnless(shutil.which("gcc"), "gcc is needed to compile text-preproc")
+    def test_same_as_c(self):
+        source = os.path.join(
+            os.path.dirname(pisek.__file__), "tools", "text-preproc.c"
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            executable = os.path.join(tmp_dir, "text-preproc")
+            subprocess.run(["gcc", "-O2", "-o", executable, source], check=True)
+
+            for data in CASES:
+                c_run = subprocess.run([executable], input=data, capture_output=True)
+                self.assertIn(c_run.returncode, (42, 43))
+                if c_run.returncode == 42:
+                    c_result = (c_run.stdout, "")
+                else:
+                    c_result = (b"", c_run.stderr.decode().strip())
+
+                for chunk_size in CHUNK_SIZES:
+                    with self.subTest(data=data, chunk_size=chunk_size):
+                        self.assertEqual(normalize(data, chunk_size), c_result)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
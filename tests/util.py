@@ -107,6 +107,10 @@ class TestFixtureVariant(TestFixture):
         """
         pass
 
+    def env_args(self):
+        """Additional arguments for testing the task."""
+        return {}
+
     def runTest(self):
         if not self.fixture_path():
             return
@@ -127,6 +131,7 @@ class TestFixtureVariant(TestFixture):
                 full=False,
                 timeout=0.2,
                 plain=False,
+                **self.env_args(),
             )
 
         runner = unittest.TextTestRunner(failfast=True)